@@ -0,0 +1,69 @@
+"""clean_expired sweep time with no channels due and with all channels due."""
+
+import argparse
+import asyncio
+import json
+import time
+
+from channel_box import Channel, ChannelBox
+
+from .common import parse_sizes
+from .fakes import FakeWebSocket
+
+
+async def measure(size: int, groups: int, expired: bool) -> dict:
+    await ChannelBox.flush_groups()
+
+    for i in range(size):
+        channel = Channel(websocket=FakeWebSocket(), expires=3600, payload_type="json")
+        await ChannelBox.add_channel_to_group(channel, f"bench:{i % groups}")
+        if expired:
+            channel.last_active -= 7200
+
+    if expired:
+        # Deadlines were indexed before last_active was moved back.
+        for channel in ChannelBox.CHANNEL_MEMBERSHIPS:
+            ChannelBox._index_expiry(channel)
+
+    started = time.perf_counter()
+    await ChannelBox.clean_expired()
+    elapsed = time.perf_counter() - started
+
+    remaining = sum(len(channels) for channels in ChannelBox.CHANNEL_GROUPS.values())
+    await ChannelBox.flush_groups()
+
+    return {
+        "benchmark": "clean_expired",
+        "channels": size,
+        "groups": groups,
+        "expired": expired,
+        "removed": size - remaining,
+        "sweep_ms": round(elapsed * 1000, 4),
+    }
+
+
+async def run(sizes: list[int], groups: int = 100) -> list[dict]:
+    results = []
+    for size in sizes:
+        for expired in (False, True):
+            results.append(await measure(size, groups, expired))
+    return results
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--sizes", type=parse_sizes, default=parse_sizes("1000,10000,100000")
+    )
+    parser.add_argument("--groups", type=int, default=100)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_arguments(parser)
+    args = parser.parse_args()
+    for result in asyncio.run(run(args.sizes, args.groups)):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
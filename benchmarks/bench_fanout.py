@@ -0,0 +1,124 @@
+"""group_send throughput and latency across group sizes and payload types."""
+
+import argparse
+import asyncio
+import json
+import time
+
+from channel_box import Channel, ChannelBox
+
+from .common import parse_sizes, percentiles
+from .fakes import FakeWebSocket
+
+
+PAYLOADS = {
+    "json": {"username": "bench", "message": "x" * 64, "tags": [1, 2, 3]},
+    "text": "x" * 96,
+    "bytes": b"x" * 96,
+}
+
+
+async def measure(
+    size: int,
+    payload_type: str,
+    save_history: bool,
+    iterations: int,
+    latency: float,
+    concurrent: bool,
+) -> dict:
+    await ChannelBox.flush_groups()
+    await ChannelBox.flush_history()
+
+    websockets = [FakeWebSocket(latency=latency) for _ in range(size)]
+    for websocket in websockets:
+        channel = Channel(websocket=websocket, expires=3600, payload_type=payload_type)
+        await ChannelBox.add_channel_to_group(channel, "bench")
+
+    payload = PAYLOADS[payload_type]
+    samples = []
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        sent = time.perf_counter()
+        await ChannelBox.group_send(
+            group_name="bench",
+            payload=payload,
+            save_history=save_history,
+            concurrent=concurrent,
+        )
+        samples.append(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - started
+
+    delivered = sum(websocket.sent for websocket in websockets)
+    await ChannelBox.flush_groups()
+    await ChannelBox.flush_history()
+
+    return {
+        "benchmark": "group_send",
+        "group_size": size,
+        "payload_type": payload_type,
+        "save_history": save_history,
+        "concurrent": concurrent,
+        "latency_s": latency,
+        "iterations": iterations,
+        "deliveries_per_s": round(delivered / elapsed, 1),
+        "messages_per_s": round(iterations / elapsed, 1),
+        **percentiles(samples),
+    }
+
+
+async def run(
+    sizes: list[int],
+    payload_types: list[str],
+    iterations: int = 20,
+    latency: float = 0.0,
+    concurrent: bool = False,
+) -> list[dict]:
+    results = []
+    for size in sizes:
+        for payload_type in payload_types:
+            for save_history in (False, True):
+                results.append(
+                    await measure(
+                        size,
+                        payload_type,
+                        save_history,
+                        iterations,
+                        latency,
+                        concurrent,
+                    )
+                )
+    return results
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--sizes", type=parse_sizes, default=parse_sizes("10,100,1000,10000")
+    )
+    parser.add_argument("--payload-types", default="json,text,bytes")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="fake send latency in seconds"
+    )
+    parser.add_argument("--concurrent", action="store_true")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_arguments(parser)
+    args = parser.parse_args()
+    results = asyncio.run(
+        run(
+            args.sizes,
+            args.payload_types.split(","),
+            args.iterations,
+            args.latency,
+            args.concurrent,
+        )
+    )
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Memory per connection: channels created and joined to one group."""
+
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+
+from channel_box import Channel, ChannelBox
+
+from .common import parse_sizes
+from .fakes import FakeWebSocket
+
+
+async def measure(connections: int) -> dict:
+    await ChannelBox.flush_groups()
+    websockets = [FakeWebSocket() for _ in range(connections)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    for websocket in websockets:
+        channel = Channel(websocket=websocket, expires=3600, payload_type="json")
+        await ChannelBox.add_channel_to_group(channel, "bench")
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    await ChannelBox.flush_groups()
+
+    return {
+        "benchmark": "memory_per_connection",
+        "connections": connections,
+        "bytes_total": allocated,
+        "bytes_per_connection": round(allocated / connections, 1),
+    }
+
+
+async def run(sizes: list[int]) -> list[dict]:
+    return [await measure(size) for size in sizes]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes("10000"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_arguments(parser)
+    args = parser.parse_args()
+    for result in asyncio.run(run(args.sizes)):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import statistics
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Return p50/p99 of latency samples in milliseconds."""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {"p50_ms": round(value, 4), "p99_ms": round(value, 4)}
+
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 4),
+        "p99_ms": round(cuts[98] * 1000, 4),
+    }
+
+
+def parse_sizes(value: str) -> list[int]:
+    """Parse a comma separated list of sizes, e.g. ``10,1000,100000``."""
+    return [int(size) for size in value.split(",") if size]
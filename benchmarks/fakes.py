@@ -0,0 +1,38 @@
+import asyncio
+
+from starlette.websockets import WebSocket
+
+
+async def _receive() -> dict:
+    return {"type": "websocket.disconnect", "code": 1000}
+
+
+async def _send(message: dict) -> None:
+    return None
+
+
+class FakeWebSocket(WebSocket):
+    """In-memory WebSocket counting sent frames.
+
+    Args:
+        latency (float): Seconds every send takes, ``0`` sends instantly.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__({"type": "websocket"}, _receive, _send)
+        self.latency = latency
+        self.sent = 0
+
+    async def _deliver(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+
+    async def send_text(self, data: str) -> None:
+        await self._deliver()
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self._deliver()
+
+    async def send_json(self, data, mode: str = "text") -> None:
+        await self._deliver()
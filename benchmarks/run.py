@@ -0,0 +1,127 @@
+"""Run all benchmarks and write machine-readable results.
+
+Results are written as JSON. Passing ``--compare`` with a previous
+results file reports metrics that regressed by more than
+``--threshold`` and exits with status 1.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+
+from . import bench_clean, bench_fanout, bench_memory
+from .common import parse_sizes
+
+
+# Metric name -> True if higher is better.
+METRICS = {
+    "deliveries_per_s": True,
+    "messages_per_s": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "sweep_ms": False,
+    "bytes_per_connection": False,
+}
+
+PARAMETERS = (
+    "benchmark",
+    "group_size",
+    "payload_type",
+    "save_history",
+    "concurrent",
+    "latency_s",
+    "channels",
+    "groups",
+    "expired",
+    "connections",
+)
+
+
+def result_key(result: dict) -> tuple:
+    """Identify a result by its benchmark parameters."""
+    return tuple((name, result[name]) for name in PARAMETERS if name in result)
+
+
+def compare(current: list[dict], baseline: list[dict], threshold: float) -> list[str]:
+    """Return descriptions of metrics that regressed against a baseline."""
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+
+    for result in current:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+
+        for metric, higher_is_better in METRICS.items():
+            if metric not in result or not old.get(metric):
+                continue
+
+            change = (result[metric] - old[metric]) / old[metric]
+            if (-change if higher_is_better else change) > threshold:
+                params = ", ".join(
+                    f"{name}={value}" for name, value in result_key(result)
+                )
+                regressions.append(
+                    f"{params}: {metric} {old[metric]} -> {result[metric]} ({change:+.1%})"
+                )
+
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    results = []
+    results += await bench_fanout.run(
+        args.sizes,
+        args.payload_types.split(","),
+        args.iterations,
+        args.latency,
+        args.concurrent,
+    )
+    results += await bench_clean.run(args.clean_sizes, args.groups)
+    results += await bench_memory.run(args.memory_sizes)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    bench_fanout.add_arguments(parser)
+    parser.add_argument(
+        "--clean-sizes", type=parse_sizes, default=parse_sizes("1000,10000,100000")
+    )
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument(
+        "--memory-sizes", type=parse_sizes, default=parse_sizes("10000")
+    )
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    with open(args.output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)["results"]
+
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
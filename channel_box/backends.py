@@ -0,0 +1,267 @@
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable
+
+
+OnMessage = Callable[
+    [str | list[str], dict | str | bytes, bool, str, str], Awaitable[None]
+]
+
+
+def encode_envelope(
+    group_name: str | list[str],
+    payload: dict | str | bytes,
+    save_history: bool,
+    pattern: str = "",
+    prefix: str = "",
+) -> bytes:
+    """Encode a broadcast for transport between processes.
+
+    The envelope is a one-line JSON header followed by the raw payload,
+    so ``bytes`` payloads travel without re-encoding.
+
+    Args:
+        group_name (str | list[str]): Target group name, or several
+            group names for ``ChannelBox.send_to_groups``.
+        payload (dict | str | bytes): Payload to broadcast.
+        save_history (bool): Whether receivers save the message to history.
+        pattern (str): Glob pattern each receiver resolves against its
+            own groups.
+        prefix (str): Group name prefix each receiver resolves against
+            its own groups.
+
+    Returns:
+        bytes: Encoded envelope.
+    """
+    if isinstance(payload, bytes):
+        kind, body = "bytes", payload
+    elif isinstance(payload, str):
+        kind, body = "str", payload.encode("utf-8")
+    else:
+        kind, body = "json", json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+    meta = {"g": group_name, "k": kind, "h": save_history}
+    if pattern:
+        meta["p"] = pattern
+    if prefix:
+        meta["x"] = prefix
+
+    header = json.dumps(meta)
+    return header.encode("utf-8") + b"\n" + body
+
+
+def decode_envelope(
+    data: bytes,
+) -> tuple[str | list[str], dict | str | bytes, bool, str, str]:
+    """Decode an envelope produced by ``encode_envelope``.
+
+    Args:
+        data (bytes): Encoded envelope.
+
+    Returns:
+        tuple[str | list[str], dict | str | bytes, bool, str, str]: Group
+        name(s), payload, the save history flag, pattern and prefix.
+    """
+    header, _, body = data.partition(b"\n")
+    meta = json.loads(header)
+
+    payload: dict | str | bytes
+    match meta["k"]:
+        case "bytes":
+            payload = body
+        case "str":
+            payload = body.decode("utf-8")
+        case _:
+            payload = json.loads(body)
+
+    return meta["g"], payload, meta["h"], meta.get("p", ""), meta.get("x", "")
+
+
+class BaseBackend:
+    """Broadcast backend interface.
+
+    A backend carries ``group_send`` calls to peer ChannelBox instances,
+    which then fan out to their local channels. The default in-memory
+    mode has no backend at all.
+    """
+
+    async def start(self, on_message: OnMessage) -> None:
+        """Start receiving broadcasts from peers.
+
+        Args:
+            on_message (OnMessage): Coroutine called with the group
+                name(s), payload, save history flag, pattern and prefix
+                of every received broadcast.
+        """
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        """Stop the backend and release its resources."""
+        raise NotImplementedError
+
+    async def publish(
+        self,
+        group_name: str | list[str],
+        payload: dict | str | bytes,
+        save_history: bool = False,
+        pattern: str = "",
+        prefix: str = "",
+    ) -> None:
+        """Publish a broadcast to peers.
+
+        Args:
+            group_name (str | list[str]): Target group name, or several
+                group names whose union receives the payload once
+                per channel.
+            payload (dict | str | bytes): Payload to broadcast.
+            save_history (bool): Whether peers save the message to history.
+            pattern (str): Glob pattern over the group names of each peer,
+                added to the targets.
+            prefix (str): Group name prefix over the group names of each
+                peer, added to the targets.
+        """
+        raise NotImplementedError
+
+    async def subscribe(self, group_name: str) -> None:
+        """Start receiving broadcasts for a group.
+
+        Called when the first local channel joins the group. Backends
+        that deliver every broadcast to every peer can ignore it.
+
+        Args:
+            group_name (str): Group name.
+        """
+
+    async def unsubscribe(self, group_name: str) -> None:
+        """Stop receiving broadcasts for a group.
+
+        Called when the last local channel leaves the group.
+
+        Args:
+            group_name (str): Group name.
+        """
+
+
+class UnixSocketBackend(BaseBackend):
+    """Same-host backend over Unix domain datagram sockets.
+
+    Every process binds its own socket in a shared directory and
+    publishes by sending one datagram to each peer socket found there.
+    Sockets of dead processes are removed on the first failed send.
+
+    Datagram size is limited by the kernel socket buffers, so very
+    large payloads should go through another backend. Datagrams that a
+    peer cannot take are dropped and counted in ``send_errors``.
+    """
+
+    def __init__(
+        self,
+        path: str = os.getenv("CHANNEL_BOX_SOCKET_DIR", "/tmp/channel-box"),
+        peer_refresh: float = 1.0,
+    ) -> None:
+        """Initialize the backend.
+
+        Args:
+            path (str): Directory shared by all processes on the host.
+            peer_refresh (float): How often, in seconds, the directory
+                is listed again to discover new peers.
+        """
+        self.path = path
+        self.peer_refresh = peer_refresh
+        self.address = ""
+        self.send_errors = 0
+        self._sock: socket.socket | None = None
+        self._peers: list[str] = []
+        self._peers_listed = 0.0
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._consumer: asyncio.Task | None = None
+
+    async def start(self, on_message: OnMessage) -> None:
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        self.address = os.path.join(
+            self.path, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        )
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._sock.bind(self.address)
+
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._sock.fileno(), self._on_readable)
+        self._consumer = loop.create_task(self._consume(on_message))
+
+    async def stop(self) -> None:
+        if self._sock is not None:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.address)
+
+        if self._consumer is not None:
+            self._consumer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._consumer
+            self._consumer = None
+
+    async def publish(
+        self,
+        group_name: str | list[str],
+        payload: dict | str | bytes,
+        save_history: bool = False,
+        pattern: str = "",
+        prefix: str = "",
+    ) -> None:
+        if self._sock is None:
+            return
+
+        data = encode_envelope(group_name, payload, save_history, pattern, prefix)
+
+        for peer in self._list_peers():
+            try:
+                self._sock.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                with contextlib.suppress(OSError):
+                    os.unlink(peer)
+                self._peers.remove(peer)
+            except BlockingIOError:
+                # The peer is not draining its socket, drop the datagram.
+                self.send_errors += 1
+            except OSError:
+                # E.g. EMSGSIZE for an envelope over the datagram limit,
+                # local delivery must not fail because of a peer.
+                self.send_errors += 1
+
+    def _list_peers(self) -> list[str]:
+        """Return peer socket paths, listing the directory at most every ``peer_refresh`` seconds."""
+        now = time.monotonic()
+        if now - self._peers_listed >= self.peer_refresh:
+            self._peers = [
+                os.path.join(self.path, name)
+                for name in os.listdir(self.path)
+                if name.endswith(".sock")
+                and os.path.join(self.path, name) != self.address
+            ]
+            self._peers_listed = now
+        return list(self._peers)
+
+    def _on_readable(self) -> None:
+        """Read all pending datagrams into the inbox."""
+        while self._sock is not None:
+            try:
+                data = self._sock.recv(1 << 20)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._inbox.put_nowait(data)
+
+    async def _consume(self, on_message: OnMessage) -> None:
+        """Deliver received broadcasts in arrival order."""
+        while True:
+            data = await self._inbox.get()
+            with contextlib.suppress(Exception):
+                await on_message(*decode_envelope(data))
@@ -0,0 +1,482 @@
+import bisect
+import contextlib
+import io
+import mmap
+import os
+import time
+from array import array
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from uuid import UUID
+
+from .history import (
+    RECORD_HEADER,
+    UUID_OFFSET,
+    HistoryStore,
+    decode_payload,
+    encode_payload,
+    group_file_path,
+    group_name_from_file,
+)
+from .utils import ChannelMessageDC
+
+
+class _Segment:
+    """Append-only segment file with an in-memory offset index."""
+
+    __slots__ = (
+        "path",
+        "first_seq",
+        "offsets",
+        "lengths",
+        "created",
+        "size",
+        "_file",
+        "_map",
+    )
+
+    def __init__(self, path: str, first_seq: int) -> None:
+        self.path = path
+        self.first_seq = first_seq
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.created = array("d")
+        self.size = 0
+        self._file: io.FileIO | None = None
+        self._map: mmap.mmap | None = None
+
+    def load(self) -> None:
+        """Index the records on disk, truncating a torn trailing record."""
+        self.size = os.path.getsize(self.path)
+        if not self.size:
+            return
+
+        data = self.mapping()
+        offset = 0
+        while offset + RECORD_HEADER.size <= self.size:
+            seq, created, length, _, _ = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + length
+            if end > self.size or seq != self.first_seq + len(self.offsets):
+                break
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.created.append(created)
+            offset = end
+
+        if offset < self.size:
+            self.close()
+            os.truncate(self.path, offset)
+            self.size = offset
+
+    def write(self, record: bytes, length: int, created: float, fsync: bool) -> None:
+        """Append an encoded record to the file and the index."""
+        if self._file is None:
+            self._file = open(self.path, "ab", buffering=0)
+        self._file.write(record)
+        if fsync:
+            os.fsync(self._file.fileno())
+
+        self.offsets.append(self.size)
+        self.lengths.append(length)
+        self.created.append(created)
+        self.size += len(record)
+
+    def mapping(self) -> mmap.mmap:
+        """Return a read-only map of the file, remapped after it grew."""
+        if self._map is None or len(self._map) != self.size:
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self) -> None:
+        """Close the append handle and the map."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+
+class FileGroupHistory:
+    """Group history persisted in append-only segment files.
+
+    Messages are appended to the newest segment file and read back
+    through ``mmap``; only record offsets, sizes and timestamps are held
+    in memory. A segment is rotated once it reaches ``segment_bytes``
+    or ``segment_age`` seconds, and is deleted as soon as all of its
+    messages fall outside the limits, so compaction never rewrites data.
+
+    The interface matches ``GroupHistory``, so ``get_history`` cursor
+    reads work the same way. Message uuids are not indexed: uuid cursors
+    are resolved by scanning record headers from the newest message,
+    which is cheap for clients that are only slightly behind.
+    """
+
+    __slots__ = (
+        "directory",
+        "max_messages",
+        "max_bytes",
+        "max_age",
+        "segment_bytes",
+        "segment_age",
+        "fsync",
+        "nbytes",
+        "_segments",
+        "_firsts",
+        "_head",
+        "_next_seq",
+    )
+
+    def __init__(
+        self,
+        directory: str,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+        max_age: float = 0,
+        segment_bytes: int = 64 * 1024 * 1024,
+        segment_age: float = 0,
+        fsync: bool = False,
+    ) -> None:
+        """Open the history stored in a directory, creating it if needed.
+
+        Args:
+            directory (str): Directory holding the group segment files.
+            max_messages (int): Maximum number of messages,
+                ``0`` means unlimited.
+            max_bytes (int): Maximum total encoded size in bytes,
+                ``0`` means unlimited.
+            max_age (float): Maximum message age in seconds,
+                ``0`` means unlimited.
+            segment_bytes (int): Size after which a new segment is started.
+            segment_age (float): Age in seconds after which a new segment
+                is started, ``0`` disables age based rotation.
+            fsync (bool): Flush every appended message to disk.
+        """
+        self.directory = directory
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_bytes = segment_bytes
+        self.segment_age = segment_age
+        self.fsync = fsync
+        self.nbytes = 0
+        self._segments: list[_Segment] = []
+        self._firsts: list[int] = []
+        self._head = 1
+        self._next_seq = 1
+        self._load()
+
+    def _load(self) -> None:
+        """Index the segment files found in the directory."""
+        os.makedirs(self.directory, exist_ok=True)
+
+        names = sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.endswith(".log") and name[:-4].isdigit()
+        )
+        for name in names:
+            segment = _Segment(os.path.join(self.directory, name), int(name[:-4]))
+            segment.load()
+            if not len(segment) or (
+                self._segments and segment.first_seq != self._next_seq
+            ):
+                segment.close()
+                os.unlink(segment.path)
+                continue
+
+            if not self._segments:
+                self._head = segment.first_seq
+            self._segments.append(segment)
+            self._firsts.append(segment.first_seq)
+            self._next_seq = segment.first_seq + len(segment)
+            self.nbytes += sum(segment.lengths)
+
+        self._evict()
+
+    def append(
+        self,
+        message: ChannelMessageDC,
+        encoded: str | bytes | None = None,
+    ) -> None:
+        """Append a message to the newest segment and apply the limits.
+
+        Assigns the next sequence number to the message.
+
+        Args:
+            message (ChannelMessageDC): Message to store.
+            encoded (str | bytes | None): Payload already encoded as
+                JSON, saves encoding dict payloads a second time.
+        """
+        kind, data = encode_payload(message.payload, encoded)
+        message.seq = self._next_seq
+        created = message.created.timestamp()
+        segment = self._active_segment(created)
+        header = RECORD_HEADER.pack(
+            message.seq, created, len(data), message.uuid.bytes, kind
+        )
+        segment.write(header + data, len(data), created, self.fsync)
+
+        self._next_seq += 1
+        self.nbytes += len(data)
+        self._evict()
+
+    def _active_segment(self, now: float) -> _Segment:
+        """Return the segment to append to, rotating the current one if due."""
+        if self._segments:
+            segment = self._segments[-1]
+            if segment.size < self.segment_bytes and not (
+                self.segment_age and now - segment.created[0] >= self.segment_age
+            ):
+                return segment
+            segment.close()
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self._next_seq:020d}.log")
+        segment = _Segment(path, self._next_seq)
+        self._segments.append(segment)
+        self._firsts.append(segment.first_seq)
+        return segment
+
+    def set_limits(
+        self,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+    ) -> None:
+        """Change the limits and evict messages that no longer fit.
+
+        Args:
+            max_messages (int): Maximum number of messages,
+                ``0`` means unlimited.
+            max_bytes (int): Maximum total encoded size in bytes,
+                ``0`` means unlimited.
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def read(
+        self,
+        since: int | UUID | str | datetime | None = None,
+        limit: int | None = None,
+    ) -> list[ChannelMessageDC]:
+        """Return messages newer than a cursor, oldest first.
+
+        Accepts the same cursors as ``GroupHistory.read``.
+
+        Args:
+            since (int | UUID | str | datetime | None): Cursor of the
+                last message the client has seen.
+            limit (int | None): Maximum number of messages to return.
+
+        Returns:
+            list[ChannelMessageDC]: Messages after the cursor.
+        """
+        if self.max_age:
+            self._evict()
+
+        start = self._cursor_seq(since)
+        stop = self._next_seq if limit is None else min(start + limit, self._next_seq)
+        return [self._message(seq) for seq in range(start, stop)]
+
+    def _cursor_seq(self, since: int | UUID | str | datetime | None) -> int:
+        """Return the sequence number of the first message after a cursor."""
+        if since is None:
+            return self._head
+
+        if isinstance(since, datetime):
+            timestamp = since.timestamp()
+            for segment in self._segments:
+                if segment.created[-1] <= timestamp:
+                    continue
+                low = max(self._head - segment.first_seq, 0)
+                return segment.first_seq + bisect.bisect_right(
+                    segment.created, timestamp, lo=low
+                )
+            return self._next_seq
+
+        if isinstance(since, str):
+            since = UUID(since)
+        if isinstance(since, UUID):
+            seq = self._find_uuid(since.bytes)
+            if seq is None:
+                return self._head
+            since = seq
+
+        if since >= self._next_seq:
+            return self._head
+        return max(since + 1, self._head)
+
+    def _find_uuid(self, target: bytes) -> int | None:
+        """Scan record headers from the newest message for a uuid."""
+        for segment in reversed(self._segments):
+            data = segment.mapping()
+            low = max(self._head - segment.first_seq, 0)
+            for index in range(len(segment) - 1, low - 1, -1):
+                offset = segment.offsets[index] + UUID_OFFSET
+                if data[offset : offset + 16] == target:
+                    return segment.first_seq + index
+        return None
+
+    def _message(self, seq: int) -> ChannelMessageDC:
+        """Read and decode the message with a sequence number."""
+        segment, index = self._locate(seq)
+        offset = segment.offsets[index]
+        data = segment.mapping()
+        _, created, length, uuid_bytes, kind = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        body = data[start : start + length]
+
+        return ChannelMessageDC(
+            payload=decode_payload(kind, body),
+            size=length,
+            seq=seq,
+            uuid=UUID(bytes=uuid_bytes),
+            created=datetime.fromtimestamp(created, tz=UTC),
+        )
+
+    def _locate(self, seq: int) -> tuple[_Segment, int]:
+        """Return the segment holding a sequence number and its index."""
+        segment = self._segments[bisect.bisect_right(self._firsts, seq) - 1]
+        return segment, seq - segment.first_seq
+
+    def clear(self) -> None:
+        """Remove all messages and their segment files."""
+        for segment in self._segments:
+            segment.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(segment.path)
+        with contextlib.suppress(OSError):
+            os.rmdir(self.directory)
+
+        self._segments = []
+        self._firsts = []
+        self._head = self._next_seq
+        self.nbytes = 0
+
+    def close(self) -> None:
+        """Close open files and maps, keeping the data on disk."""
+        for segment in self._segments:
+            segment.close()
+
+    def _evict(self) -> None:
+        """Drop the oldest messages and delete segments left empty."""
+        expired_before = time.time() - self.max_age if self.max_age else None
+
+        while len(self):
+            segment, index = self._locate(self._head)
+            if not (
+                (self.max_messages and len(self) > self.max_messages)
+                or (self.max_bytes and self.nbytes > self.max_bytes)
+                or (
+                    expired_before is not None
+                    and segment.created[index] < expired_before
+                )
+            ):
+                break
+            self.nbytes -= segment.lengths[index]
+            self._head += 1
+
+        drop = 0
+        for segment in self._segments:
+            if segment.first_seq + len(segment) > self._head:
+                break
+            segment.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(segment.path)
+            drop += 1
+
+        if drop:
+            del self._segments[:drop]
+            del self._firsts[:drop]
+
+    def __len__(self) -> int:
+        return self._next_seq - self._head
+
+    def __iter__(self) -> Iterator[ChannelMessageDC]:
+        for seq in range(self._head, self._next_seq):
+            yield self._message(seq)
+
+    def __getitem__(
+        self, index: int | slice
+    ) -> ChannelMessageDC | list[ChannelMessageDC]:
+        if isinstance(index, slice):
+            return [
+                self._message(i + self._head) for i in range(*index.indices(len(self)))
+            ]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._message(index + self._head)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__} {self.directory=} {len(self)=} {self.nbytes=}"
+        )
+
+
+class FileHistoryStore(HistoryStore):
+    """History store keeping every group in its own segment directory.
+
+    History written by a previous run is picked up again when the store
+    is installed with ``ChannelBox.set_history_store``. Each worker
+    process needs its own directory, as segment files are not shared.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_age: float = 0,
+        segment_bytes: int = 64 * 1024 * 1024,
+        segment_age: float = 0,
+        fsync: bool = False,
+    ) -> None:
+        """Initialize the store.
+
+        Args:
+            directory (str): Root directory of the store.
+            max_age (float): Maximum message age in seconds,
+                ``0`` means unlimited.
+            segment_bytes (int): Size after which a new segment is started.
+            segment_age (float): Age in seconds after which a new segment
+                is started, ``0`` disables age based rotation.
+            fsync (bool): Flush every appended message to disk.
+        """
+        self.directory = directory
+        self.max_age = max_age
+        self.segment_bytes = segment_bytes
+        self.segment_age = segment_age
+        self.fsync = fsync
+
+    def open(
+        self,
+        group_name: str,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+    ) -> FileGroupHistory:
+        return FileGroupHistory(
+            group_file_path(self.directory, group_name),
+            max_messages=max_messages,
+            max_bytes=max_bytes,
+            max_age=self.max_age,
+            segment_bytes=self.segment_bytes,
+            segment_age=self.segment_age,
+            fsync=self.fsync,
+        )
+
+    def groups(self) -> list[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        groups = [
+            group_name_from_file(name, self.directory)
+            for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        ]
+        return sorted(group_name for group_name in groups if group_name is not None)
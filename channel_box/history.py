@@ -0,0 +1,392 @@
+import base64
+import binascii
+import bisect
+import hashlib
+import json
+import os
+import struct
+from collections.abc import Iterator
+from datetime import datetime
+from itertools import islice
+from typing import Protocol
+from uuid import UUID
+
+from .utils import ChannelMessageDC
+
+# Record layout of persistent histories:
+# seq, created timestamp, payload length, uuid, payload kind.
+RECORD_HEADER = struct.Struct(">QdI16sB")
+UUID_OFFSET = struct.calcsize(">QdI")
+
+KIND_BYTES = 0
+KIND_TEXT = 1
+KIND_JSON = 2
+
+# Prefix of the file names that persistent stores derive from group names.
+GROUP_FILE_PREFIX = "g-"
+# Names whose encoding is longer than GROUP_FILE_MAX characters are hashed,
+# the full name is kept in a GROUP_NAME_SUFFIX file next to the group file.
+HASHED_FILE_PREFIX = "h-"
+GROUP_FILE_MAX = 128
+GROUP_NAME_SUFFIX = ".name"
+
+
+def encode_payload(
+    payload: dict | str | bytes,
+    encoded: str | bytes | None = None,
+) -> tuple[int, bytes]:
+    """Encode a history payload for a persistent record.
+
+    Args:
+        payload (dict | str | bytes): Message payload.
+        encoded (str | bytes | None): JSON encoding of a dict payload,
+            if it was already produced for sending.
+
+    Returns:
+        tuple[int, bytes]: Payload kind and encoded body.
+    """
+    if isinstance(payload, bytes):
+        return KIND_BYTES, payload
+    if isinstance(payload, str):
+        return KIND_TEXT, payload.encode("utf-8")
+    if encoded is None:
+        encoded = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return KIND_JSON, encoded.encode("utf-8") if isinstance(encoded, str) else encoded
+
+
+def decode_payload(kind: int, body: bytes) -> dict | str | bytes:
+    """Decode a record body written by ``encode_payload``."""
+    if kind == KIND_BYTES:
+        return body
+    if kind == KIND_TEXT:
+        return body.decode("utf-8")
+    return json.loads(body)
+
+
+def group_file_name(group_name: str) -> str:
+    """Map a group name to a safe file name.
+
+    The name is base32 encoded, so it never contains path separators,
+    never equals ``.`` or ``..`` and does not depend on the case
+    sensitivity of the file system. Names too long for the file system
+    are replaced by their hash.
+
+    Args:
+        group_name (str): Group name.
+
+    Returns:
+        str: File name, without extension.
+    """
+    encoded = base64.b32encode(group_name.encode("utf-8")).decode("ascii")
+    encoded = encoded.rstrip("=").lower()
+    if len(encoded) > GROUP_FILE_MAX:
+        digest = hashlib.blake2b(group_name.encode("utf-8"), digest_size=16)
+        return HASHED_FILE_PREFIX + digest.hexdigest()
+    return GROUP_FILE_PREFIX + encoded
+
+
+def group_file_path(directory: str, group_name: str) -> str:
+    """Return the path of a group file, recording hashed group names.
+
+    Args:
+        directory (str): Directory of the group files.
+        group_name (str): Group name.
+
+    Returns:
+        str: File path, without extension.
+    """
+    path = os.path.join(directory, group_file_name(group_name))
+    name_path = path + GROUP_NAME_SUFFIX
+    if os.path.basename(path).startswith(HASHED_FILE_PREFIX) and not (
+        os.path.exists(name_path)
+    ):
+        os.makedirs(directory, exist_ok=True)
+        with open(name_path, "w", encoding="utf-8") as file:
+            file.write(group_name)
+    return path
+
+
+def group_name_from_file(file_name: str, directory: str | None = None) -> str | None:
+    """Reverse ``group_file_name``.
+
+    Args:
+        file_name (str): File name, without extension.
+        directory (str | None): Directory of the file, needed to read
+            the names recorded by ``group_file_path``.
+
+    Returns:
+        str | None: Group name, or ``None`` if the file was not
+        created by ``group_file_name``.
+    """
+    if file_name.startswith(HASHED_FILE_PREFIX) and directory is not None:
+        try:
+            name_path = os.path.join(directory, file_name + GROUP_NAME_SUFFIX)
+            with open(name_path, encoding="utf-8") as file:
+                return file.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+    if not file_name.startswith(GROUP_FILE_PREFIX):
+        return None
+    encoded = file_name[len(GROUP_FILE_PREFIX) :].upper()
+    try:
+        return base64.b32decode(encoded + "=" * (-len(encoded) % 8)).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+
+
+class GroupHistory:
+    """Bounded ring buffer of group messages.
+
+    Messages are kept in insertion order. When the message count or the
+    total encoded size exceeds the configured limits, the oldest
+    messages are evicted one by one.
+
+    Every message gets a monotonic sequence number, which together with
+    a uuid index allows cursor reads without scanning the history.
+    """
+
+    __slots__ = (
+        "max_messages",
+        "max_bytes",
+        "nbytes",
+        "_items",
+        "_head",
+        "_next_seq",
+        "_by_uuid",
+    )
+
+    def __init__(
+        self,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+    ) -> None:
+        """Initialize an empty group history.
+
+        Args:
+            max_messages (int): Maximum number of messages,
+                ``0`` means unlimited.
+            max_bytes (int): Maximum total encoded size in bytes,
+                ``0`` means unlimited.
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items: list[ChannelMessageDC | None] = []
+        self._head = 0
+        self._next_seq = 1
+        self._by_uuid: dict[UUID, int] = {}
+
+    def append(
+        self,
+        message: ChannelMessageDC,
+        encoded: str | bytes | None = None,
+    ) -> None:
+        """Append a message and evict the oldest ones over the limits.
+
+        Assigns the next sequence number to the message.
+
+        Args:
+            message (ChannelMessageDC): Message to store.
+            encoded (str | bytes | None): Encoded payload, only used by
+                persistent histories.
+        """
+        message.seq = self._next_seq
+        self._next_seq += 1
+        self._by_uuid[message.uuid] = message.seq
+        self._items.append(message)
+        self.nbytes += message.size
+        self._evict()
+
+    def set_limits(
+        self,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+    ) -> None:
+        """Change the limits and evict messages that no longer fit.
+
+        Args:
+            max_messages (int): Maximum number of messages,
+                ``0`` means unlimited.
+            max_bytes (int): Maximum total encoded size in bytes,
+                ``0`` means unlimited.
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def read(
+        self,
+        since: int | UUID | str | datetime | None = None,
+        limit: int | None = None,
+    ) -> list[ChannelMessageDC]:
+        """Return messages newer than a cursor, oldest first.
+
+        The cursor can be a sequence number, a message uuid or a
+        ``created`` timestamp. Sequence and uuid cursors are resolved
+        by index lookup, timestamps by binary search. A cursor that is
+        no longer (or never was) in this history returns everything
+        still stored, so the client can resynchronize.
+
+        Args:
+            since (int | UUID | str | datetime | None): Cursor of the
+                last message the client has seen.
+            limit (int | None): Maximum number of messages to return.
+
+        Returns:
+            list[ChannelMessageDC]: Messages after the cursor.
+        """
+        start = self._cursor_index(since)
+        stop = (
+            len(self._items) if limit is None else min(start + limit, len(self._items))
+        )
+        return self._items[start:stop]
+
+    def _cursor_index(self, since: int | UUID | str | datetime | None) -> int:
+        """Return the backing list index of the first message after a cursor."""
+        if since is None:
+            return self._head
+
+        if isinstance(since, datetime):
+            # Timestamps, so naive cursors compare as local time.
+            return bisect.bisect_right(
+                self._items,
+                since.timestamp(),
+                lo=self._head,
+                key=lambda message: message.created.timestamp(),
+            )
+
+        if isinstance(since, str):
+            since = UUID(since)
+        if isinstance(since, UUID):
+            seq = self._by_uuid.get(since)
+            if seq is None:
+                return self._head
+            since = seq
+
+        if since >= self._next_seq:
+            return self._head
+
+        first_seq = self._next_seq - len(self)
+        return self._head + max(since - first_seq + 1, 0)
+
+    def clear(self) -> None:
+        """Remove all messages."""
+        self._items = []
+        self._head = 0
+        self._by_uuid = {}
+        self.nbytes = 0
+
+    def close(self) -> None:
+        """Release resources held by the history, a no-op in memory."""
+
+    def _evict(self) -> None:
+        """Drop the oldest messages until the limits are satisfied."""
+        while len(self) and (
+            (self.max_messages and len(self) > self.max_messages)
+            or (self.max_bytes and self.nbytes > self.max_bytes)
+        ):
+            message = self._items[self._head]
+            self._items[self._head] = None
+            self._head += 1
+            self.nbytes -= message.size
+            self._by_uuid.pop(message.uuid, None)
+
+        # Compact the backing list once the evicted prefix dominates it.
+        if self._head and self._head * 2 >= len(self._items):
+            del self._items[: self._head]
+            self._head = 0
+
+    def __len__(self) -> int:
+        return len(self._items) - self._head
+
+    def __iter__(self) -> Iterator[ChannelMessageDC]:
+        return islice(self._items, self._head, None)
+
+    def __getitem__(
+        self, index: int | slice
+    ) -> ChannelMessageDC | list[ChannelMessageDC]:
+        if isinstance(index, slice):
+            return [
+                self._items[i + self._head] for i in range(*index.indices(len(self)))
+            ]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._items[index + self._head]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__} {len(self)=} {self.nbytes=}"
+
+
+class GroupHistoryProtocol(Protocol):
+    """Interface of the group histories returned by ``HistoryStore.open``.
+
+    Implemented by ``GroupHistory`` and the histories of the persistent
+    stores.
+    """
+
+    @property
+    def nbytes(self) -> int: ...
+
+    def append(
+        self,
+        message: ChannelMessageDC,
+        encoded: str | bytes | None = None,
+    ) -> None: ...
+
+    def set_limits(self, max_messages: int = 0, max_bytes: int = 0) -> None: ...
+
+    def read(
+        self,
+        since: int | UUID | str | datetime | None = None,
+        limit: int | None = None,
+    ) -> list[ChannelMessageDC]: ...
+
+    def clear(self) -> None: ...
+
+    def close(self) -> None: ...
+
+    def __len__(self) -> int: ...
+
+    def __iter__(self) -> Iterator[ChannelMessageDC]: ...
+
+
+class HistoryStore:
+    """Factory of group histories.
+
+    The default store keeps every group in a ``GroupHistory`` in
+    process memory. Persistent stores override ``open`` and ``groups``.
+    ``shared`` stores are visible to every local worker, so messages
+    received from peer workers are not saved a second time.
+    """
+
+    shared = False
+
+    def open(
+        self,
+        group_name: str,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+    ) -> GroupHistoryProtocol:
+        """Open the history of a group.
+
+        Args:
+            group_name (str): Group name.
+            max_messages (int): Maximum number of messages,
+                ``0`` means unlimited.
+            max_bytes (int): Maximum total encoded size in bytes,
+                ``0`` means unlimited.
+
+        Returns:
+            GroupHistoryProtocol: History of the group.
+        """
+        return GroupHistory(max_messages, max_bytes)
+
+    def groups(self) -> list[str]:
+        """Return the names of groups with history kept by the store.
+
+        Returns:
+            list[str]: Group names, empty for the in-memory store.
+        """
+        return []
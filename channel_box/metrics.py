@@ -0,0 +1,197 @@
+class BaseMetrics:
+    """No-op metrics hooks.
+
+    ChannelBox calls these hooks from its hot paths. The default
+    implementation does nothing and sets ``enabled = False``, which also
+    lets ChannelBox skip timing calls entirely.
+    """
+
+    enabled: bool = False
+
+    def on_fan_out(
+        self,
+        group_name: str,
+        duration: float,
+        sent: int,
+        failed: int,
+    ) -> None:
+        """Report a finished local fan-out to a group.
+
+        Args:
+            group_name (str): Group name.
+            duration (float): Fan-out duration in seconds.
+            sent (int): Number of successful sends.
+            failed (int): Number of failed or timed out sends.
+        """
+
+    def on_direct_send(
+        self,
+        duration: float,
+        sent: int,
+        failed: int,
+    ) -> None:
+        """Report a finished send to channels addressed by uuid or key.
+
+        Args:
+            duration (float): Send duration in seconds.
+            sent (int): Number of successful sends.
+            failed (int): Number of failed or timed out sends.
+        """
+
+    def on_evicted(
+        self,
+        reason: str,
+        count: int = 1,
+    ) -> None:
+        """Report channels removed by ChannelBox.
+
+        Args:
+            reason (str): Eviction reason, ``failure`` or ``expiry``.
+            count (int): Number of evicted channels.
+        """
+
+    def on_rate_limited(
+        self,
+        group_name: str,
+        policy: str,
+    ) -> None:
+        """Report a message that exceeded a channel rate limit.
+
+        Args:
+            group_name (str): Group name.
+            policy (str): Applied policy, ``drop``, ``delay`` or
+                ``disconnect``.
+        """
+
+    def snapshot(self) -> dict:
+        """Return the collected counters."""
+        return {}
+
+
+class CounterMetrics(BaseMetrics):
+    """In-memory metrics collector.
+
+    Keeps per-group fan-out timings, send counters, eviction
+    counters and per-group rate limit counters. Use ``ChannelBox.metrics_snapshot`` to combine them with
+    the current group, channel and history gauges.
+    """
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.fan_out: dict[str, dict] = {}
+        self.sends: dict[str, int] = {"success": 0, "failure": 0}
+        self.evictions: dict[str, int] = {"failure": 0, "expiry": 0}
+        self.rate_limited: dict[str, dict[str, int]] = {}
+
+    def on_fan_out(
+        self,
+        group_name: str,
+        duration: float,
+        sent: int,
+        failed: int,
+    ) -> None:
+        stats = self.fan_out.get(group_name)
+        if stats is None:
+            stats = self.fan_out[group_name] = {
+                "count": 0,
+                "seconds_total": 0.0,
+                "seconds_max": 0.0,
+            }
+        stats["count"] += 1
+        stats["seconds_total"] += duration
+        stats["seconds_max"] = max(stats["seconds_max"], duration)
+
+        self.sends["success"] += sent
+        self.sends["failure"] += failed
+
+    def on_direct_send(
+        self,
+        duration: float,
+        sent: int,
+        failed: int,
+    ) -> None:
+        self.sends["success"] += sent
+        self.sends["failure"] += failed
+
+    def on_evicted(
+        self,
+        reason: str,
+        count: int = 1,
+    ) -> None:
+        self.evictions[reason] = self.evictions.get(reason, 0) + count
+
+    def on_rate_limited(
+        self,
+        group_name: str,
+        policy: str,
+    ) -> None:
+        counters = self.rate_limited.setdefault(group_name, {})
+        counters[policy] = counters.get(policy, 0) + 1
+
+    def snapshot(self) -> dict:
+        snapshot = {
+            "fan_out": {name: dict(stats) for name, stats in self.fan_out.items()},
+            "sends": dict(self.sends),
+            "evictions": dict(self.evictions),
+        }
+        if self.rate_limited:
+            snapshot["rate_limited"] = {
+                name: dict(counters) for name, counters in self.rate_limited.items()
+            }
+        return snapshot
+
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def to_prometheus(snapshot: dict, prefix: str = "channel_box") -> str:
+    """Render a metrics snapshot in the Prometheus text format.
+
+    Args:
+        snapshot (dict): Snapshot returned by ``ChannelBox.metrics_snapshot``.
+        prefix (str): Metric name prefix.
+
+    Returns:
+        str: Prometheus exposition text.
+    """
+    lines = []
+
+    if snapshot.get("fan_out"):
+        lines.append(f"# TYPE {prefix}_fan_out_seconds summary")
+        for group_name, stats in snapshot["fan_out"].items():
+            label = f'{{group="{_escape(group_name)}"}}'
+            lines.append(
+                f"{prefix}_fan_out_seconds_sum{label} {stats['seconds_total']}"
+            )
+            lines.append(f"{prefix}_fan_out_seconds_count{label} {stats['count']}")
+        lines.append(f"# TYPE {prefix}_fan_out_seconds_max gauge")
+        for group_name, stats in snapshot["fan_out"].items():
+            label = f'{{group="{_escape(group_name)}"}}'
+            lines.append(f"{prefix}_fan_out_seconds_max{label} {stats['seconds_max']}")
+
+    for name, label_name in (("sends", "result"), ("evictions", "reason")):
+        if name in snapshot:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for key, value in snapshot[name].items():
+                lines.append(
+                    f'{prefix}_{name}_total{{{label_name}="{_escape(key)}"}} {value}'
+                )
+
+    if snapshot.get("rate_limited"):
+        lines.append(f"# TYPE {prefix}_rate_limited_total counter")
+        for group_name, counters in snapshot["rate_limited"].items():
+            for policy, value in counters.items():
+                lines.append(
+                    f'{prefix}_rate_limited_total{{group="{_escape(group_name)}",'
+                    f'policy="{_escape(policy)}"}} {value}'
+                )
+
+    for name in ("groups", "channels", "history_messages", "history_bytes"):
+        if name in snapshot:
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {snapshot[name]}")
+
+    return "\n".join(lines) + "\n"
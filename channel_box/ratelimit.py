@@ -0,0 +1,73 @@
+import time
+
+
+class TokenBucket:
+    """Token bucket rate limiter.
+
+    The bucket holds up to ``burst`` tokens and refills at ``rate``
+    tokens per second. Every message takes one token.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "exceeded")
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        """Initialize a full bucket.
+
+        Args:
+            rate (float): Refill rate in tokens per second.
+            burst (float | None): Bucket capacity, defaults to ``rate``
+                (at least one token).
+        """
+        self.rate = rate
+        self.burst = max(burst if burst is not None else rate, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.exceeded = 0
+
+    def update(self, rate: float, burst: float | None = None) -> None:
+        """Change the limits of the bucket.
+
+        Tokens collected at the old rate are kept, up to the new burst.
+
+        Args:
+            rate (float): Refill rate in tokens per second.
+            burst (float | None): Bucket capacity, defaults to ``rate``
+                (at least one token).
+        """
+        burst = max(burst if burst is not None else rate, 1.0)
+        if rate == self.rate and burst == self.burst:
+            return
+
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.rate = rate
+        self.burst = burst
+
+    def consume(self, reserve: bool = False) -> float:
+        """Take a token if one is available.
+
+        Args:
+            reserve (bool): Take the token even if the bucket is empty,
+                going into debt that later calls have to wait out.
+
+        Returns:
+            float: ``0.0`` if the token was available, otherwise the
+            number of seconds until it is.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        self.exceeded += 1
+        wait = (1 - self.tokens) / self.rate
+        if reserve:
+            self.tokens -= 1
+        return wait
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__} {self.rate=} {self.burst=} {self.tokens=}"
@@ -0,0 +1,485 @@
+import asyncio
+import contextlib
+import uuid
+from collections import deque
+from urllib.parse import unquote, urlparse
+
+from .backends import BaseBackend, OnMessage, decode_envelope, encode_envelope
+
+
+class RedisError(Exception):
+    """Error reply returned by a Redis-protocol server."""
+
+
+def encode_command(*args: str | bytes | int) -> bytes:
+    """Encode a command as a RESP array of bulk strings.
+
+    Args:
+        *args (str | bytes | int): Command name and arguments.
+
+    Returns:
+        bytes: Encoded command.
+    """
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, int):
+            arg = str(arg)
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def encode_push(kind: bytes, channel: bytes, count: int) -> bytes:
+    """Encode a ``subscribe``/``unsubscribe`` confirmation push."""
+    return b"*3\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n:%d\r\n" % (
+        len(kind),
+        kind,
+        len(channel),
+        channel,
+        count,
+    )
+
+
+async def read_reply(
+    reader: asyncio.StreamReader,
+) -> str | bytes | int | list | RedisError | None:
+    """Read a single RESP reply.
+
+    Args:
+        reader (asyncio.StreamReader): Connection reader.
+
+    Returns:
+        str | bytes | int | list | RedisError | None: Decoded reply.
+        Error replies are returned, not raised.
+
+    Raises:
+        ConnectionError: If the connection was closed.
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+
+    kind, value = line[:1], line[1:-2]
+    match kind:
+        case b"+":
+            return value.decode("utf-8")
+        case b"-":
+            return RedisError(value.decode("utf-8"))
+        case b":":
+            return int(value)
+        case b"$":
+            length = int(value)
+            if length < 0:
+                return None
+            data = await reader.readexactly(length + 2)
+            return data[:-2]
+        case b"*":
+            length = int(value)
+            if length < 0:
+                return None
+            return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply: {line!r}")
+
+
+async def open_connection(
+    url: str,
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Open a connection to a ``redis://`` or ``unix://`` URL.
+
+    Sends ``AUTH`` when the URL contains a password.
+
+    Args:
+        url (str): Server URL.
+
+    Returns:
+        tuple[asyncio.StreamReader, asyncio.StreamWriter]: Connection streams.
+    """
+    parsed = urlparse(url)
+
+    if parsed.scheme == "unix":
+        reader, writer = await asyncio.open_unix_connection(parsed.path)
+    else:
+        reader, writer = await asyncio.open_connection(
+            parsed.hostname or "127.0.0.1",
+            parsed.port or 6379,
+        )
+
+    if parsed.password:
+        args = ["AUTH", unquote(parsed.password)]
+        if parsed.username:
+            args.insert(1, unquote(parsed.username))
+        writer.write(encode_command(*args))
+        reply = await read_reply(reader)
+        if isinstance(reply, RedisError):
+            writer.close()
+            raise reply
+
+    return reader, writer
+
+
+def close_connection(
+    connection: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None,
+) -> None:
+    """Close a connection opened with ``open_connection``, if any."""
+    if connection is not None:
+        connection[1].close()
+
+
+class RedisBackend(BaseBackend):
+    """Multi-node backend over Redis-protocol pub/sub.
+
+    Each group maps to a pub/sub channel. A node subscribes to a group
+    only while it has a local member, so it never receives traffic it
+    would drop. Publishes issued within one event loop iteration are
+    pipelined and written to the server in a single batch.
+
+    A broadcast to several groups is published to each of their
+    channels; receivers drop the copies they have already seen. A
+    broadcast with a pattern or prefix is also published to the
+    ``<prefix>*`` channel, which every node subscribes to, as only the
+    receivers know which of their groups match.
+
+    Lost connections are reopened with exponential backoff and the
+    subscriptions restored. Meanwhile at most ``max_pending`` publishes
+    are kept, the oldest ones are dropped and counted in ``dropped``.
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://127.0.0.1:6379",
+        prefix: str = "channel-box:",
+        max_pending: int = 10_000,
+        reconnect_delay: float = 0.1,
+        max_reconnect_delay: float = 10.0,
+    ) -> None:
+        """Initialize the backend.
+
+        Args:
+            url (str): Server URL, ``redis://[[user]:password@]host:port``
+                or ``unix:///path/to/socket``.
+            prefix (str): Prefix of pub/sub channel names.
+            max_pending (int): Maximum number of publishes waiting to
+                be written.
+            reconnect_delay (float): First delay in seconds between
+                reconnection attempts, doubled after every failure.
+            max_reconnect_delay (float): Upper bound of the delay.
+        """
+        self.url = url
+        self.prefix = prefix
+        self.max_pending = max_pending
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.node_id = uuid.uuid4().bytes
+        self.selector_channel = prefix + "*"
+        self.dropped = 0
+        self._subscribed: set[str] = set()
+        self._seen: deque[bytes] = deque(maxlen=1024)
+        self._seen_ids: set[bytes] = set()
+        self._pending: deque[bytes] = deque(maxlen=max_pending)
+        self._writing = False
+        self._wakeup = asyncio.Event()
+        self._written = asyncio.Event()
+        self._pub: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None = None
+        self._sub: tuple[asyncio.StreamReader, asyncio.StreamWriter] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self, on_message: OnMessage) -> None:
+        self._pub = await open_connection(self.url)
+        self._sub = await open_connection(self.url)
+        await self._restore_subscriptions()
+
+        loop = asyncio.get_running_loop()
+        self._tasks = [
+            loop.create_task(self._run_publisher()),
+            loop.create_task(self._run_subscriber(on_message)),
+        ]
+
+    async def stop(self) -> None:
+        await self.flush()
+
+        for task in self._tasks:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+        for connection in (self._pub, self._sub):
+            if connection is not None:
+                connection[1].close()
+                with contextlib.suppress(Exception):
+                    await connection[1].wait_closed()
+        self._pub = self._sub = None
+        self._subscribed = set()
+
+    async def publish(
+        self,
+        group_name: str | list[str],
+        payload: dict | str | bytes,
+        save_history: bool = False,
+        pattern: str = "",
+        prefix: str = "",
+    ) -> None:
+        group_names = [group_name] if isinstance(group_name, str) else group_name
+        data = (
+            self.node_id
+            + uuid.uuid4().bytes
+            + encode_envelope(group_name, payload, save_history, pattern, prefix)
+        )
+        channels = [self.prefix + name for name in group_names]
+        if pattern or prefix:
+            channels.append(self.selector_channel)
+        for channel in channels:
+            if len(self._pending) == self.max_pending:
+                self.dropped += 1
+            self._pending.append(encode_command("PUBLISH", channel, data))
+        self._wakeup.set()
+
+    async def subscribe(self, group_name: str) -> None:
+        if group_name in self._subscribed:
+            return
+        self._subscribed.add(group_name)
+        await self._write_subscription("SUBSCRIBE", self.prefix + group_name)
+
+    async def unsubscribe(self, group_name: str) -> None:
+        if group_name not in self._subscribed:
+            return
+        self._subscribed.discard(group_name)
+        if self.prefix + group_name == self.selector_channel:
+            return
+        await self._write_subscription("UNSUBSCRIBE", self.prefix + group_name)
+
+    async def flush(self) -> None:
+        """Wait until all pending publishes have been written.
+
+        Returns early while the server is unreachable.
+        """
+        while (
+            (self._pending or self._writing)
+            and self._pub is not None
+            and self._tasks
+            and not self._tasks[0].done()
+        ):
+            # Woken up after every batch, or if the publisher task ends.
+            self._written.clear()
+            written = asyncio.ensure_future(self._written.wait())
+            await asyncio.wait(
+                [written, self._tasks[0]], return_when=asyncio.FIRST_COMPLETED
+            )
+            written.cancel()
+
+    async def _write_subscription(self, command: str, channel: str) -> None:
+        """Send a subscription change, if the subscriber is connected.
+
+        Errors are left to the subscriber task, which reconnects and
+        restores ``_subscribed``.
+        """
+        if self._sub is None:
+            return
+        with contextlib.suppress(OSError):
+            self._sub[1].write(encode_command(command, channel))
+            await self._sub[1].drain()
+
+    async def _restore_subscriptions(self) -> None:
+        """Subscribe a new subscriber connection to all channels."""
+        channels = [self.prefix + name for name in self._subscribed]
+        await self._write_subscription("SUBSCRIBE", self.selector_channel)
+        for channel in channels:
+            await self._write_subscription("SUBSCRIBE", channel)
+
+    async def _reconnect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Open a new connection, retrying with exponential backoff."""
+        delay = self.reconnect_delay
+        while True:
+            await asyncio.sleep(delay)
+            with contextlib.suppress(OSError, RedisError):
+                return await open_connection(self.url)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _run_publisher(self) -> None:
+        """Write pending publishes in pipelined batches."""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            if not self._pending:
+                continue
+            batch = list(self._pending)
+            self._pending.clear()
+
+            self._writing = True
+            try:
+                if self._pub is None:
+                    self._pub = await self._reconnect()
+                reader, writer = self._pub
+                writer.write(b"".join(batch))
+                await writer.drain()
+                for _ in batch:
+                    await read_reply(reader)
+            except (OSError, asyncio.IncompleteReadError):
+                # Write the batch again on a new connection, receivers
+                # drop the messages they have already seen.
+                close_connection(self._pub)
+                self._pub = None
+                # Keep the newest publishes, the batch is older than _pending.
+                room = self.max_pending - len(self._pending)
+                if len(batch) > room:
+                    self.dropped += len(batch) - room
+                    batch = batch[len(batch) - room :]
+                self._pending.extendleft(reversed(batch))
+                self._wakeup.set()
+            finally:
+                self._writing = False
+                self._written.set()
+
+    async def _run_subscriber(self, on_message: OnMessage) -> None:
+        """Dispatch pub/sub messages published by other nodes."""
+        node_id_size = len(self.node_id)
+
+        while True:
+            if self._sub is None:
+                self._sub = await self._reconnect()
+                await self._restore_subscriptions()
+
+            try:
+                reply = await read_reply(self._sub[0])
+            except (OSError, asyncio.IncompleteReadError):
+                close_connection(self._sub)
+                self._sub = None
+                continue
+
+            if not isinstance(reply, list) or reply[0] != b"message":
+                continue
+
+            data = reply[2]
+            if data[:node_id_size] == self.node_id:
+                continue
+
+            message_id = data[node_id_size : node_id_size + 16]
+            if message_id in self._seen_ids:
+                continue
+            if len(self._seen) == self._seen.maxlen:
+                self._seen_ids.discard(self._seen.popleft())
+            self._seen.append(message_id)
+            self._seen_ids.add(message_id)
+
+            with contextlib.suppress(Exception):
+                await on_message(*decode_envelope(data[node_id_size + 16 :]))
+
+
+class FakeRedisServer:
+    """Pure-Python in-process server speaking the Redis pub/sub protocol.
+
+    Implements ``PING``, ``AUTH``, ``SUBSCRIBE``, ``UNSUBSCRIBE``,
+    ``PUBLISH`` and ``QUIT``, which is enough to run ``RedisBackend``
+    in tests and local development without a Redis installation.
+    """
+
+    def __init__(self) -> None:
+        self.subscriptions: dict[bytes, set[asyncio.StreamWriter]] = {}
+        self._clients: set[asyncio.StreamWriter] = set()
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(
+        self,
+        path: str | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> str:
+        """Start serving.
+
+        Args:
+            path (str | None): Unix socket path. If given, the server
+                listens on it instead of TCP.
+            host (str): TCP host.
+            port (int): TCP port, ``0`` picks a free one.
+
+        Returns:
+            str: URL to pass to ``RedisBackend``.
+        """
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+            return f"unix://{path}"
+
+        self._server = await asyncio.start_server(self._handle, host, port)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}"
+
+    async def stop(self) -> None:
+        """Stop serving and close client connections."""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        self.subscriptions = {}
+
+    async def _handle(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        """Serve a single client connection."""
+        if self._server is None:
+            # Accepted just before the server was stopped.
+            writer.close()
+            return
+
+        subscribed: set[bytes] = set()
+        self._clients.add(writer)
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    continue
+
+                name, *args = command
+                match name.upper():
+                    case b"PING":
+                        writer.write(b"+PONG\r\n")
+                    case b"AUTH":
+                        writer.write(b"+OK\r\n")
+                    case b"SUBSCRIBE":
+                        for channel in args:
+                            subscribed.add(channel)
+                            self.subscriptions.setdefault(channel, set()).add(writer)
+                            writer.write(
+                                encode_push(b"subscribe", channel, len(subscribed))
+                            )
+                    case b"UNSUBSCRIBE":
+                        for channel in args or list(subscribed):
+                            subscribed.discard(channel)
+                            self._unsubscribe(channel, writer)
+                            writer.write(
+                                encode_push(b"unsubscribe", channel, len(subscribed))
+                            )
+                    case b"PUBLISH":
+                        channel, data = args
+                        receivers = self.subscriptions.get(channel, ())
+                        message = encode_command("message", channel, data)
+                        for receiver in receivers:
+                            receiver.write(message)
+                        writer.write(b":%d\r\n" % len(receivers))
+                    case b"QUIT":
+                        writer.write(b"+OK\r\n")
+                        break
+                    case _:
+                        writer.write(b"-ERR unknown command\r\n")
+
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self._unsubscribe(channel, writer)
+            self._clients.discard(writer)
+            writer.close()
+
+    def _unsubscribe(self, channel: bytes, writer: asyncio.StreamWriter) -> None:
+        """Remove a writer from a channel's subscribers."""
+        writers = self.subscriptions.get(channel)
+        if writers is not None:
+            writers.discard(writer)
+            if not writers:
+                del self.subscriptions[channel]
@@ -0,0 +1,472 @@
+import bisect
+import contextlib
+import fcntl
+import hashlib
+import os
+import struct
+import tempfile
+import warnings
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from multiprocessing import resource_tracker, shared_memory
+from uuid import UUID
+
+from .history import (
+    GROUP_NAME_SUFFIX,
+    RECORD_HEADER,
+    UUID_OFFSET,
+    HistoryStore,
+    decode_payload,
+    encode_payload,
+    group_file_path,
+    group_name_from_file,
+)
+from .utils import ChannelMessageDC
+
+# magic, slot count, slot size, next seq, first seq
+RING_HEADER = struct.Struct(">4sIIQQ")
+RING_HEADER_SIZE = 64
+RING_MAGIC = b"CBH1"
+NEXT_SEQ_OFFSET = struct.calcsize(">4sII")
+FIRST_SEQ_OFFSET = NEXT_SEQ_OFFSET + 8
+SEQ = struct.Struct(">Q")
+
+
+def _tracked_name(memory: shared_memory.SharedMemory) -> str:
+    """Return the name the resource tracker knows a block by.
+
+    POSIX shared memory names start with a slash, which ``name`` strips.
+    """
+    return "/" + memory.name
+
+
+def _attach(name: str, size: int) -> shared_memory.SharedMemory:
+    """Create or attach a shared memory block not owned by this process.
+
+    The block must outlive any single worker, so it is kept away from
+    the resource tracker, which would unlink it when the worker exits.
+    """
+    try:
+        memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        memory = shared_memory.SharedMemory(name=name)
+
+    with contextlib.suppress(Exception):
+        resource_tracker.unregister(_tracked_name(memory), "shared_memory")
+    return memory
+
+
+class SharedGroupHistory:
+    """Group history in a shared memory ring buffer.
+
+    All local worker processes attach to the same ring, so a client sees
+    the same history whichever worker it reconnects to. The ring has a
+    fixed number of fixed size slots; message ``seq`` selects the slot,
+    older messages are overwritten as the ring wraps.
+
+    Writers are serialized with an ``flock`` on a per-group lock file,
+    which also hands out the sequence numbers. Readers never lock: a slot
+    stores the sequence number of the message it holds, written last, and
+    a read is discarded if that number changed while it was copied.
+
+    Limits only narrow the view of this process; the ring size bounds
+    what all workers keep.
+    """
+
+    __slots__ = (
+        "max_messages",
+        "max_bytes",
+        "dropped",
+        "slot_count",
+        "slot_size",
+        "_memory",
+        "_buffer",
+        "_lock_path",
+        "_lock",
+    )
+
+    def __init__(
+        self,
+        memory_name: str,
+        lock_path: str,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+        slot_count: int = 1024,
+        slot_size: int = 4096,
+    ) -> None:
+        """Attach to the ring of a group, creating it if needed.
+
+        Args:
+            memory_name (str): Shared memory block name.
+            lock_path (str): Path of the group writer lock file.
+            max_messages (int): Maximum number of messages,
+                ``0`` means the whole ring.
+            max_bytes (int): Maximum total encoded size in bytes,
+                ``0`` means unlimited.
+            slot_count (int): Number of slots for a new ring.
+            slot_size (int): Size of a slot in bytes for a new ring,
+                including the record header.
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._lock_path = lock_path
+        self._lock = open(lock_path, "a+b")
+
+        with self._locked():
+            self._memory = _attach(
+                memory_name, RING_HEADER_SIZE + slot_count * slot_size
+            )
+            self._buffer = self._memory.buf
+            magic, ring_slots, ring_slot_size, _, _ = RING_HEADER.unpack_from(
+                self._buffer
+            )
+            if magic != RING_MAGIC:
+                RING_HEADER.pack_into(
+                    self._buffer, 0, RING_MAGIC, slot_count, slot_size, 1, 1
+                )
+                ring_slots, ring_slot_size = slot_count, slot_size
+
+        self.slot_count = ring_slots
+        self.slot_size = ring_slot_size
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the exclusive writer lock of the group."""
+        fcntl.flock(self._lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock.fileno(), fcntl.LOCK_UN)
+
+    @property
+    def _next_seq(self) -> int:
+        return SEQ.unpack_from(self._buffer, NEXT_SEQ_OFFSET)[0]
+
+    def _head(self, next_seq: int) -> int:
+        """Return the first sequence number visible to this process."""
+        first_seq = SEQ.unpack_from(self._buffer, FIRST_SEQ_OFFSET)[0]
+        head = max(first_seq, next_seq - self.slot_count)
+        if self.max_messages:
+            head = max(head, next_seq - self.max_messages)
+
+        if self.max_bytes:
+            nbytes = 0
+            for seq in range(next_seq - 1, head - 1, -1):
+                nbytes += self._length(seq)
+                if nbytes > self.max_bytes:
+                    return seq + 1
+        return head
+
+    def _slot(self, seq: int) -> int:
+        """Return the buffer offset of the slot holding a sequence number."""
+        return RING_HEADER_SIZE + (seq % self.slot_count) * self.slot_size
+
+    def _length(self, seq: int) -> int:
+        offset = self._slot(seq)
+        if SEQ.unpack_from(self._buffer, offset)[0] != seq:
+            return 0
+        return RECORD_HEADER.unpack_from(self._buffer, offset)[2]
+
+    def append(
+        self,
+        message: ChannelMessageDC,
+        encoded: str | bytes | None = None,
+    ) -> None:
+        """Write a message to the next slot of the ring.
+
+        Messages that do not fit into a slot are not stored, counted in
+        ``dropped`` and reported with a ``RuntimeWarning``.
+
+        Args:
+            message (ChannelMessageDC): Message to store.
+            encoded (str | bytes | None): Payload already encoded as
+                JSON, saves encoding dict payloads a second time.
+        """
+        kind, data = encode_payload(message.payload, encoded)
+        if RECORD_HEADER.size + len(data) > self.slot_size:
+            self.dropped += 1
+            warnings.warn(
+                f"History message of {len(data)} bytes does not fit into a "
+                f"{self.slot_size} byte slot and was not stored",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+            return
+
+        created = message.created.timestamp()
+        with self._locked():
+            seq = self._next_seq
+            offset = self._slot(seq)
+            # Invalidate the slot first, so readers skip it while it is written.
+            SEQ.pack_into(self._buffer, offset, 0)
+            start = offset + RECORD_HEADER.size
+            self._buffer[start : start + len(data)] = data
+            RECORD_HEADER.pack_into(
+                self._buffer, offset, 0, created, len(data), message.uuid.bytes, kind
+            )
+            SEQ.pack_into(self._buffer, offset, seq)
+            SEQ.pack_into(self._buffer, NEXT_SEQ_OFFSET, seq + 1)
+
+        message.seq = seq
+
+    def set_limits(
+        self,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+    ) -> None:
+        """Change the limits of this process view.
+
+        Args:
+            max_messages (int): Maximum number of messages,
+                ``0`` means the whole ring.
+            max_bytes (int): Maximum total encoded size in bytes,
+                ``0`` means unlimited.
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+
+    def read(
+        self,
+        since: int | UUID | str | datetime | None = None,
+        limit: int | None = None,
+    ) -> list[ChannelMessageDC]:
+        """Return messages newer than a cursor, oldest first.
+
+        Accepts the same cursors as ``GroupHistory.read``. Messages
+        overwritten while being read are skipped.
+
+        Args:
+            since (int | UUID | str | datetime | None): Cursor of the
+                last message the client has seen.
+            limit (int | None): Maximum number of messages to return.
+
+        Returns:
+            list[ChannelMessageDC]: Messages after the cursor.
+        """
+        next_seq = self._next_seq
+        start = self._cursor_seq(since, next_seq)
+        stop = next_seq if limit is None else min(start + limit, next_seq)
+        messages = (self._message(seq) for seq in range(start, stop))
+        return [message for message in messages if message is not None]
+
+    def views(
+        self,
+        since: int | None = None,
+        limit: int | None = None,
+    ) -> list[tuple[int, int, memoryview]]:
+        """Return encoded payloads as views into the ring, without copying.
+
+        A view is only valid until its slot is reused. Check it with
+        ``is_current(seq)`` after use and release the views before the
+        history is closed.
+
+        Args:
+            since (int | None): Sequence number of the last message seen.
+            limit (int | None): Maximum number of messages to return.
+
+        Returns:
+            list[tuple[int, int, memoryview]]: ``(seq, kind, payload)``
+            tuples, where ``kind`` is one of the ``KIND_*`` record kinds.
+        """
+        next_seq = self._next_seq
+        start = self._cursor_seq(since, next_seq)
+        stop = next_seq if limit is None else min(start + limit, next_seq)
+
+        views = []
+        for seq in range(start, stop):
+            offset = self._slot(seq)
+            stored_seq, _, length, _, kind = RECORD_HEADER.unpack_from(
+                self._buffer, offset
+            )
+            if stored_seq == seq:
+                start_body = offset + RECORD_HEADER.size
+                views.append(
+                    (seq, kind, self._buffer[start_body : start_body + length])
+                )
+        return views
+
+    def is_current(self, seq: int) -> bool:
+        """Return whether the slot of a sequence number still holds it."""
+        return SEQ.unpack_from(self._buffer, self._slot(seq))[0] == seq
+
+    def _cursor_seq(
+        self, since: int | UUID | str | datetime | None, next_seq: int
+    ) -> int:
+        """Return the sequence number of the first message after a cursor."""
+        head = self._head(next_seq)
+        if since is None:
+            return head
+
+        if isinstance(since, datetime):
+            return (
+                bisect.bisect_right(
+                    range(head, next_seq),
+                    since.timestamp(),
+                    key=self._created,
+                )
+                + head
+            )
+
+        if isinstance(since, str):
+            since = UUID(since)
+        if isinstance(since, UUID):
+            target = since.bytes
+            for seq in range(next_seq - 1, head - 1, -1):
+                offset = self._slot(seq) + UUID_OFFSET
+                if self._buffer[offset : offset + 16] == target and self.is_current(
+                    seq
+                ):
+                    return seq + 1
+            return head
+
+        if since >= next_seq:
+            return head
+        return max(since + 1, head)
+
+    def _created(self, seq: int) -> float:
+        return RECORD_HEADER.unpack_from(self._buffer, self._slot(seq))[1]
+
+    def _message(self, seq: int) -> ChannelMessageDC | None:
+        """Copy a message out of its slot, ``None`` if it was overwritten."""
+        offset = self._slot(seq)
+        stored_seq, created, length, uuid_bytes, kind = RECORD_HEADER.unpack_from(
+            self._buffer, offset
+        )
+        if stored_seq != seq or length > self.slot_size - RECORD_HEADER.size:
+            return None
+
+        start = offset + RECORD_HEADER.size
+        body = bytes(self._buffer[start : start + length])
+        if not self.is_current(seq):
+            return None
+
+        return ChannelMessageDC(
+            payload=decode_payload(kind, body),
+            size=length,
+            seq=seq,
+            uuid=UUID(bytes=uuid_bytes),
+            created=datetime.fromtimestamp(created, tz=UTC),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        next_seq = self._next_seq
+        return sum(self._length(seq) for seq in range(self._head(next_seq), next_seq))
+
+    def clear(self) -> None:
+        """Remove all messages for every attached worker."""
+        with self._locked():
+            SEQ.pack_into(self._buffer, FIRST_SEQ_OFFSET, self._next_seq)
+
+    def close(self) -> None:
+        """Detach from the ring, keeping it for the other workers."""
+        self._buffer = None
+        with contextlib.suppress(BufferError):
+            self._memory.close()
+        self._lock.close()
+
+    def unlink(self) -> None:
+        """Detach from the ring and destroy it together with its lock file."""
+        memory = self._memory
+        self.close()
+        # ``unlink`` unregisters the block from the resource tracker again.
+        resource_tracker.register(_tracked_name(memory), "shared_memory")
+        with contextlib.suppress(FileNotFoundError):
+            memory.unlink()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._lock_path)
+
+    def __len__(self) -> int:
+        next_seq = self._next_seq
+        return next_seq - self._head(next_seq)
+
+    def __iter__(self) -> Iterator[ChannelMessageDC]:
+        return iter(self.read())
+
+    def __getitem__(
+        self, index: int | slice
+    ) -> ChannelMessageDC | list[ChannelMessageDC]:
+        return self.read()[index]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__} {len(self)=} {self.slot_count=} {self.slot_size=}"
+
+
+class SharedMemoryHistoryStore(HistoryStore):
+    """History store shared by the worker processes of one host.
+
+    Every group gets a shared memory ring named after the store
+    ``namespace`` and the group name, and a lock file in ``lock_dir``
+    that serializes writers and lets workers discover the groups.
+    Unix only, as writers are serialized with ``fcntl.flock``.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        namespace: str = "channel-box",
+        slot_count: int = 1024,
+        slot_size: int = int(os.getenv("CHANNEL_BOX_SHM_SLOT_SIZE", 4096)),
+        lock_dir: str | None = None,
+    ) -> None:
+        """Initialize the store.
+
+        Args:
+            namespace (str): Name shared by all workers of one application.
+            slot_count (int): Number of messages kept per group.
+            slot_size (int): Slot size in bytes. Messages with payloads
+                larger than the slot minus a 37 byte header are not
+                stored, so size it for the largest history message.
+            lock_dir (str | None): Directory of the group lock files,
+                defaults to a ``namespace`` directory in the temp dir.
+        """
+        self.namespace = namespace
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), namespace)
+
+    def _memory_name(self, group_name: str) -> str:
+        # Shared memory names are short on some platforms, so hash them.
+        digest = hashlib.blake2b(
+            f"{self.namespace}/{group_name}".encode(),
+            digest_size=10,
+        ).hexdigest()
+        return f"cb{digest}"
+
+    def open(
+        self,
+        group_name: str,
+        max_messages: int = 0,
+        max_bytes: int = 0,
+    ) -> SharedGroupHistory:
+        os.makedirs(self.lock_dir, exist_ok=True)
+        return SharedGroupHistory(
+            self._memory_name(group_name),
+            group_file_path(self.lock_dir, group_name) + ".lock",
+            max_messages=max_messages,
+            max_bytes=max_bytes,
+            slot_count=self.slot_count,
+            slot_size=self.slot_size,
+        )
+
+    def groups(self) -> list[str]:
+        if not os.path.isdir(self.lock_dir):
+            return []
+        groups = [
+            group_name_from_file(name[: -len(".lock")], self.lock_dir)
+            for name in os.listdir(self.lock_dir)
+            if name.endswith(".lock")
+        ]
+        return sorted(group_name for group_name in groups if group_name is not None)
+
+    def unlink(self) -> None:
+        """Destroy the rings and lock files of all groups of the store."""
+        for group_name in self.groups():
+            self.open(group_name).unlink()
+        if os.path.isdir(self.lock_dir):
+            for name in os.listdir(self.lock_dir):
+                if name.endswith(GROUP_NAME_SUFFIX):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(os.path.join(self.lock_dir, name))
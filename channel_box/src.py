@@ -1,12 +1,37 @@
+import asyncio
+import bisect
 import contextlib
-import sys
+import fnmatch
+import heapq
+import itertools
 import os
+import re
+import threading
 import time
 import uuid
 import datetime
+from collections import deque
+from collections.abc import AsyncIterator, Hashable, Iterable
+from typing import Any, Callable, cast
+from .backends import BaseBackend
+from .history import GroupHistoryProtocol, HistoryStore
+from .metrics import BaseMetrics, to_prometheus
+from .ratelimit import TokenBucket
 from .utils import (
     PayloadTypeEnum,
+    OverflowPolicyEnum,
+    RateLimitPolicyEnum,
     ChannelMessageDC,
+    GroupSendSummaryDC,
+    batch_frames,
+    COMPRESSORS,
+    compress_frame,
+    MembershipDC,
+    PresenceEventDC,
+    encode_frame,
+    get_json_encoder,
+    get_msgpack_encoder,
+    hybridmethod,
 )
 from starlette.websockets import WebSocket
 from starlette.websockets import WebSocketDisconnect
@@ -17,13 +42,57 @@ class Channel:
 
     Represents a single WebSocket connection with additional metadata,
     such as expiration time and payload encoding type.
+
+    A channel can optionally own a bounded outbound queue drained by
+    its own writer task. Publishers then only enqueue frames and never
+    wait on network I/O; the overflow policy decides what happens
+    when a slow client lets the queue fill up.
+
+    With batching enabled, frames produced within ``batch_interval``
+    (or up to ``batch_size`` frames) are combined into one frame by the
+    writer task, trading a little latency for fewer socket writes.
+
+    Binary channels can opt into compressed frames. Large broadcasts
+    are then compressed once and sent with a 1-byte codec flag, see
+    ``compress_frame``.
+
+    Channels are slotted and allocate their uuid and queue state only
+    when used, to keep per-connection memory small.
     """
 
+    __slots__ = (
+        "websocket",
+        "expires",
+        "payload_type",
+        "last_active",
+        "queue_size",
+        "overflow_policy",
+        "batch_size",
+        "batch_interval",
+        "compression",
+        "key",
+        "dropped",
+        "_uuid",
+        "_queue",
+        "_wakeup",
+        "_writer",
+        "_closed",
+        "_expiry_token",
+        "_buckets",
+    )
+
     def __init__(
         self,
         websocket: WebSocket,
         expires: int,
         payload_type: str,
+        queue_size: int = 0,
+        overflow_policy: str = OverflowPolicyEnum.DROP_OLDEST.value,
+        batch_size: int = 0,
+        batch_interval: float = 0.0,
+        compression: str | None = None,
+        transport_compressed: bool = False,
+        key: Hashable | None = None,
     ) -> None:
         """Initialize a WebSocket channel.
 
@@ -31,7 +100,33 @@ class Channel:
             websocket (WebSocket): Starlette WebSocket instance.
             expires (int): Channel time-to-live (TTL) in seconds.
             payload_type (str): Payload encoding type.
-                Allowed values: ``json``, ``text``, ``bytes``.
+                Allowed values: ``json``, ``text``, ``bytes``, ``msgpack``.
+            queue_size (int): Outbound queue capacity in frames.
+                ``0`` disables the queue and sends directly.
+            overflow_policy (str): What to do when the queue is full.
+                Allowed values: ``drop_oldest``, ``drop_newest``,
+                ``coalesce_latest``, ``disconnect``.
+            batch_size (int): Maximum number of frames combined into one
+                frame. ``0`` or ``1`` disables batching. Batching uses
+                the outbound queue, which is unbounded if ``queue_size``
+                is ``0``.
+            batch_interval (float): Seconds to wait for more frames
+                before a batch that is not full is flushed.
+                Batches are JSON arrays for ``json`` and ``text``
+                channels and length-prefixed chunks for ``bytes``.
+            compression (str | None): Codec the client accepts for
+                ``bytes`` and ``msgpack`` channels: ``zlib`` or ``zstd``.
+                Every frame then starts with a codec flag byte.
+                ``msgpack`` channels cannot combine it with batching.
+            transport_compressed (bool): The server accepted
+                ``permessage-deflate`` for this connection. Frames are
+                then flagged but left uncompressed (``identity``), as
+                the transport already compresses them. The request
+                headers only show what the client offers, so pass it
+                explicitly.
+            key (Hashable | None): Application key of the client, such
+                as a user id, for ``ChannelBox.send_to_key``. Several
+                channels may share a key.
         """
         assert isinstance(websocket, WebSocket)
         assert isinstance(expires, int)
@@ -39,13 +134,55 @@ class Channel:
             PayloadTypeEnum.JSON.value,
             PayloadTypeEnum.TEXT.value,
             PayloadTypeEnum.BYTES.value,
+            PayloadTypeEnum.MSGPACK.value,
         ]
+        assert isinstance(queue_size, int) and queue_size >= 0
+        assert overflow_policy in [policy.value for policy in OverflowPolicyEnum]
+        assert isinstance(batch_size, int) and batch_size >= 0
+        assert compression is None or (
+            compression in COMPRESSORS
+            and payload_type
+            in [PayloadTypeEnum.BYTES.value, PayloadTypeEnum.MSGPACK.value]
+        )
+        assert not (
+            compression is not None
+            and batch_size > 1
+            and payload_type == PayloadTypeEnum.MSGPACK.value
+        ), "msgpack batches cannot hold compressed frames"
+
+        if compression is not None and transport_compressed:
+            compression = "identity"
 
         self.websocket = websocket
         self.expires = expires
         self.payload_type = payload_type
-        self.uuid = uuid.uuid4()
         self.last_active = time.time()
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.compression = compression
+        self.key = key
+        self.dropped = 0
+        self._uuid: uuid.UUID | None = None
+        self._queue: deque | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._writer: asyncio.Task | None = None
+        self._closed = False
+        self._expiry_token: int | None = None
+        self._buckets: dict[str, TokenBucket] | None = None
+
+    @property
+    def uuid(self) -> uuid.UUID:
+        """Channel identifier, created on first access."""
+        if self._uuid is None:
+            self._uuid = uuid.uuid4()
+        return self._uuid
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of frames waiting in the outbound queue."""
+        return len(self._queue) if self._queue is not None else 0
 
     async def _send(self, payload: str) -> bool:
         """Send payload to the WebSocket.
@@ -76,6 +213,194 @@ class Channel:
         self.last_active = time.time()
         return True
 
+    async def _send_frame(
+        self,
+        frame: str | bytes,
+        timeout: float | None = None,
+        key: Hashable | None = None,
+    ) -> bool:
+        """Send a pre-encoded frame to the WebSocket.
+
+        ``str`` frames are sent as text, ``bytes`` frames as binary.
+        If the channel has an outbound queue, the frame is enqueued
+        and written later by the channel writer task.
+
+        Args:
+            frame (str | bytes): Encoded frame, see ``encode_frame``.
+            timeout (float | None): Optional send timeout in seconds.
+            key (Hashable | None): Conflation key. A queued frame with
+                the same key is replaced instead of queueing a new one.
+
+        Returns:
+            bool: ``True`` if the frame was sent (or enqueued)
+            successfully, ``False`` if the connection is closed,
+            failed or timed out.
+        """
+        if self.queue_size or self.batch_size > 1:
+            return self._enqueue(frame, timeout, key)
+        return await self._write_frame(frame, timeout)
+
+    async def _write_frame(
+        self,
+        frame: str | bytes,
+        timeout: float | None = None,
+    ) -> bool:
+        """Write a pre-encoded frame directly to the WebSocket.
+
+        Args:
+            frame (str | bytes): Encoded frame.
+            timeout (float | None): Optional send timeout in seconds.
+
+        Returns:
+            bool: ``True`` if the frame was written successfully.
+        """
+        try:
+            async with asyncio.timeout(timeout or None):
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+        except TimeoutError:
+            self._abort()
+            return False
+        except (WebSocketDisconnect, RuntimeError, OSError, Exception):
+            return False
+
+        self.last_active = time.time()
+        return True
+
+    def _enqueue(
+        self,
+        frame: str | bytes,
+        timeout: float | None = None,
+        key: Hashable | None = None,
+    ) -> bool:
+        """Put a frame into the outbound queue.
+
+        A frame with a conflation key replaces a queued frame with the
+        same key, so updates piling up behind a slow client collapse
+        to the newest one. Otherwise the overflow policy is applied when
+        the queue is full. Starts the writer task if it is not running.
+
+        Args:
+            frame (str | bytes): Encoded frame.
+            timeout (float | None): Send timeout used by the writer.
+            key (Hashable | None): Conflation key.
+
+        Returns:
+            bool: ``False`` if the channel is closed or was disconnected
+            by the overflow policy, otherwise ``True``.
+        """
+        if self._closed:
+            return False
+
+        if self._queue is None:
+            self._queue = deque()
+            self._wakeup = asyncio.Event()
+
+        if key is not None:
+            for index, (_, _, queued_key) in enumerate(self._queue):
+                if queued_key == key:
+                    self._queue[index] = (frame, timeout, key)
+                    self.dropped += 1
+                    return True
+
+        if self.queue_size and len(self._queue) >= self.queue_size:
+            match self.overflow_policy:
+                case OverflowPolicyEnum.DROP_OLDEST.value:
+                    self._queue.popleft()
+                    self.dropped += 1
+                case OverflowPolicyEnum.DROP_NEWEST.value:
+                    self.dropped += 1
+                    return True
+                case OverflowPolicyEnum.COALESCE_LATEST.value:
+                    self.dropped += len(self._queue)
+                    self._queue.clear()
+                case OverflowPolicyEnum.DISCONNECT.value:
+                    self._abort()
+                    return False
+
+        self._queue.append((frame, timeout, key))
+        self._wakeup.set()
+
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._run_writer())
+        return True
+
+    async def _run_writer(self) -> None:
+        """Drain the outbound queue until the channel fails or closes."""
+        while not self._closed:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if self.batch_size > 1:
+                frame, timeout = await self._next_batch()
+            else:
+                frame, timeout, _ = self._queue.popleft()
+
+            if not await self._write_frame(frame, timeout):
+                self._close()
+
+    async def _next_batch(self) -> tuple[str | bytes, float | None]:
+        """Collect up to ``batch_size`` queued frames into one frame.
+
+        Waits at most ``batch_interval`` seconds for the batch to fill.
+
+        Returns:
+            tuple[str | bytes, float | None]: Combined frame and the
+            send timeout of its newest frame.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_interval
+
+        while len(self._queue) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            with contextlib.suppress(TimeoutError):
+                async with asyncio.timeout(remaining):
+                    await self._wakeup.wait()
+
+        frames: list[str | bytes] = []
+        timeout = None
+        while self._queue and len(frames) < self.batch_size:
+            frame, timeout, _ = self._queue.popleft()
+            frames.append(frame)
+
+        return batch_frames(frames, self.payload_type), timeout
+
+    def _abort(self) -> None:
+        """Close a channel that fell behind, including its WebSocket.
+
+        Used when a send times out or the outbound queue overflows with
+        the ``disconnect`` policy. The WebSocket is closed in a task, so
+        the caller does not wait on the stalled client again.
+        """
+        if self._closed:
+            return
+        self._close()
+        self._writer = asyncio.get_running_loop().create_task(self._disconnect())
+
+    async def _disconnect(self) -> None:
+        """Close the WebSocket with the policy violation code."""
+        with contextlib.suppress(Exception):
+            await self.websocket.close(code=1008)
+
+    def _close(self) -> None:
+        """Mark the channel closed and stop its writer task."""
+        if self._closed:
+            # Already closed, ``_writer`` may hold the disconnect task.
+            return
+        self._closed = True
+        if self._queue is not None:
+            self._queue.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._writer = None
+
     async def _is_expired(self) -> bool:
         """Check whether the channel has expired.
 
@@ -83,7 +408,11 @@ class Channel:
             bool: ``True`` if the channel TTL has expired,
             otherwise ``False``.
         """
-        return (self.expires + int(self.last_active)) < time.time()
+        return self._deadline() < time.time()
+
+    def _deadline(self) -> float:
+        """Return the timestamp after which the channel is expired."""
+        return self.expires + int(self.last_active)
 
     def __repr__(self) -> str:
         """Return a debug-friendly string representation of the channel."""
@@ -95,33 +424,298 @@ class ChannelBox:
 
     Manages groups of channels, message broadcasting,
     message history, and automatic cleanup of expired channels.
+
+    The class itself is the default hub: its methods work on the class
+    attributes. Instances are independent hubs with their own groups,
+    history, limits, encoders, expiry and metrics, so tenants or shards
+    can be isolated from each other. A channel belongs to one hub.
     """
 
     CHANNEL_GROUPS: dict = {}
     CHANNEL_GROUPS_HISTORY: dict = {}
+    BACKEND: BaseBackend | None = None
+    METRICS: BaseMetrics = BaseMetrics()
+    CHANNEL_MEMBERSHIPS: dict = {}
+    CHANNEL_REGISTRY: dict = {}
+    CHANNEL_KEYS: dict = {}
+    PRESENCE_SUBSCRIBERS: list = []
+    GROUP_NAMES: list = []
+    CONFLATION: dict = {}
+    CONFLATION_PENDING: dict = {}
+    CONFLATION_TASKS: dict = {}
+    RATE_LIMITS: dict = {}
+    EXPIRY_HEAP: list = []
+    EXPIRY_STALE: int = 0
+    EXPIRY_COUNTER = itertools.count()
+    REAPER_TASK: asyncio.Task | None = None
+    LOOP: asyncio.AbstractEventLoop | None = None
+    PUBLISH_QUEUE: deque = deque()
+    PUBLISH_LOCK = threading.Lock()
+    PUBLISH_SCHEDULED: bool = False
+    PUBLISH_TASK: asyncio.Task | None = None
+    REAPER_INTERVAL: float = float(os.getenv("CHANNEL_BOX_REAPER_INTERVAL", 60))
+    HISTORY_LIMITS: dict = {}
     HISTORY_SIZE: int = int(os.getenv("CHANNEL_BOX_HISTORY_SIZE", 1_048_576))
+    HISTORY_LENGTH: int = int(os.getenv("CHANNEL_BOX_HISTORY_LENGTH", 0))
+    HISTORY_STORE: HistoryStore = HistoryStore()
+    SEND_CONCURRENCY: int = int(os.getenv("CHANNEL_BOX_SEND_CONCURRENCY", 0))
+    SEND_TIMEOUT: float = float(os.getenv("CHANNEL_BOX_SEND_TIMEOUT", 0))
+    COMPRESSION_THRESHOLD: int = int(
+        os.getenv("CHANNEL_BOX_COMPRESSION_THRESHOLD", 1024)
+    )
+    HISTORY_COMPRESSION: str | None = (
+        os.getenv("CHANNEL_BOX_HISTORY_COMPRESSION") or None
+    )
+    JSON_ENCODER: Callable[[Any], str] = get_json_encoder(
+        os.getenv("CHANNEL_BOX_JSON_ENCODER", "json")
+    )
+    MSGPACK_ENCODER: Callable[[Any], bytes] = get_msgpack_encoder(
+        os.getenv("CHANNEL_BOX_MSGPACK_ENCODER", "auto")
+    )
+
+    def __init__(
+        self,
+        history_size: int | None = None,
+        history_length: int | None = None,
+        history_store: HistoryStore | None = None,
+        json_encoder: str | Callable[[Any], str] | None = None,
+        metrics: BaseMetrics | None = None,
+        reaper_interval: float | None = None,
+        send_concurrency: int | None = None,
+        send_timeout: float | None = None,
+    ) -> None:
+        """Initialize an independent hub.
+
+        Settings left as ``None`` are taken from the class defaults.
+
+        Args:
+            history_size (int | None): Default history size in bytes.
+            history_length (int | None): Default history length in messages.
+            history_store (HistoryStore | None): Store of group histories.
+            json_encoder (str | Callable[[Any], str] | None): JSON encoder
+                name or callable, see ``set_json_encoder``.
+            metrics (BaseMetrics | None): Metrics collector of the hub.
+            reaper_interval (float | None): Expiry scan interval in seconds.
+            send_concurrency (int | None): Default fan-out concurrency.
+            send_timeout (float | None): Default per-send timeout.
+        """
+        defaults = type(self)
+
+        self._reset()
+        if metrics is not None:
+            self.METRICS = metrics
+        if history_store is not None:
+            self.HISTORY_STORE = history_store
+
+        self.REAPER_INTERVAL = (
+            defaults.REAPER_INTERVAL if reaper_interval is None else reaper_interval
+        )
+        self.HISTORY_SIZE = (
+            defaults.HISTORY_SIZE if history_size is None else history_size
+        )
+        self.HISTORY_LENGTH = (
+            defaults.HISTORY_LENGTH if history_length is None else history_length
+        )
+        self.SEND_CONCURRENCY = (
+            defaults.SEND_CONCURRENCY if send_concurrency is None else send_concurrency
+        )
+        self.SEND_TIMEOUT = (
+            defaults.SEND_TIMEOUT if send_timeout is None else send_timeout
+        )
+
+        self.COMPRESSION_THRESHOLD = defaults.COMPRESSION_THRESHOLD
+        self.HISTORY_COMPRESSION = defaults.HISTORY_COMPRESSION
+        # Encoders are set on the instance, so plain functions are not
+        # bound as methods when looked up through it.
+        self.JSON_ENCODER = defaults.JSON_ENCODER
+        self.MSGPACK_ENCODER = defaults.MSGPACK_ENCODER
+        if json_encoder is not None:
+            self.set_json_encoder(json_encoder)
+
+    @hybridmethod
+    def _reset(cls) -> None:
+        """Drop all runtime state of the hub.
+
+        Groups, channels, histories, limits, the backend, the captured
+        event loop and the publish queue are forgotten; settings such as
+        ``HISTORY_SIZE`` or ``JSON_ENCODER`` are kept. Running tasks and
+        the backend are not stopped, so use it on an idle hub, e.g.
+        between tests.
+        """
+        cls.CHANNEL_GROUPS = {}
+        cls.CHANNEL_GROUPS_HISTORY = {}
+        cls.BACKEND = None
+        cls.METRICS = BaseMetrics()
+        cls.CHANNEL_MEMBERSHIPS = {}
+        cls.CHANNEL_REGISTRY = {}
+        cls.CHANNEL_KEYS = {}
+        cls.PRESENCE_SUBSCRIBERS = []
+        cls.GROUP_NAMES = []
+        cls.CONFLATION = {}
+        cls.CONFLATION_PENDING = {}
+        cls.CONFLATION_TASKS = {}
+        cls.RATE_LIMITS = {}
+        cls.EXPIRY_HEAP = []
+        cls.EXPIRY_STALE = 0
+        cls.EXPIRY_COUNTER = itertools.count()
+        cls.REAPER_TASK = None
+        cls.LOOP = None
+        cls.PUBLISH_QUEUE = deque()
+        cls.PUBLISH_LOCK = threading.Lock()
+        cls.PUBLISH_SCHEDULED = False
+        cls.PUBLISH_TASK = None
+        cls.HISTORY_LIMITS = {}
+        cls.HISTORY_STORE = HistoryStore()
+
+    @hybridmethod
+    def set_json_encoder(
+        cls,
+        encoder: str | Callable[[Any], str],
+    ) -> None:
+        """Set the JSON encoder used for broadcasts.
+
+        Args:
+            encoder (str | Callable[[Any], str]): Encoder name
+                (``json``, ``orjson``, ``msgspec``) or a callable
+                returning JSON text.
+        """
+        cls.JSON_ENCODER = (
+            get_json_encoder(encoder) if isinstance(encoder, str) else encoder
+        )
+
+    @hybridmethod
+    def set_history_store(
+        cls,
+        store: HistoryStore | None,
+    ) -> None:
+        """Set the store that keeps group message history.
+
+        Histories of the previous store are closed and the groups already
+        kept by the new store are loaded, so persisted history survives a
+        restart. ``None`` switches back to the in-memory store.
+
+        Args:
+            store (HistoryStore | None): History store instance.
+        """
+        for history in cls.CHANNEL_GROUPS_HISTORY.values():
+            history.close()
+
+        cls.HISTORY_STORE = store if store is not None else HistoryStore()
+        cls.CHANNEL_GROUPS_HISTORY = {
+            group_name: cls.HISTORY_STORE.open(
+                group_name, *cls._history_limits(group_name)
+            )
+            for group_name in cls.HISTORY_STORE.groups()
+        }
+
+    @hybridmethod
+    async def set_backend(
+        cls,
+        backend: BaseBackend | None,
+    ) -> None:
+        """Set the broadcast backend used to reach peer processes.
+
+        The previous backend, if any, is stopped. ``None`` switches back
+        to the in-memory mode.
+
+        Args:
+            backend (BaseBackend | None): Backend instance.
+        """
+        if cls.BACKEND is not None:
+            await cls.BACKEND.stop()
+
+        cls.BACKEND = backend
+
+        if backend is not None:
+            await backend.start(cls._on_backend_message)
+            for group_name in list(cls.CHANNEL_GROUPS):
+                await backend.subscribe(group_name)
+
+    @hybridmethod
+    async def _on_backend_message(
+        cls,
+        group_name: str | list[str],
+        payload: dict | str | bytes,
+        save_history: bool,
+        pattern: str = "",
+        prefix: str = "",
+    ) -> None:
+        """Deliver a broadcast received from a peer to local channels.
+
+        Peer broadcasts are delivered concurrently, so one slow local
+        client does not stall the backend. ``group_name`` is a list for
+        broadcasts sent with ``send_to_groups``, whose ``pattern`` and
+        ``prefix`` are matched against the local groups. A shared
+        history store already holds the message saved by the sending
+        worker.
+        """
+        save_history = save_history and not cls.HISTORY_STORE.shared
+
+        if isinstance(group_name, str) and group_name in cls.CONFLATION:
+            await cls._conflate(group_name, payload, save_history, True, None, None)
+            return
+
+        targets = cls._resolve_targets(
+            [group_name] if isinstance(group_name, str) else group_name,
+            pattern,
+            prefix,
+        )
+        if not targets:
+            return
+
+        await cls._local_send(
+            targets,
+            payload,
+            save_history,
+            concurrent=True,
+            concurrency=None,
+            timeout=None,
+        )
 
-    @classmethod
+    @hybridmethod
     async def add_channel_to_group(
         cls,
         channel: Channel,
         group_name: str = "default",
+        meta: dict | None = None,
     ) -> None:
         """Add a channel to a group.
 
         Args:
             channel (Channel): Channel instance to add.
             group_name (str): Name of the group.
+            meta (dict | None): Optional presence metadata of the member,
+                see ``get_presence``.
         """
+        if cls.LOOP is None or cls.LOOP.is_closed():
+            cls.LOOP = asyncio.get_running_loop()
+
         if group_name not in cls.CHANNEL_GROUPS:
             cls.CHANNEL_GROUPS[group_name] = {}
+            bisect.insort(cls.GROUP_NAMES, group_name)
+            if cls.BACKEND is not None:
+                await cls.BACKEND.subscribe(group_name)
 
         if channel not in cls.CHANNEL_GROUPS[group_name]:
-            cls.CHANNEL_GROUPS[group_name][channel] = {
-                "created_at": datetime.datetime.now(tz=datetime.UTC)
-            }
+            cls.CHANNEL_GROUPS[group_name][channel] = MembershipDC(
+                created_at=time.time(),
+                meta=meta,
+            )
+            if cls.PRESENCE_SUBSCRIBERS:
+                cls._notify_presence(group_name, channel, True)
 
-    @classmethod
+            # Memberships are stored as a tuple: most channels join only
+            # a few groups, and a tuple is far smaller than a set.
+            memberships = cls.CHANNEL_MEMBERSHIPS.get(channel)
+            if memberships is None:
+                memberships = ()
+                # A channel that left all of its groups was closed.
+                channel._closed = False
+                cls._index_expiry(channel)
+                cls._register(channel)
+            cls.CHANNEL_MEMBERSHIPS[channel] = (*memberships, group_name)
+
+    @hybridmethod
     async def remove_channel_from_group(
         cls,
         channel: Channel,
@@ -129,49 +723,1207 @@ class ChannelBox:
     ) -> None:
         """Remove a channel from a group.
 
+        The group is removed once its last channel leaves. A channel
+        leaving its last group is closed like in ``remove_channel``:
+        its outbound queue is dropped and its writer task stopped.
+
         Args:
             channel (Channel): Channel instance to remove.
             group_name (str): Name of the group.
         """
-        if channel in cls.CHANNEL_GROUPS.get(group_name, {}):
-            with contextlib.suppress(Exception):
-                del cls.CHANNEL_GROUPS[group_name][channel]
+        memberships = cls.CHANNEL_MEMBERSHIPS.get(channel)
+        if memberships is None or group_name not in memberships:
+            return
+
+        memberships = tuple(name for name in memberships if name != group_name)
+        await cls._drop_membership(channel, group_name)
+
+        if memberships:
+            cls.CHANNEL_MEMBERSHIPS[channel] = memberships
+        else:
+            del cls.CHANNEL_MEMBERSHIPS[channel]
+            cls._unregister(channel)
+            channel._expiry_token = None
+            cls.EXPIRY_STALE += 1
+            channel._close()
+
+    @hybridmethod
+    async def remove_channel(cls, channel: Channel) -> None:
+        """Remove a channel from all of its groups.
+
+        Uses the channel-to-groups index, so the cost is proportional
+        to the channel's own memberships. Groups left empty are removed
+        and the channel outbound queue is stopped.
+
+        Args:
+            channel (Channel): Channel instance to remove.
+        """
+        memberships = cls.CHANNEL_MEMBERSHIPS.pop(channel, None)
+        if memberships is None:
+            return
+
+        for group_name in memberships:
+            await cls._drop_membership(channel, group_name)
+
+        cls._unregister(channel)
+        channel._expiry_token = None
+        cls.EXPIRY_STALE += 1
+        channel._buckets = None
+        channel._close()
+
+    @hybridmethod
+    def _register(cls, channel: Channel) -> None:
+        """Index a channel by uuid and application key."""
+        cls.CHANNEL_REGISTRY[channel.uuid] = channel
+        if channel.key is not None:
+            cls.CHANNEL_KEYS.setdefault(channel.key, {})[channel] = None
+
+    @hybridmethod
+    def _unregister(cls, channel: Channel) -> None:
+        """Remove a channel from the uuid and application key indexes."""
+        cls.CHANNEL_REGISTRY.pop(channel.uuid, None)
+        if channel.key is not None:
+            channels = cls.CHANNEL_KEYS.get(channel.key)
+            if channels is not None:
+                channels.pop(channel, None)
+                if not channels:
+                    del cls.CHANNEL_KEYS[channel.key]
+
+    @hybridmethod
+    def _index_expiry(cls, channel: Channel) -> None:
+        """Push a channel into the expiry heap with its current deadline.
+
+        Each push gets a fresh token; heap entries whose token no longer
+        matches the channel are stale and skipped by ``clean_expired``.
+        """
+        channel._expiry_token = token = next(cls.EXPIRY_COUNTER)
+        heapq.heappush(cls.EXPIRY_HEAP, (channel._deadline(), token, channel))
+
+    @hybridmethod
+    async def _drop_membership(
+        cls,
+        channel: Channel,
+        group_name: str,
+    ) -> None:
+        """Delete a channel from a group and drop the group if empty.
+
+        The backend is unsubscribed from dropped groups.
+        """
+        group = cls.CHANNEL_GROUPS.get(group_name)
+        if group is not None and channel in group:
+            del group[channel]
+            if cls.PRESENCE_SUBSCRIBERS:
+                cls._notify_presence(group_name, channel, False)
+            if not group:
+                del cls.CHANNEL_GROUPS[group_name]
+                index = bisect.bisect_left(cls.GROUP_NAMES, group_name)
+                if cls.GROUP_NAMES[index : index + 1] == [group_name]:
+                    del cls.GROUP_NAMES[index]
+                if cls.BACKEND is not None:
+                    await cls.BACKEND.unsubscribe(group_name)
+
+    @hybridmethod
+    async def get_presence_count(cls, group_name: str) -> int:
+        """Return the number of channels in a group, in constant time.
+
+        Args:
+            group_name (str): Group name.
+
+        Returns:
+            int: Number of channels, ``0`` for unknown groups.
+        """
+        return len(cls.CHANNEL_GROUPS.get(group_name, ()))
+
+    @hybridmethod
+    async def get_presence(cls, group_name: str) -> dict[Channel, dict | None]:
+        """Return the members of a group with their presence metadata.
+
+        Args:
+            group_name (str): Group name.
+
+        Returns:
+            dict[Channel, dict | None]: Metadata given to
+            ``add_channel_to_group`` for every channel, in join order.
+        """
+        return {
+            channel: membership.meta
+            for channel, membership in cls.CHANNEL_GROUPS.get(group_name, {}).items()
+        }
+
+    @hybridmethod
+    def _notify_presence(cls, group_name: str, channel: Channel, joined: bool) -> None:
+        """Queue a join or leave for the matching presence streams."""
+        for subscribed_group, queue in cls.PRESENCE_SUBSCRIBERS:
+            if subscribed_group is None or subscribed_group == group_name:
+                queue.put_nowait((group_name, channel, joined))
+
+    @hybridmethod
+    async def presence_events(
+        cls,
+        group_name: str | None = None,
+        debounce: float = 0.0,
+    ) -> AsyncIterator[PresenceEventDC]:
+        """Stream join and leave events of one or all groups.
+
+        Without ``debounce`` every join and leave is yielded as it
+        happens. With ``debounce`` changes are collected for that many
+        seconds after the first one and yielded as one event per group
+        with the net joins and leaves, so a burst of reconnects costs a
+        single update. Membership changes cost nothing while no stream
+        is open.
+
+        Args:
+            group_name (str | None): Group to watch, ``None`` for all.
+            debounce (float): Collection window in seconds.
+
+        Yields:
+            PresenceEventDC: Presence change with the current count.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        subscriber = (group_name, queue)
+        cls.PRESENCE_SUBSCRIBERS.append(subscriber)
+        try:
+            while True:
+                changes = [await queue.get()]
+                if debounce:
+                    await asyncio.sleep(debounce)
+                    while not queue.empty():
+                        changes.append(queue.get_nowait())
+
+                # A join and a leave of the same channel cancel out.
+                net: dict[str, dict[Channel, bool]] = {}
+                for changed_group, channel, joined in changes:
+                    group_changes = net.setdefault(changed_group, {})
+                    if group_changes.get(channel, joined) != joined:
+                        del group_changes[channel]
+                    else:
+                        group_changes[channel] = joined
+
+                for changed_group, group_changes in net.items():
+                    if group_changes:
+                        yield PresenceEventDC(
+                            group_name=changed_group,
+                            count=len(cls.CHANNEL_GROUPS.get(changed_group, ())),
+                            joined=[c for c, joined in group_changes.items() if joined],
+                            left=[
+                                c for c, joined in group_changes.items() if not joined
+                            ],
+                        )
+        finally:
+            cls.PRESENCE_SUBSCRIBERS.remove(subscriber)
 
-    @classmethod
+    @hybridmethod
     async def group_send(
         cls,
         group_name: str = "default",
         payload: dict | str | bytes = {},
         save_history: bool = False,
+        concurrent: bool = False,
+        concurrency: int | None = None,
+        timeout: float | None = None,
     ) -> None:
         """Send a payload to all channels in a group.
 
         Optionally stores the message in the group history.
 
+        The payload is encoded once per payload type and the prepared
+        frame is pushed to every channel of that type.
+
+        If a backend is set, the payload is also published to peer
+        processes, which deliver it to their own channels. Payloads to
+        groups with conflation enabled are collapsed first, see
+        ``set_group_conflation``.
+
+        By default channels are sent to one after another. With
+        ``concurrent=True`` all sends run at once, so a slow client
+        only delays itself. Channels that fail or time out are removed
+        from the group in both modes.
+
         Args:
             group_name (str): Target group name.
             payload (dict | str | bytes): Payload to broadcast.
             save_history (bool): Whether to save the message to history.
+            concurrent (bool): Deliver to all channels concurrently.
+            concurrency (int | None): Maximum number of sends in flight
+                in concurrent mode. Defaults to ``SEND_CONCURRENCY``,
+                ``0`` means unlimited.
+            timeout (float | None): Per-send timeout in seconds.
+                Defaults to ``SEND_TIMEOUT``, ``0`` disables it.
+        """
+        if cls.BACKEND is not None:
+            await cls.BACKEND.publish(group_name, payload, save_history)
+
+        if group_name in cls.CONFLATION:
+            await cls._conflate(
+                group_name,
+                payload,
+                save_history,
+                concurrent,
+                concurrency,
+                timeout,
+            )
+            return
+
+        await cls._local_send(
+            [group_name],
+            payload,
+            save_history,
+            concurrent,
+            concurrency,
+            timeout,
+        )
+
+    @hybridmethod
+    async def set_group_rate_limit(
+        cls,
+        group_name: str,
+        rate: float,
+        burst: float | None = None,
+        policy: str = RateLimitPolicyEnum.DROP.value,
+    ) -> None:
+        """Limit how fast each channel may publish to a group.
+
+        Every channel gets its own token bucket for the group, checked
+        by ``check_rate_limit`` and ``group_send_from``. Changing the
+        limit updates existing buckets. Buckets are kept while the
+        channel is connected, so leaving and rejoining the group does
+        not refill them.
+
+        Args:
+            group_name (str): Group name.
+            rate (float): Allowed messages per second per channel.
+            burst (float | None): Messages allowed in a burst,
+                defaults to ``rate``.
+            policy (str): What to do with a channel over the limit:
+                ``drop`` the message, ``delay`` it until the channel is
+                within the limit again, or ``disconnect`` the channel.
+        """
+        assert rate > 0
+        assert policy in [policy.value for policy in RateLimitPolicyEnum]
+        cls.RATE_LIMITS[group_name] = (rate, burst, policy)
+
+        for channel in cls.CHANNEL_GROUPS.get(group_name, ()):
+            if channel._buckets and group_name in channel._buckets:
+                channel._buckets[group_name].update(rate, burst)
+
+    @hybridmethod
+    async def disable_group_rate_limit(cls, group_name: str) -> None:
+        """Remove the rate limit of a group.
+
+        Args:
+            group_name (str): Group name.
+        """
+        cls.RATE_LIMITS.pop(group_name, None)
+
+    @hybridmethod
+    async def check_rate_limit(
+        cls,
+        channel: Channel,
+        group_name: str,
+    ) -> bool:
+        """Take a token from the channel bucket of a rate-limited group.
+
+        Applies the group policy if the bucket is empty: ``drop``
+        returns ``False``, ``delay`` waits until a token is available
+        and returns ``True``, ``disconnect`` removes the channel, closes
+        the WebSocket with code 1008 and returns ``False``.
+
+        Args:
+            channel (Channel): Channel that sends the message.
+            group_name (str): Target group name.
+
+        Returns:
+            bool: ``True`` if the message may be sent.
+        """
+        limit = cls.RATE_LIMITS.get(group_name)
+        if limit is None:
+            return True
+        rate, burst, policy = limit
+
+        if channel._buckets is None:
+            channel._buckets = {}
+        bucket = channel._buckets.get(group_name)
+        if bucket is None:
+            bucket = channel._buckets[group_name] = TokenBucket(rate, burst)
+        else:
+            # The limit may have changed while the channel was not
+            # in the group.
+            bucket.update(rate, burst)
+
+        wait = bucket.consume(reserve=policy == RateLimitPolicyEnum.DELAY.value)
+        if not wait:
+            return True
+
+        cls.METRICS.on_rate_limited(group_name, policy)
+
+        match policy:
+            case RateLimitPolicyEnum.DELAY.value:
+                await asyncio.sleep(wait)
+                return True
+            case RateLimitPolicyEnum.DISCONNECT.value:
+                await cls.remove_channel(channel)
+                await channel._disconnect()
+        return False
+
+    @hybridmethod
+    async def group_send_from(
+        cls,
+        channel: Channel,
+        group_name: str,
+        payload: dict | str | bytes,
+        save_history: bool = False,
+    ) -> bool:
+        """Send a message received from a client to a group.
+
+        Checks the channel rate limit of the group before fanning out,
+        so one flooding client cannot turn every message into a full
+        broadcast.
+
+        Args:
+            channel (Channel): Channel the message was received from.
+            group_name (str): Target group name.
+            payload (dict | str | bytes): Data to send.
+            save_history (bool): Whether to save the message to history.
+
+        Returns:
+            bool: ``True`` if the message was sent, ``False`` if it was
+            rejected by the rate limit.
+        """
+        if not await cls.check_rate_limit(channel, group_name):
+            return False
+        await cls.group_send(
+            group_name=group_name, payload=payload, save_history=save_history
+        )
+        return True
+
+    @hybridmethod
+    async def set_group_conflation(
+        cls,
+        group_name: str,
+        key: str | Callable[[Any], Hashable] | None = None,
+        window: float = 0.05,
+    ) -> None:
+        """Enable conflation for a group.
+
+        Updates sharing a conflation key within ``window`` seconds are
+        collapsed to the newest one before they are sent. Frames queued
+        behind a slow channel with an outbound queue are collapsed the
+        same way. History only stores the updates that were sent.
+
+        Args:
+            group_name (str): Group name.
+            key (str | Callable[[Any], Hashable] | None): Conflation key:
+                a dict payload field name, a callable returning the key
+                for a payload, or ``None`` to keep only the latest update
+                of the whole group.
+            window (float): Collapse window in seconds. ``0`` sends
+                updates immediately and only collapses queued frames.
+        """
+        cls.CONFLATION[group_name] = (key, window)
+
+    @hybridmethod
+    async def disable_group_conflation(cls, group_name: str) -> None:
+        """Disable conflation for a group and send pending updates.
+
+        Args:
+            group_name (str): Group name.
+        """
+        cls.CONFLATION.pop(group_name, None)
+
+        task = cls.CONFLATION_TASKS.pop(group_name, None)
+        if task is not None:
+            task.cancel()
+        await cls._flush_conflated(group_name)
+
+    @hybridmethod
+    async def _conflate(
+        cls,
+        group_name: str,
+        payload: dict | str | bytes,
+        save_history: bool,
+        concurrent: bool,
+        concurrency: int | None,
+        timeout: float | None,
+    ) -> None:
+        """Buffer an update of a conflated group until its window ends."""
+        key, window = cls.CONFLATION[group_name]
+
+        if callable(key):
+            value = key(payload)
+        elif key is not None and isinstance(payload, dict):
+            value = payload.get(key)
+        else:
+            value = None
+
+        args = (payload, save_history, concurrent, concurrency, timeout)
+
+        if not window:
+            await cls._local_send([group_name], *args, key=(group_name, value))
+            return
+
+        pending = cls.CONFLATION_PENDING.setdefault(group_name, {})
+        pending[value] = args
+
+        if group_name not in cls.CONFLATION_TASKS:
+            cls.CONFLATION_TASKS[group_name] = asyncio.get_running_loop().create_task(
+                cls._flush_conflated(group_name, window)
+            )
+
+    @hybridmethod
+    async def _flush_conflated(
+        cls,
+        group_name: str,
+        delay: float = 0.0,
+    ) -> None:
+        """Send the newest pending update per key of a conflated group."""
+        if delay:
+            await asyncio.sleep(delay)
+            cls.CONFLATION_TASKS.pop(group_name, None)
+
+        pending = cls.CONFLATION_PENDING.pop(group_name, {})
+        for value, args in pending.items():
+            payload, save_history, concurrent, concurrency, timeout = args
+            await cls._local_send(
+                [group_name],
+                payload,
+                save_history,
+                concurrent,
+                concurrency,
+                timeout,
+                key=(group_name, value),
+            )
+
+    @hybridmethod
+    async def send_to_groups(
+        cls,
+        payload: dict | str | bytes = {},
+        group_names: Iterable[str] = (),
+        pattern: str = "",
+        prefix: str = "",
+        save_history: bool = False,
+        concurrent: bool = False,
+        concurrency: int | None = None,
+        timeout: float | None = None,
+    ) -> None:
+        """Send a payload to a union of groups, once per channel.
+
+        Targets are the explicit ``group_names`` plus all groups matching
+        the glob ``pattern`` or starting with ``prefix``. A channel that
+        belongs to several targeted groups receives the payload once.
+
+        With a backend, the pattern and prefix are sent to the peers as
+        is, and each peer matches them against its own groups.
+
+        Args:
+            payload (dict | str | bytes): Payload to broadcast.
+            group_names (Iterable[str]): Explicit target group names.
+            pattern (str): Glob pattern over group names, e.g. ``user:*``.
+            prefix (str): Group name prefix, e.g. ``team:``.
+            save_history (bool): Whether to save the message to the
+                history of every targeted group.
+            concurrent (bool): Deliver to all channels concurrently.
+            concurrency (int | None): Maximum number of sends in flight
+                in concurrent mode.
+            timeout (float | None): Per-send timeout in seconds.
+        """
+        group_names = list(dict.fromkeys(group_names))
+
+        if cls.BACKEND is not None and (group_names or pattern or prefix):
+            await cls.BACKEND.publish(
+                group_names, payload, save_history, pattern, prefix
+            )
+
+        targets = cls._resolve_targets(group_names, pattern, prefix)
+        if not targets:
+            return
+
+        await cls._local_send(
+            targets,
+            payload,
+            save_history,
+            concurrent,
+            concurrency,
+            timeout,
+        )
+
+    @hybridmethod
+    def _resolve_targets(
+        cls,
+        group_names: list[str],
+        pattern: str,
+        prefix: str,
+    ) -> list[str]:
+        """Return the distinct local targets of ``send_to_groups``."""
+        targets = list(group_names)
+        if pattern:
+            targets.extend(cls.find_groups(pattern=pattern))
+        if prefix:
+            targets.extend(cls.find_groups(prefix=prefix))
+        return list(dict.fromkeys(targets))
+
+    @hybridmethod
+    def find_groups(
+        cls,
+        pattern: str = "",
+        prefix: str = "",
+    ) -> list[str]:
+        """Return active group names matching a glob pattern or prefix.
+
+        Group names are kept in a sorted index, so only the range of
+        names sharing the literal prefix is examined.
+
+        Args:
+            pattern (str): Glob pattern, e.g. ``user:*``.
+            prefix (str): Name prefix, e.g. ``team:``.
+
+        Returns:
+            list[str]: Matching group names in sorted order.
         """
+        if pattern:
+            literal = re.split(r"[*?\[]", pattern, maxsplit=1)[0]
+            return [
+                group_name
+                for group_name in cls._group_range(literal)
+                if fnmatch.fnmatchcase(group_name, pattern)
+            ]
+        return cls._group_range(prefix)
+
+    @hybridmethod
+    def _group_range(cls, prefix: str) -> list[str]:
+        """Return sorted group names starting with a prefix."""
+        names = cls.GROUP_NAMES
+        start = bisect.bisect_left(names, prefix)
+        stop = start
+        while stop < len(names) and names[stop].startswith(prefix):
+            stop += 1
+        return names[start:stop]
+
+    @hybridmethod
+    async def _local_send(
+        cls,
+        group_names: list[str],
+        payload: dict | str | bytes,
+        save_history: bool,
+        concurrent: bool,
+        concurrency: int | None,
+        timeout: float | None,
+        key: Hashable | None = None,
+    ) -> None:
+        """Deliver a payload to the channels of this process only.
+
+        Each distinct channel of the target groups gets the payload once.
+        ``key`` is the conflation key passed to channel queues. See
+        ``group_send`` for the other arguments.
+        """
+        cache: dict[str, str | bytes] = {}
+
         if save_history:
-            if group_name not in cls.CHANNEL_GROUPS_HISTORY:
-                cls.CHANNEL_GROUPS_HISTORY[group_name] = []
+            for group_name in group_names:
+                cls._save_history(group_name, payload, cache)
 
-            cls.CHANNEL_GROUPS_HISTORY[group_name].append(
-                ChannelMessageDC(
-                    payload=payload,
-                )
+        if timeout is None:
+            timeout = cls.SEND_TIMEOUT
+
+        metrics = cls.METRICS
+        started = time.perf_counter() if metrics.enabled else 0.0
+
+        # Every channel is attributed to the first target group it was
+        # reached through.
+        if len(group_names) == 1:
+            targets = dict.fromkeys(
+                cls.CHANNEL_GROUPS.get(group_names[0], ()), group_names[0]
             )
+        else:
+            targets = {}
+            for group_name in group_names:
+                for channel in cls.CHANNEL_GROUPS.get(group_name, ()):
+                    targets.setdefault(channel, group_name)
+
+        channels = list(targets)
+        frames = cls._encode_frames(channels, payload, cache)
+
+        if concurrent:
+            if concurrency is None:
+                concurrency = cls.SEND_CONCURRENCY
+            results = await cls._fan_out(channels, frames, concurrency, timeout, key)
+        else:
+            results = [
+                await channel._send_frame(frame, timeout, key)
+                for channel, frame in zip(channels, frames)
+            ]
+
+        failed = dict.fromkeys(group_names, 0)
+        for channel, is_sent in zip(channels, results):
+            if not is_sent:
+                failed[targets[channel]] += 1
+                for group_name in group_names:
+                    await cls.remove_channel_from_group(channel, group_name)
+
+        if metrics.enabled:
+            duration = time.perf_counter() - started
+            reached = dict.fromkeys(group_names, 0)
+            for group_name in targets.values():
+                reached[group_name] += 1
+            for group_name in group_names:
+                metrics.on_fan_out(
+                    group_name,
+                    duration,
+                    reached[group_name] - failed[group_name],
+                    failed[group_name],
+                )
+            evicted = sum(failed.values())
+            if evicted:
+                metrics.on_evicted("failure", evicted)
+
+    @hybridmethod
+    async def send_to_channel(
+        cls,
+        channel_uuid: uuid.UUID | str,
+        payload: dict | str | bytes,
+        timeout: float | None = None,
+    ) -> bool:
+        """Send a payload to a single channel of this process by uuid.
+
+        The channel is found with one registry lookup and removed from
+        all of its groups if the send fails.
+
+        Args:
+            channel_uuid (UUID | str): Channel uuid.
+            payload (dict | str | bytes): Data to send.
+            timeout (float | None): Send timeout in seconds.
+                Defaults to ``SEND_TIMEOUT``, ``0`` disables it.
+
+        Returns:
+            bool: ``True`` if the payload was sent, ``False`` if the
+            channel is unknown or the send failed.
+        """
+        if isinstance(channel_uuid, str):
+            channel_uuid = uuid.UUID(channel_uuid)
+
+        channel = cls.CHANNEL_REGISTRY.get(channel_uuid)
+        if channel is None:
+            return False
+
+        sent = await cls._direct_send([channel], payload, timeout)
+        return sent == 1
+
+    @hybridmethod
+    async def send_to_key(
+        cls,
+        key: Hashable,
+        payload: dict | str | bytes,
+        timeout: float | None = None,
+    ) -> int:
+        """Send a payload to every channel of this process with a key.
 
-            if sys.getsizeof(cls.CHANNEL_GROUPS_HISTORY[group_name]) > cls.HISTORY_SIZE:
-                cls.CHANNEL_GROUPS_HISTORY[group_name] = []
+        Args:
+            key (Hashable): Application key given to ``Channel``.
+            payload (dict | str | bytes): Data to send.
+            timeout (float | None): Send timeout in seconds.
+                Defaults to ``SEND_TIMEOUT``, ``0`` disables it.
+
+        Returns:
+            int: Number of channels the payload was sent to.
+        """
+        channels = cls.CHANNEL_KEYS.get(key)
+        if not channels:
+            return 0
+        return await cls._direct_send(list(channels), payload, timeout)
 
-        for channel in list(cls.CHANNEL_GROUPS.get(group_name, {}).keys()):
-            is_sent = await channel._send(payload)
+    @hybridmethod
+    async def _direct_send(
+        cls,
+        channels: list[Channel],
+        payload: dict | str | bytes,
+        timeout: float | None,
+    ) -> int:
+        """Send a payload to known channels, removing the failed ones."""
+        if timeout is None:
+            timeout = cls.SEND_TIMEOUT
+
+        metrics = cls.METRICS
+        started = time.perf_counter() if metrics.enabled else 0.0
+
+        frames = cls._encode_frames(channels, payload)
+        if len(channels) == 1:
+            results = [await channels[0]._send_frame(frames[0], timeout)]
+        else:
+            results = await cls._fan_out(
+                channels, frames, cls.SEND_CONCURRENCY, timeout
+            )
+
+        failed = 0
+        for channel, is_sent in zip(channels, results):
             if not is_sent:
-                await cls.remove_channel_from_group(channel, group_name)
+                failed += 1
+                await cls.remove_channel(channel)
+
+        if metrics.enabled:
+            duration = time.perf_counter() - started
+            metrics.on_direct_send(duration, len(channels) - failed, failed)
+            if failed:
+                metrics.on_evicted("failure", failed)
+        return len(channels) - failed
+
+    @hybridmethod
+    async def group_send_many(
+        cls,
+        messages: Iterable[tuple[str, dict | str | bytes]],
+        save_history: bool = False,
+        concurrency: int | None = None,
+        timeout: float | None = None,
+    ) -> dict[str, GroupSendSummaryDC]:
+        """Send many payloads to many groups in one call.
+
+        Every distinct payload object is encoded once per payload type,
+        however many groups it goes to. Frames for the same channel are
+        coalesced and written in order by a single delivery, and all
+        channel deliveries run concurrently. A channel that fails is
+        removed from every group of the batch it was targeted through.
+
+        Messages to conflated groups go through conflation like in
+        ``group_send``; their deliveries are not counted as sent or
+        failed in the summary.
+
+        Args:
+            messages (Iterable[tuple[str, dict | str | bytes]]):
+                ``(group_name, payload)`` pairs, in delivery order.
+            save_history (bool): Whether to save the messages to history.
+            concurrency (int | None): Maximum number of channel
+                deliveries in flight. Defaults to ``SEND_CONCURRENCY``,
+                ``0`` means unlimited.
+            timeout (float | None): Per-send timeout in seconds.
+                Defaults to ``SEND_TIMEOUT``, ``0`` disables it.
+
+        Returns:
+            dict[str, GroupSendSummaryDC]: Delivery summary per group.
+        """
+        messages = list(messages)
+
+        if cls.BACKEND is not None:
+            for group_name, payload in messages:
+                await cls.BACKEND.publish(group_name, payload, save_history)
+
+        return await cls._local_group_send_many(
+            messages,
+            save_history,
+            concurrency,
+            timeout,
+        )
+
+    @hybridmethod
+    def set_loop(cls, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        """Set the event loop owning the sockets of the hub.
+
+        ``publish_threadsafe`` hands messages over to this loop. It is
+        captured automatically when the first channel joins a group,
+        and captured again if the stored loop has been closed.
+
+        Args:
+            loop (asyncio.AbstractEventLoop | None): Event loop,
+                defaults to the running loop.
+        """
+        cls.LOOP = loop if loop is not None else asyncio.get_running_loop()
+
+    @hybridmethod
+    def publish_threadsafe(
+        cls,
+        group_name: str,
+        payload: dict | str | bytes,
+        save_history: bool = False,
+    ) -> None:
+        """Publish a payload to a group from any thread.
+
+        The message is appended to a queue and delivered on the hub
+        loop through ``group_send_many``. The loop is woken up once per
+        batch: while a wakeup is pending, further messages only join
+        the queue.
+
+        Args:
+            group_name (str): Group name.
+            payload (dict | str | bytes): Data to send.
+            save_history (bool): Whether to save the message to history.
+
+        Raises:
+            RuntimeError: If no event loop is set or the loop is closed,
+                see ``set_loop``.
+        """
+        loop = cls.LOOP
+        if loop is None or loop.is_closed():
+            raise RuntimeError(
+                "ChannelBox has no open event loop, call set_loop() first"
+            )
+
+        cls.PUBLISH_QUEUE.append((group_name, payload, save_history))
+        with cls.PUBLISH_LOCK:
+            if cls.PUBLISH_SCHEDULED:
+                return
+            cls.PUBLISH_SCHEDULED = True
+
+        try:
+            loop.call_soon_threadsafe(cls._start_published)
+        except RuntimeError:
+            # The loop closed after the check above. Clear the flag so
+            # that a later call can schedule the wakeup again.
+            with cls.PUBLISH_LOCK:
+                cls.PUBLISH_SCHEDULED = False
+            raise
+
+    @hybridmethod
+    def _start_published(cls) -> None:
+        """Start the drain task on the hub loop unless it is running."""
+        if cls.PUBLISH_TASK is None or cls.PUBLISH_TASK.done():
+            cls.PUBLISH_TASK = asyncio.get_running_loop().create_task(
+                cls._drain_published()
+            )
+
+    @hybridmethod
+    async def _drain_published(cls) -> None:
+        """Deliver thread-published messages in batches until none are left."""
+        queue = cls.PUBLISH_QUEUE
+        while True:
+            # Clear the flag before draining: messages appended after
+            # this point schedule a new wakeup, earlier ones are drained.
+            with cls.PUBLISH_LOCK:
+                cls.PUBLISH_SCHEDULED = False
+            if not queue:
+                return
+
+            batch = [queue.popleft() for _ in range(len(queue))]
+            for save_history, messages in itertools.groupby(
+                batch, key=lambda item: item[2]
+            ):
+                await cls.group_send_many(
+                    [(group_name, payload) for group_name, payload, _ in messages],
+                    save_history=save_history,
+                )
+
+    @hybridmethod
+    async def _local_group_send_many(
+        cls,
+        messages: list[tuple[str, dict | str | bytes]],
+        save_history: bool,
+        concurrency: int | None,
+        timeout: float | None,
+    ) -> dict[str, GroupSendSummaryDC]:
+        """Deliver a batch to the channels of this process only.
+
+        See ``group_send_many`` for the arguments.
+        """
+        if concurrency is None:
+            concurrency = cls.SEND_CONCURRENCY
+        if timeout is None:
+            timeout = cls.SEND_TIMEOUT
+
+        metrics = cls.METRICS
+        started = time.perf_counter() if metrics.enabled else 0.0
+
+        summary: dict[str, GroupSendSummaryDC] = {}
+        caches: dict[int | str | bytes, dict[str, str | bytes]] = {}
+        outbox: dict[Channel, list[tuple[str | bytes, str]]] = {}
+
+        for group_name, payload in messages:
+            group_summary = summary.get(group_name)
+            if group_summary is None:
+                group_summary = summary[group_name] = GroupSendSummaryDC()
+            group_summary.messages += 1
+
+            if group_name in cls.CONFLATION:
+                await cls._conflate(
+                    group_name, payload, save_history, True, concurrency, timeout
+                )
+                continue
+
+            # Text and bytes payloads are deduplicated by value, other
+            # payloads by identity; all of them stay alive in ``messages``.
+            key = payload if isinstance(payload, (str, bytes)) else id(payload)
+            cache = caches.setdefault(key, {})
+
+            if save_history:
+                cls._save_history(group_name, payload, cache)
+
+            for channel in cls.CHANNEL_GROUPS.get(group_name, {}):
+                frame = cls._channel_frame(payload, channel, cache)
+                outbox.setdefault(channel, []).append((frame, group_name))
+
+        channels = list(outbox)
+        results = await cls._gather(
+            [
+                cls._deliver_frames(channel, outbox[channel], timeout)
+                for channel in channels
+            ],
+            concurrency,
+        )
+
+        evicted = 0
+        for channel, delivered in zip(channels, results):
+            frames = outbox[channel]
+            for index, (_, group_name) in enumerate(frames):
+                if index < delivered:
+                    summary[group_name].sent += 1
+                else:
+                    summary[group_name].failed += 1
+
+            if delivered < len(frames):
+                evicted += 1
+                for group_name in {group_name for _, group_name in frames}:
+                    await cls.remove_channel_from_group(channel, group_name)
+
+        if metrics.enabled:
+            duration = time.perf_counter() - started
+            for group_name, group_summary in summary.items():
+                metrics.on_fan_out(
+                    group_name,
+                    duration,
+                    group_summary.sent,
+                    group_summary.failed,
+                )
+            if evicted:
+                metrics.on_evicted("failure", evicted)
+
+        return summary
+
+    @hybridmethod
+    async def _deliver_frames(
+        cls,
+        channel: Channel,
+        frames: list[tuple[str | bytes, str]],
+        timeout: float,
+    ) -> int:
+        """Send frames to a channel in order, stopping at the first failure.
+
+        Returns:
+            int: Number of frames delivered.
+        """
+        for index, (frame, _) in enumerate(frames):
+            if not await channel._send_frame(frame, timeout):
+                return index
+        return len(frames)
+
+    @hybridmethod
+    def _encode(
+        cls,
+        payload: dict | str | bytes,
+        payload_type: str,
+        cache: dict[str, str | bytes],
+    ) -> str | bytes:
+        """Encode a payload for a payload type, reusing cached frames.
+
+        Args:
+            payload (dict | str | bytes): Payload to encode.
+            payload_type (str): Target payload type.
+            cache (dict[str, str | bytes]): Frames already encoded
+                for this payload, keyed by payload type.
+
+        Returns:
+            str | bytes: Encoded frame.
+        """
+        frame = cache.get(payload_type)
+        if frame is None:
+            frame = cache[payload_type] = encode_frame(
+                payload, payload_type, cls.JSON_ENCODER, cls.MSGPACK_ENCODER
+            )
+        return frame
+
+    @hybridmethod
+    def _compress(
+        cls,
+        payload: dict | str | bytes,
+        codec: str,
+        cache: dict[str, str | bytes],
+        payload_type: str = PayloadTypeEnum.BYTES.value,
+    ) -> bytes:
+        """Compress the binary frame of a payload once per codec.
+
+        Args:
+            payload (dict | str | bytes): Payload to encode.
+            codec (str): Codec name, see ``compress_frame``.
+            cache (dict[str, str | bytes]): Frames already encoded
+                for this payload.
+            payload_type (str): Binary payload type of the frame,
+                ``bytes`` or ``msgpack``.
+
+        Returns:
+            bytes: Binary frame prefixed with its codec flag.
+        """
+        key = f"{payload_type}+{codec}"
+        frame = cache.get(key)
+        if not isinstance(frame, bytes):
+            frame = cache[key] = compress_frame(
+                cast(bytes, cls._encode(payload, payload_type, cache)),
+                codec,
+                cls.COMPRESSION_THRESHOLD,
+            )
+        return frame
+
+    @hybridmethod
+    def _channel_frame(
+        cls,
+        payload: dict | str | bytes,
+        channel: Channel,
+        cache: dict[str, str | bytes],
+    ) -> str | bytes:
+        """Return the frame of a payload in the format a channel accepts."""
+        if channel.compression is not None:
+            return cls._compress(
+                payload, channel.compression, cache, channel.payload_type
+            )
+        return cls._encode(payload, channel.payload_type, cache)
+
+    @hybridmethod
+    def _encode_frames(
+        cls,
+        channels: list[Channel],
+        payload: dict | str | bytes,
+        cache: dict[str, str | bytes] | None = None,
+    ) -> list[str | bytes]:
+        """Encode a payload once per payload type used by the channels.
+
+        Args:
+            channels (list[Channel]): Target channels.
+            payload (dict | str | bytes): Payload to encode.
+            cache (dict[str, str | bytes] | None): Frames already
+                encoded for this payload, keyed by payload type.
+
+        Returns:
+            list[str | bytes]: Frame for every channel, in input order.
+        """
+        if cache is None:
+            cache = {}
+        return [cls._channel_frame(payload, channel, cache) for channel in channels]
+
+    @hybridmethod
+    def _save_history(
+        cls,
+        group_name: str,
+        payload: dict | str | bytes,
+        cache: dict[str, str | bytes],
+    ) -> None:
+        """Append a payload to the group history.
+
+        The message size is the length of the encoded payload, so the
+        byte limits account for the real payload data. With
+        ``HISTORY_COMPRESSION`` set, the compressed binary frame is
+        stored instead of the payload.
+
+        Args:
+            group_name (str): Group name.
+            payload (dict | str | bytes): Payload to store.
+            cache (dict[str, str | bytes]): Frames already encoded
+                for this payload, keyed by payload type.
+        """
+        history = cls.CHANNEL_GROUPS_HISTORY.get(group_name)
+        if history is None:
+            history = cls.CHANNEL_GROUPS_HISTORY[group_name] = cls.HISTORY_STORE.open(
+                group_name,
+                *cls._history_limits(group_name),
+            )
+
+        if cls.HISTORY_COMPRESSION is not None:
+            payload = cls._compress(payload, cls.HISTORY_COMPRESSION, cache)
+
+        encoded = None
+        if isinstance(payload, bytes):
+            size = len(payload)
+        elif isinstance(payload, str):
+            size = len(payload.encode("utf-8"))
+        else:
+            encoded = cast(str, cls._encode(payload, PayloadTypeEnum.JSON.value, cache))
+            size = len(encoded.encode("utf-8"))
+
+        history.append(ChannelMessageDC(payload=payload, size=size), encoded)
+
+    @hybridmethod
+    def _history_limits(cls, group_name: str) -> tuple[int, int]:
+        """Return ``(max_messages, max_bytes)`` history limits for a group."""
+        return cls.HISTORY_LIMITS.get(
+            group_name,
+            (cls.HISTORY_LENGTH, cls.HISTORY_SIZE),
+        )
+
+    @hybridmethod
+    async def set_history_limits(
+        cls,
+        group_name: str,
+        max_messages: int | None = None,
+        max_bytes: int | None = None,
+    ) -> None:
+        """Override history limits for a single group.
+
+        Args:
+            group_name (str): Group name.
+            max_messages (int | None): Maximum number of messages.
+                Defaults to ``HISTORY_LENGTH``, ``0`` means unlimited.
+            max_bytes (int | None): Maximum total encoded size in bytes.
+                Defaults to ``HISTORY_SIZE``, ``0`` means unlimited.
+        """
+        limits = (
+            cls.HISTORY_LENGTH if max_messages is None else max_messages,
+            cls.HISTORY_SIZE if max_bytes is None else max_bytes,
+        )
+        cls.HISTORY_LIMITS[group_name] = limits
+
+        if group_name in cls.CHANNEL_GROUPS_HISTORY:
+            cls.CHANNEL_GROUPS_HISTORY[group_name].set_limits(*limits)
+
+    @hybridmethod
+    async def _fan_out(
+        cls,
+        channels: list[Channel],
+        frames: list[str | bytes],
+        concurrency: int,
+        timeout: float,
+        key: Hashable | None = None,
+    ) -> list[bool]:
+        """Send prepared frames to several channels concurrently.
+
+        Args:
+            channels (list[Channel]): Target channels.
+            frames (list[str | bytes]): Frame for every channel.
+            concurrency (int): Maximum number of sends in flight,
+                ``0`` means unlimited.
+            timeout (float): Per-send timeout in seconds.
+            key (Hashable | None): Conflation key for channel queues.
+
+        Returns:
+            list[bool]: Send result for every channel, in input order.
+        """
+        return await cls._gather(
+            [
+                channel._send_frame(frame, timeout, key)
+                for channel, frame in zip(channels, frames)
+            ],
+            concurrency,
+        )
+
+    @hybridmethod
+    async def _gather(
+        cls,
+        coroutines: list,
+        concurrency: int,
+    ) -> list:
+        """Run coroutines concurrently with an optional limit.
+
+        Args:
+            coroutines (list): Coroutines to run.
+            concurrency (int): Maximum number of coroutines in flight,
+                ``0`` means unlimited.
+
+        Returns:
+            list: Results in input order.
+        """
+        if not concurrency or concurrency >= len(coroutines):
+            return await asyncio.gather(*coroutines)
 
-    @classmethod
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(coroutine) -> Any:
+            async with semaphore:
+                return await coroutine
+
+        return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+    @hybridmethod
     async def get_groups(cls) -> dict:
         """Return all active channel groups.
 
@@ -180,50 +1932,193 @@ class ChannelBox:
         """
         return cls.CHANNEL_GROUPS
 
-    @classmethod
+    @hybridmethod
     async def flush_groups(cls) -> None:
-        """Remove all channels from all groups."""
+        """Remove all channels from all groups.
+
+        Channel writers and pending conflated updates are stopped too.
+        """
+        if cls.BACKEND is not None:
+            for group_name in list(cls.CHANNEL_GROUPS):
+                await cls.BACKEND.unsubscribe(group_name)
+
+        for channel in cls.CHANNEL_MEMBERSHIPS:
+            channel._expiry_token = None
+            channel._buckets = None
+            channel._close()
+        for task in cls.CONFLATION_TASKS.values():
+            task.cancel()
+
+        cls.CONFLATION_PENDING = {}
+        cls.CONFLATION_TASKS = {}
         cls.CHANNEL_GROUPS = {}
+        cls.CHANNEL_MEMBERSHIPS = {}
+        cls.CHANNEL_REGISTRY = {}
+        cls.CHANNEL_KEYS = {}
+        cls.GROUP_NAMES = []
+        cls.EXPIRY_HEAP = []
+        cls.EXPIRY_STALE = 0
 
-    @classmethod
+    @hybridmethod
     async def get_history(
         cls,
         group_name: str = "",
-    ) -> dict:
+        since: int | uuid.UUID | str | datetime.datetime | None = None,
+        limit: int | None = None,
+    ) -> dict | GroupHistoryProtocol | list[ChannelMessageDC]:
         """Get message history.
 
+        Without a cursor or limit the stored history is returned as is.
+        With ``since`` and/or ``limit`` only the messages newer than the
+        cursor are returned, oldest first, found by index lookup.
+
+        A ``SharedMemoryHistoryStore`` only keeps messages that fit into
+        its ``slot_size`` (4 KiB by default); larger ones are missing
+        from the history and reported with a ``RuntimeWarning``.
+
         Args:
             group_name (str): Optional group name.
                 If provided, returns history only for that group.
+            since (int | UUID | str | datetime | None): Cursor of the last
+                message seen: a sequence number, a message uuid or a
+                ``created`` timestamp.
+            limit (int | None): Maximum number of messages per group.
 
         Returns:
-            dict: Message history for the specified group
-            or all groups if no name is provided.
+            dict | GroupHistoryProtocol | list[ChannelMessageDC]: Message history
+            for the specified group or all groups if no name is provided.
         """
-        return (
-            cls.CHANNEL_GROUPS_HISTORY.get(group_name, {})
-            if group_name
-            else cls.CHANNEL_GROUPS_HISTORY
-        )
+        if cls.HISTORY_STORE.shared:
+            cls._attach_shared_histories(group_name)
+
+        if since is None and limit is None:
+            return (
+                cls.CHANNEL_GROUPS_HISTORY.get(group_name, {})
+                if group_name
+                else cls.CHANNEL_GROUPS_HISTORY
+            )
+
+        if group_name:
+            history = cls.CHANNEL_GROUPS_HISTORY.get(group_name)
+            return history.read(since, limit) if history is not None else []
+
+        return {
+            name: history.read(since, limit)
+            for name, history in cls.CHANNEL_GROUPS_HISTORY.items()
+        }
+
+    @hybridmethod
+    def _attach_shared_histories(cls, group_name: str = "") -> None:
+        """Open histories that other workers created in a shared store."""
+        group_names = cls.HISTORY_STORE.groups()
+        if group_name:
+            group_names = [group_name] if group_name in group_names else []
 
-    @classmethod
+        for name in group_names:
+            if name not in cls.CHANNEL_GROUPS_HISTORY:
+                cls.CHANNEL_GROUPS_HISTORY[name] = cls.HISTORY_STORE.open(
+                    name,
+                    *cls._history_limits(name),
+                )
+
+    @hybridmethod
     async def flush_history(cls) -> None:
         """Clear message history for all groups."""
+        for history in cls.CHANNEL_GROUPS_HISTORY.values():
+            history.clear()
         cls.CHANNEL_GROUPS_HISTORY = {}
 
-    @classmethod
+    @hybridmethod
+    async def metrics_snapshot(cls) -> dict:
+        """Return collected metrics together with current gauges.
+
+        Returns:
+            dict: Counters reported by ``METRICS`` plus the number of
+            active groups and channels and the history size in
+            messages and bytes.
+        """
+        histories = cls.CHANNEL_GROUPS_HISTORY.values()
+        return {
+            **cls.METRICS.snapshot(),
+            "groups": len(cls.CHANNEL_GROUPS),
+            "channels": len(cls.CHANNEL_MEMBERSHIPS),
+            "history_messages": sum(len(history) for history in histories),
+            "history_bytes": sum(history.nbytes for history in histories),
+        }
+
+    @hybridmethod
+    async def metrics_prometheus(cls) -> str:
+        """Return ``metrics_snapshot`` in the Prometheus text format."""
+        return to_prometheus(await cls.metrics_snapshot())
+
+    @hybridmethod
     async def clean_expired(cls) -> None:
         """Remove expired channels from all groups.
 
         Channels are considered expired if their TTL has elapsed.
         Empty groups are automatically removed.
+
+        Channels are tracked in a heap ordered by expiry deadline,
+        so a sweep only touches channels that are actually due.
+        Channels that were active since they were indexed are pushed
+        back with their new deadline.
         """
-        for group_name in list(cls.CHANNEL_GROUPS.keys()):
-            for channel in list(cls.CHANNEL_GROUPS[group_name].keys()):
-                if await channel._is_expired():
-                    with contextlib.suppress(Exception):
-                        del cls.CHANNEL_GROUPS[group_name][channel]
+        heap = cls.EXPIRY_HEAP
+        now = time.time()
+
+        while heap and heap[0][0] < now:
+            _, token, channel = heapq.heappop(heap)
+
+            if channel._expiry_token != token:
+                cls.EXPIRY_STALE = max(cls.EXPIRY_STALE - 1, 0)
+                continue
+
+            if await channel._is_expired():
+                await cls.remove_channel(channel)
+                cls.EXPIRY_STALE -= 1
+                cls.METRICS.on_evicted("expiry")
+            else:
+                cls._index_expiry(channel)
+
+        # Drop entries of removed channels once they dominate the heap.
+        if cls.EXPIRY_STALE * 2 > len(heap):
+            cls.EXPIRY_HEAP = [
+                entry for entry in heap if entry[2]._expiry_token == entry[1]
+            ]
+            heapq.heapify(cls.EXPIRY_HEAP)
+            cls.EXPIRY_STALE = 0
+
+    @hybridmethod
+    async def start_reaper(
+        cls,
+        interval: float | None = None,
+    ) -> None:
+        """Start a background task calling ``clean_expired`` periodically.
+
+        Intended to be started and stopped with the application lifespan.
+
+        Args:
+            interval (float | None): Sweep interval in seconds.
+                Defaults to ``REAPER_INTERVAL``.
+        """
+        if cls.REAPER_TASK is not None and not cls.REAPER_TASK.done():
+            return
+
+        if interval is None:
+            interval = cls.REAPER_INTERVAL
+
+        async def reap() -> None:
+            while True:
+                await asyncio.sleep(interval)
+                await cls.clean_expired()
+
+        cls.REAPER_TASK = asyncio.get_running_loop().create_task(reap())
 
-            if not cls.CHANNEL_GROUPS.get(group_name):
-                with contextlib.suppress(Exception):
-                    del cls.CHANNEL_GROUPS[group_name]
+    @hybridmethod
+    async def stop_reaper(cls) -> None:
+        """Stop the background expiry task started by ``start_reaper``."""
+        task, cls.REAPER_TASK = cls.REAPER_TASK, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
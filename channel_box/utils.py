@@ -1,6 +1,13 @@
+import contextlib
+import functools
+import json
+import struct
+import types
+import zlib
 from dataclasses import dataclass, field
 from datetime import UTC, datetime
 from enum import Enum
+from typing import Any, Callable, Concatenate, Generic, ParamSpec, TypeVar, cast
 from uuid import UUID, uuid4
 
 
@@ -10,6 +17,51 @@ class PayloadTypeEnum(Enum):
     JSON = "json"
     TEXT = "text"
     BYTES = "bytes"
+    MSGPACK = "msgpack"
+
+
+class OverflowPolicyEnum(Enum):
+    """Overflow policies for bounded channel outbound queues."""
+
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    COALESCE_LATEST = "coalesce_latest"
+    DISCONNECT = "disconnect"
+
+
+class RateLimitPolicyEnum(Enum):
+    """Actions for channels exceeding their inbound rate limit."""
+
+    DROP = "drop"
+    DELAY = "delay"
+    DISCONNECT = "disconnect"
+
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class hybridmethod(Generic[P, R]):
+    """Method bound to the instance it is called on, or to the class.
+
+    Lets the class act as a default instance: ``Hub.method()`` works on
+    class attributes, ``Hub().method()`` on the instance attributes.
+    """
+
+    def __init__(self, func: Callable[Concatenate[Any, P], R]) -> None:
+        self.__func__ = func
+        # Copied by hand, ``functools.update_wrapper`` expects a function.
+        self.__module__ = func.__module__
+        self.__name__ = func.__name__
+        self.__qualname__ = func.__qualname__
+        self.__doc__ = func.__doc__
+        self.__wrapped__ = func
+
+    def __get__(self, instance: Any, owner: type) -> Callable[P, R]:
+        return cast(
+            Callable[P, R],
+            types.MethodType(self.__func__, owner if instance is None else instance),
+        )
 
 
 @dataclass(slots=True)
@@ -17,8 +69,400 @@ class ChannelMessageDC:
     """Data container for a channel message.
 
     Stores the payload and metadata used for message history tracking.
+    ``size`` is the encoded payload size in bytes, ``seq`` is the
+    monotonic sequence number assigned by the group history.
     """
 
     payload: str | bytes | dict
+    size: int = 0
+    seq: int = 0
     uuid: UUID = field(default_factory=uuid4)
     created: datetime = field(default_factory=lambda: datetime.now(tz=UTC))
+
+
+def _stdlib_json_encoder() -> Callable[[Any], str]:
+    """Build an encoder producing the same text as ``WebSocket.send_json``."""
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    return encoder.encode
+
+
+def _orjson_encoder() -> Callable[[Any], str]:
+    """Build an encoder backed by ``orjson``."""
+    import orjson
+
+    dumps = orjson.dumps
+    return lambda obj: dumps(obj).decode("utf-8")
+
+
+def _msgspec_encoder() -> Callable[[Any], str]:
+    """Build an encoder backed by ``msgspec``."""
+    import msgspec
+
+    encode = msgspec.json.Encoder().encode
+    return lambda obj: encode(obj).decode("utf-8")
+
+
+JSON_ENCODERS: dict[str, Callable[[], Callable[[Any], str]]] = {
+    "json": _stdlib_json_encoder,
+    "orjson": _orjson_encoder,
+    "msgspec": _msgspec_encoder,
+}
+
+
+def get_json_encoder(name: str = "json") -> Callable[[Any], str]:
+    """Return a JSON encoder by name.
+
+    Args:
+        name (str): Encoder name. Allowed values: ``json``,
+            ``orjson``, ``msgspec``.
+
+    Returns:
+        Callable[[Any], str]: Function encoding an object to JSON text.
+
+    Raises:
+        ValueError: If the encoder name is unknown.
+        ImportError: If the encoder library is not installed.
+    """
+    if name not in JSON_ENCODERS:
+        raise ValueError(f"Unknown JSON encoder: {name!r}")
+    return JSON_ENCODERS[name]()
+
+
+def _pack_msgpack(obj: Any, parts: list[bytes]) -> None:
+    """Append the MessagePack encoding of an object to ``parts``."""
+    if obj is None:
+        parts.append(b"\xc0")
+    elif obj is True:
+        parts.append(b"\xc3")
+    elif obj is False:
+        parts.append(b"\xc2")
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            parts.append(struct.pack("B", obj))
+        elif -0x20 <= obj < 0:
+            parts.append(struct.pack("b", obj))
+        elif obj >= 0:
+            for fmt, code, bound in (
+                ("B", 0xCC, 1 << 8),
+                (">H", 0xCD, 1 << 16),
+                (">I", 0xCE, 1 << 32),
+                (">Q", 0xCF, 1 << 64),
+            ):
+                if obj < bound:
+                    parts.append(bytes((code,)) + struct.pack(fmt, obj))
+                    break
+            else:
+                raise OverflowError("Integer is too large for MessagePack")
+        else:
+            for fmt, code, bound in (
+                ("b", 0xD0, 1 << 7),
+                (">h", 0xD1, 1 << 15),
+                (">i", 0xD2, 1 << 31),
+                (">q", 0xD3, 1 << 63),
+            ):
+                if obj >= -bound:
+                    parts.append(bytes((code,)) + struct.pack(fmt, obj))
+                    break
+            else:
+                raise OverflowError("Integer is too large for MessagePack")
+    elif isinstance(obj, float):
+        parts.append(b"\xcb" + struct.pack(">d", obj))
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        size = len(data)
+        if size < 32:
+            parts.append(bytes((0xA0 | size,)))
+        elif size < 1 << 8:
+            parts.append(b"\xd9" + struct.pack("B", size))
+        elif size < 1 << 16:
+            parts.append(b"\xda" + struct.pack(">H", size))
+        else:
+            parts.append(b"\xdb" + struct.pack(">I", size))
+        parts.append(data)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        size = len(data)
+        if size < 1 << 8:
+            parts.append(b"\xc4" + struct.pack("B", size))
+        elif size < 1 << 16:
+            parts.append(b"\xc5" + struct.pack(">H", size))
+        else:
+            parts.append(b"\xc6" + struct.pack(">I", size))
+        parts.append(data)
+    elif isinstance(obj, (list, tuple)):
+        parts.append(msgpack_array_header(len(obj)))
+        for item in obj:
+            _pack_msgpack(item, parts)
+    elif isinstance(obj, dict):
+        size = len(obj)
+        if size < 16:
+            parts.append(bytes((0x80 | size,)))
+        elif size < 1 << 16:
+            parts.append(b"\xde" + struct.pack(">H", size))
+        else:
+            parts.append(b"\xdf" + struct.pack(">I", size))
+        for key, value in obj.items():
+            _pack_msgpack(key, parts)
+            _pack_msgpack(value, parts)
+    else:
+        raise TypeError(
+            f"Object of type {type(obj).__name__} is not MessagePack serializable"
+        )
+
+
+def msgpack_array_header(size: int) -> bytes:
+    """Return the MessagePack header of an array with ``size`` items."""
+    if size < 16:
+        return bytes((0x90 | size,))
+    if size < 1 << 16:
+        return b"\xdc" + struct.pack(">H", size)
+    return b"\xdd" + struct.pack(">I", size)
+
+
+def _python_msgpack_encoder() -> Callable[[Any], bytes]:
+    """Build the pure-Python MessagePack encoder."""
+
+    def encode(obj: Any) -> bytes:
+        parts: list[bytes] = []
+        _pack_msgpack(obj, parts)
+        return b"".join(parts)
+
+    return encode
+
+
+def _msgpack_encoder() -> Callable[[Any], bytes]:
+    """Build an encoder backed by ``msgpack``."""
+    import msgpack
+
+    return msgpack.Packer(use_bin_type=True, autoreset=True).pack
+
+
+def _msgspec_msgpack_encoder() -> Callable[[Any], bytes]:
+    """Build an encoder backed by ``msgspec``."""
+    import msgspec
+
+    return msgspec.msgpack.Encoder().encode
+
+
+MSGPACK_ENCODERS: dict[str, Callable[[], Callable[[Any], bytes]]] = {
+    "msgpack": _msgpack_encoder,
+    "msgspec": _msgspec_msgpack_encoder,
+    "python": _python_msgpack_encoder,
+}
+
+
+@functools.cache
+def get_msgpack_encoder(name: str = "auto") -> Callable[[Any], bytes]:
+    """Return a MessagePack encoder by name.
+
+    Args:
+        name (str): Encoder name. Allowed values: ``msgpack``,
+            ``msgspec``, ``python`` and ``auto``, which picks the first
+            installed library and falls back to the pure-Python encoder.
+
+    Returns:
+        Callable[[Any], bytes]: Function encoding an object to MessagePack.
+
+    Raises:
+        ValueError: If the encoder name is unknown.
+        ImportError: If the encoder library is not installed.
+    """
+    if name == "auto":
+        for factory in MSGPACK_ENCODERS.values():
+            with contextlib.suppress(ImportError):
+                return factory()
+    if name not in MSGPACK_ENCODERS:
+        raise ValueError(f"Unknown MessagePack encoder: {name!r}")
+    return MSGPACK_ENCODERS[name]()
+
+
+def _zstd_compressor() -> Callable[[bytes], bytes]:
+    """Build a compressor backed by ``zstandard``."""
+    import zstandard
+
+    return zstandard.ZstdCompressor().compress
+
+
+# Codec name -> (frame flag, compressor factory).
+COMPRESSORS: dict[str, tuple[int, Callable[[], Callable[[bytes], bytes] | None]]] = {
+    "identity": (0, lambda: None),
+    "zlib": (1, lambda: zlib.compress),
+    "zstd": (2, _zstd_compressor),
+}
+
+
+@functools.cache
+def get_compressor(name: str) -> Callable[[bytes], bytes] | None:
+    """Return a compressor by codec name.
+
+    Args:
+        name (str): Codec name. Allowed values: ``identity``,
+            ``zlib``, ``zstd``.
+
+    Returns:
+        Callable[[bytes], bytes] | None: Compression function,
+        ``None`` for ``identity``.
+
+    Raises:
+        ValueError: If the codec name is unknown.
+        ImportError: If the codec library is not installed.
+    """
+    if name not in COMPRESSORS:
+        raise ValueError(f"Unknown compression codec: {name!r}")
+    return COMPRESSORS[name][1]()
+
+
+def compress_frame(frame: bytes, codec: str, threshold: int = 0) -> bytes:
+    """Compress a binary frame and prefix it with a 1-byte codec flag.
+
+    Frames shorter than ``threshold``, or that do not shrink, are kept
+    as is with the ``identity`` flag ``0``.
+
+    Args:
+        frame (bytes): Encoded binary frame.
+        codec (str): Codec name, see ``get_compressor``.
+        threshold (int): Minimum frame size in bytes worth compressing.
+
+    Returns:
+        bytes: Flagged frame.
+    """
+    compress = get_compressor(codec)
+    if compress is not None and len(frame) >= threshold:
+        compressed = compress(frame)
+        if len(compressed) < len(frame):
+            return bytes((COMPRESSORS[codec][0],)) + compressed
+    return b"\x00" + frame
+
+
+def decompress_frame(frame: bytes) -> bytes:
+    """Decode a frame produced by ``compress_frame``.
+
+    Args:
+        frame (bytes): Flagged frame.
+
+    Returns:
+        bytes: Original binary frame.
+    """
+    flag, body = frame[0], frame[1:]
+    if flag == COMPRESSORS["zlib"][0]:
+        return zlib.decompress(body)
+    if flag == COMPRESSORS["zstd"][0]:
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress(body)
+    return body
+
+
+def encode_frame(
+    payload: dict | str | bytes,
+    payload_type: str,
+    json_encoder: Callable[[Any], str],
+    msgpack_encoder: Callable[[Any], bytes] | None = None,
+) -> str | bytes:
+    """Encode a payload to a wire frame for the given payload type.
+
+    Text frames are returned as ``str``, binary frames as ``bytes``.
+    ``msgpack`` frames pack dict and str payloads, ``bytes`` payloads
+    are taken as already packed.
+
+    Args:
+        payload (dict | str | bytes): Payload to encode.
+        payload_type (str): Channel payload type.
+        json_encoder (Callable[[Any], str]): JSON encoder.
+        msgpack_encoder (Callable[[Any], bytes] | None): MessagePack
+            encoder, defaults to ``get_msgpack_encoder()``.
+
+    Returns:
+        str | bytes: Encoded frame.
+    """
+    match payload_type:
+        case PayloadTypeEnum.JSON.value:
+            return json_encoder(payload)
+        case PayloadTypeEnum.TEXT.value:
+            if isinstance(payload, str):
+                return payload
+            if isinstance(payload, bytes):
+                return payload.decode("utf-8")
+            return json_encoder(payload)
+        case PayloadTypeEnum.BYTES.value:
+            if isinstance(payload, bytes):
+                return payload
+            if isinstance(payload, str):
+                return payload.encode("utf-8")
+            return json_encoder(payload).encode("utf-8")
+        case PayloadTypeEnum.MSGPACK.value:
+            if isinstance(payload, bytes):
+                return payload
+            return (msgpack_encoder or get_msgpack_encoder())(payload)
+    raise ValueError(f"Unknown payload type: {payload_type!r}")
+
+
+@dataclass(slots=True)
+class GroupSendSummaryDC:
+    """Data container for a per-group delivery summary.
+
+    ``messages`` is the number of payloads sent to the group, ``sent``
+    and ``failed`` count individual frame deliveries to its channels.
+    """
+
+    messages: int = 0
+    sent: int = 0
+    failed: int = 0
+
+
+@dataclass(slots=True)
+class MembershipDC:
+    """Data container for a channel membership in a group.
+
+    ``created_at`` is the UNIX timestamp of when the channel joined,
+    ``meta`` optional presence metadata, such as a user name.
+    """
+
+    created_at: float
+    meta: dict | None = None
+
+
+@dataclass(slots=True)
+class PresenceEventDC:
+    """Data container for a group presence change.
+
+    ``count`` is the number of channels in the group after the change.
+    A debounced event collects the net joins and leaves of its window.
+    """
+
+    group_name: str
+    count: int
+    joined: list = field(default_factory=list)
+    left: list = field(default_factory=list)
+
+
+def batch_frames(
+    frames: list[str | bytes],
+    payload_type: str,
+) -> str | bytes:
+    """Combine encoded frames of one channel into a single frame.
+
+    JSON frames become a JSON array, text frames a JSON array of
+    strings, MessagePack frames a MessagePack array and binary frames a
+    sequence of 4-byte big-endian length prefixed chunks.
+
+    Args:
+        frames (list[str | bytes]): Frames encoded for the payload type.
+        payload_type (str): Channel payload type.
+
+    Returns:
+        str | bytes: Combined frame.
+    """
+    match payload_type:
+        case PayloadTypeEnum.JSON.value:
+            return "[" + ",".join(cast(list[str], frames)) + "]"
+        case PayloadTypeEnum.TEXT.value:
+            return json.dumps(frames, ensure_ascii=False, separators=(",", ":"))
+        case PayloadTypeEnum.BYTES.value:
+            chunks = cast(list[bytes], frames)
+            return b"".join(len(chunk).to_bytes(4, "big") + chunk for chunk in chunks)
+        case PayloadTypeEnum.MSGPACK.value:
+            return msgpack_array_header(len(frames)) + b"".join(
+                cast(list[bytes], frames)
+            )
+    raise ValueError(f"Unknown payload type: {payload_type!r}")
@@ -1,15 +1,28 @@
+import contextlib
+
 from starlette.applications import Starlette
 from starlette.routing import Mount
 
+from channel_box import ChannelBox
+from channel_box.metrics import CounterMetrics
 from example.channel.urls import routes as channel_routes
 
 
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    ChannelBox.METRICS = CounterMetrics()
+    await ChannelBox.start_reaper()
+    yield
+    await ChannelBox.stop_reaper()
+
+
 def create_app() -> Starlette:
     return Starlette(
         debug=True,
         routes=[
             Mount("/", routes=channel_routes),
         ],
+        lifespan=lifespan,
     )
 
 
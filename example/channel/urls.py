@@ -11,6 +11,7 @@ from .views import (
     ShowHistory,
     FlushHistory,
     CleanExpired,
+    Metrics,
 )
 
 
@@ -34,4 +35,5 @@ routes = [
 
     # Maintenance
     Route("/clean-expired", CleanExpired),
+    Route("/metrics", Metrics),
 ]
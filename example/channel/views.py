@@ -2,11 +2,12 @@ import json
 from typing import Any
 import time
 from datetime import datetime
+from itertools import islice
 from simple_print import sprint
 from jinja2 import Template
 
 from starlette.endpoints import HTTPEndpoint, WebSocketEndpoint
-from starlette.responses import HTMLResponse, JSONResponse
+from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from starlette.websockets import WebSocket
 
 from channel_box import Channel, ChannelBox
@@ -20,6 +21,7 @@ from .utils import main_template, chat_template
 
 class WsChatEndpoint(WebSocketEndpoint):
     encoding = "text"
+    channel: Channel | None = None
 
     async def on_connect(self, websocket: WebSocket) -> None:
         sprint("WsChatEndpoint.on_connect", c="green")
@@ -30,16 +32,23 @@ class WsChatEndpoint(WebSocketEndpoint):
         if not group_name:
             return
 
-        channel = Channel(
+        self.channel = Channel(
             websocket=websocket,
             expires=60 * 60,
             payload_type="json",
         )
 
         await ChannelBox.add_channel_to_group(
-            channel=channel,
+            channel=self.channel,
             group_name=group_name,
         )
+        await ChannelBox.set_group_rate_limit(group_name, rate=5, burst=10)
+
+    async def on_disconnect(self, websocket: WebSocket, close_code: int) -> None:
+        sprint(f"WsChatEndpoint.on_disconnect {close_code=}", c="green")
+
+        if self.channel is not None:
+            await ChannelBox.remove_channel(self.channel)
 
     async def on_receive(self, websocket: WebSocket, data: Any) -> None:
         sprint(
@@ -59,10 +68,11 @@ class WsChatEndpoint(WebSocketEndpoint):
             return
 
         group_name = websocket.query_params.get("group_name")
-        if not group_name:
+        if not group_name or self.channel is None:
             return
 
-        await ChannelBox.group_send(
+        await ChannelBox.group_send_from(
+            channel=self.channel,
             group_name=group_name,
             payload={
                 "username": username,
@@ -143,13 +153,15 @@ class SendMessageFromAnyPartOfYourCode(HTTPEndpoint):
 class ShowGroups(HTTPEndpoint):
     async def get(self, request):
         groups = await ChannelBox.get_groups()
+        limit = int(request.query_params.get("limit", 50))
 
         rows = []
 
         for group_name, channels in groups.items():
+            count = await ChannelBox.get_presence_count(group_name)
             rows.append(f"""
                 <div class="group">
-                    <h3>📦 Group: <span>{group_name}</span></h3>
+                    <h3>📦 Group: <span>{group_name}</span> ({count} online)</h3>
                     <table>
                         <thead>
                             <tr>
@@ -163,7 +175,7 @@ class ShowGroups(HTTPEndpoint):
                         <tbody>
             """)
 
-            for channel in channels:
+            for channel in islice(channels, limit):
                 ttl_left = max(0, int(channel.expires - (time.time() - channel.last_active)))
                 last_active = datetime.fromtimestamp(channel.last_active).strftime(
                     "%Y-%m-%d %H:%M:%S"
@@ -179,6 +191,11 @@ class ShowGroups(HTTPEndpoint):
                     </tr>
                 """)
 
+            if count > limit:
+                rows.append(f"""
+                    <tr><td colspan="5">… and {count - limit} more</td></tr>
+                """)
+
             rows.append("""
                         </tbody>
                     </table>
@@ -403,3 +420,11 @@ class CleanExpired(HTTPEndpoint):
         sprint("CleanExpired", c="green")
         await ChannelBox.clean_expired()
         return JSONResponse({"clean_expired": "success"})
+
+
+class Metrics(HTTPEndpoint):
+    async def get(self, request):
+        sprint("Metrics", c="green")
+        if request.query_params.get("format") == "json":
+            return JSONResponse(await ChannelBox.metrics_snapshot())
+        return PlainTextResponse(await ChannelBox.metrics_prometheus())
@@ -28,6 +28,8 @@ setuptools.setup(
             "tests.*",
             "tests",
             "example",
+            "benchmarks",
+            "benchmarks.*",
         ]
     ),
     classifiers=[
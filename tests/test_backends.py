@@ -0,0 +1,128 @@
+import asyncio
+import os
+import tempfile
+import pytest
+from unittest.mock import MagicMock
+
+from channel_box import Channel, ChannelBox
+from channel_box.backends import UnixSocketBackend, decode_envelope, encode_envelope
+from starlette.websockets import WebSocket
+
+
+@pytest.fixture
+def socket_dir():
+    # Unix socket paths are limited to ~100 characters, keep them short.
+    with tempfile.TemporaryDirectory(prefix="cb-") as path:
+        yield path
+
+
+@pytest.fixture(autouse=True)
+def clean_channel_box():
+    yield
+    ChannelBox._reset()
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [{"message": "hi", "n": [1, 2]}, "plain text", b"\x00\x01binary"],
+)
+def test_envelope_roundtrip(payload):
+    data = encode_envelope("group", payload, True)
+    assert decode_envelope(data) == ("group", payload, True, "", "")
+
+    data = encode_envelope(["a", "b"], payload, False, "user:*", "team:")
+    assert decode_envelope(data) == (["a", "b"], payload, False, "user:*", "team:")
+
+
+@pytest.mark.asyncio
+async def test_unix_socket_backend_delivers_to_peer(socket_dir):
+    received = []
+
+    async def on_message(group_name, payload, save_history, pattern, prefix):
+        received.append((group_name, payload, save_history))
+
+    worker_1 = UnixSocketBackend(path=socket_dir, peer_refresh=0)
+    worker_2 = UnixSocketBackend(path=socket_dir, peer_refresh=0)
+
+    await worker_1.start(on_message)
+    await worker_2.start(on_message)
+    try:
+        await worker_2.publish("chat", {"message": "hello"}, False)
+        await asyncio.sleep(0.05)
+    finally:
+        await worker_1.stop()
+        await worker_2.stop()
+
+    assert received == [("chat", {"message": "hello"}, False)]
+    assert not os.listdir(socket_dir)
+
+
+@pytest.mark.asyncio
+async def test_unix_socket_backend_removes_dead_peers(socket_dir):
+    dead = UnixSocketBackend(path=socket_dir)
+    await dead.start(lambda *args: asyncio.sleep(0))
+    dead._sock.close()
+    dead._sock = None
+
+    worker = UnixSocketBackend(path=socket_dir, peer_refresh=0)
+    await worker.start(lambda *args: asyncio.sleep(0))
+    try:
+        await worker.publish("chat", "hello", False)
+    finally:
+        await worker.stop()
+        await dead.stop()
+
+    assert not os.listdir(socket_dir)
+
+
+@pytest.mark.asyncio
+async def test_unix_socket_backend_drops_oversized_datagram(socket_dir):
+    peer = UnixSocketBackend(path=socket_dir)
+    await peer.start(lambda *args: asyncio.sleep(0))
+
+    ws = MagicMock(spec=WebSocket)
+    channel = Channel(websocket=ws, expires=60, payload_type="text")
+    await ChannelBox.add_channel_to_group(channel, "chat")
+
+    backend = UnixSocketBackend(path=socket_dir, peer_refresh=0)
+    await ChannelBox.set_backend(backend)
+    try:
+        await ChannelBox.group_send("chat", "x" * (16 << 20))
+    finally:
+        await ChannelBox.set_backend(None)
+        await peer.stop()
+
+    assert backend.send_errors == 1
+    ws.send_text.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_channel_box_group_send_reaches_peer_process(socket_dir):
+    ws = MagicMock(spec=WebSocket)
+    channel = Channel(websocket=ws, expires=60, payload_type="json")
+    await ChannelBox.add_channel_to_group(channel, "chat")
+
+    await ChannelBox.set_backend(UnixSocketBackend(path=socket_dir, peer_refresh=0))
+
+    peer_received = []
+
+    async def on_message(*args):
+        peer_received.append(args)
+
+    peer = UnixSocketBackend(path=socket_dir, peer_refresh=0)
+    await peer.start(on_message)
+    try:
+        await ChannelBox.group_send("chat", {"from": "local"})
+        await peer.publish("chat", {"from": "peer"}, True)
+        await asyncio.sleep(0.05)
+    finally:
+        await peer.stop()
+        await ChannelBox.set_backend(None)
+
+    assert peer_received == [("chat", {"from": "local"}, False, "", "")]
+    assert [call.args[0] for call in ws.send_text.call_args_list] == [
+        '{"from":"local"}',
+        '{"from":"peer"}',
+    ]
+    history = await ChannelBox.get_history("chat")
+    assert [message.payload for message in history] == [{"from": "peer"}]
@@ -1,19 +1,27 @@
+import asyncio
+import threading
 import time
+import uuid
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from channel_box import Channel, ChannelBox
+from channel_box.metrics import CounterMetrics
+from channel_box.utils import (
+    batch_frames,
+    compress_frame,
+    decompress_frame,
+    get_msgpack_encoder,
+)
 from starlette.websockets import WebSocket
 from starlette.websockets import WebSocketDisconnect
 
 
 @pytest.fixture(autouse=True)
 def clean_channel_box():
-    ChannelBox.CHANNEL_GROUPS = {}
-    ChannelBox.CHANNEL_GROUPS_HISTORY = {}
+    ChannelBox._reset()
     yield
-    ChannelBox.CHANNEL_GROUPS = {}
-    ChannelBox.CHANNEL_GROUPS_HISTORY = {}
+    ChannelBox._reset()
 
 
 @pytest.fixture
@@ -36,7 +44,7 @@ async def test_add_and_remove_channel(mock_websocket):
     groups = await ChannelBox.get_groups()
     assert group_name in groups
     assert channel in groups[group_name]
-    assert "created_at" in groups[group_name][channel]
+    assert groups[group_name][channel].created_at <= time.time()
 
     await ChannelBox.remove_channel_from_group(channel, group_name)
 
@@ -76,6 +84,24 @@ async def test_flush_groups(mock_websocket):
     assert not groups
 
 
+@pytest.mark.asyncio
+async def test_flush_groups_stops_writers_and_conflation(mock_websocket):
+    channel = Channel(
+        websocket=mock_websocket, expires=60, payload_type="json", queue_size=4
+    )
+    await ChannelBox.add_channel_to_group(channel, "prices")
+    await ChannelBox.set_group_conflation("prices", key="symbol", window=0.01)
+    await ChannelBox.group_send("prices", {"symbol": "BTC", "price": 1})
+
+    await ChannelBox.flush_groups()
+    await asyncio.sleep(0.03)
+
+    assert channel._closed and channel._writer is None
+    assert channel._expiry_token is None
+    assert not ChannelBox.CONFLATION_PENDING and not ChannelBox.CONFLATION_TASKS
+    mock_websocket.send_text.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_group_send_success_updates_last_active(mock_websocket):
     group_name = "group_ok"
@@ -95,7 +121,7 @@ async def test_group_send_success_updates_last_active(mock_websocket):
         payload={"ok": True},
     )
 
-    mock_websocket.send_json.assert_called_once()
+    mock_websocket.send_text.assert_called_once_with('{"ok":true}')
     assert channel.last_active >= last_active_before
 
 
@@ -103,7 +129,7 @@ async def test_group_send_success_updates_last_active(mock_websocket):
 async def test_group_send_closed_socket_removes_channel(mock_websocket):
     group_name = "group_closed"
 
-    mock_websocket.send_json.side_effect = WebSocketDisconnect(code=1006)
+    mock_websocket.send_text.side_effect = WebSocketDisconnect(code=1006)
 
     channel = Channel(
         websocket=mock_websocket,
@@ -121,7 +147,7 @@ async def test_group_send_closed_socket_removes_channel(mock_websocket):
     groups = await ChannelBox.get_groups()
     assert group_name not in groups or channel not in groups[group_name]
 
-    mock_websocket.send_json.assert_called_once()
+    mock_websocket.send_text.assert_called_once()
 
 
 @pytest.mark.asyncio
@@ -130,7 +156,7 @@ async def test_group_send_partial_disconnect():
 
     alive_ws = MagicMock(spec=WebSocket)
     dead_ws = MagicMock(spec=WebSocket)
-    dead_ws.send_json.side_effect = RuntimeError("closed")
+    dead_ws.send_text.side_effect = RuntimeError("closed")
 
     alive_channel = Channel(
         websocket=alive_ws,
@@ -156,8 +182,8 @@ async def test_group_send_partial_disconnect():
     assert alive_channel in groups[group_name]
     assert dead_channel not in groups[group_name]
 
-    alive_ws.send_json.assert_called_once()
-    dead_ws.send_json.assert_called_once()
+    alive_ws.send_text.assert_called_once()
+    dead_ws.send_text.assert_called_once()
 
 
 @pytest.mark.asyncio
@@ -266,3 +292,993 @@ async def test_clean_expired_removes_channel(mock_websocket):
 
     groups = await ChannelBox.get_groups()
     assert not groups
+
+
+@pytest.mark.asyncio
+async def test_group_send_concurrent_slow_channel_times_out():
+    group_name = "concurrent_group"
+
+    fast_ws = MagicMock(spec=WebSocket)
+    slow_ws = MagicMock(spec=WebSocket)
+
+    async def stall(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    slow_ws.send_text.side_effect = stall
+
+    fast_channel = Channel(websocket=fast_ws, expires=60, payload_type="json")
+    slow_channel = Channel(websocket=slow_ws, expires=60, payload_type="json")
+
+    await ChannelBox.add_channel_to_group(slow_channel, group_name)
+    await ChannelBox.add_channel_to_group(fast_channel, group_name)
+
+    started = time.monotonic()
+    await ChannelBox.group_send(
+        group_name=group_name,
+        payload={"ping": 1},
+        concurrent=True,
+        timeout=0.05,
+    )
+    assert time.monotonic() - started < 1
+
+    groups = await ChannelBox.get_groups()
+    assert fast_channel in groups[group_name]
+    assert slow_channel not in groups[group_name]
+    fast_ws.send_text.assert_called_once()
+
+    await asyncio.sleep(0)
+    slow_ws.close.assert_called_once_with(code=1008)
+    fast_ws.close.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_group_send_concurrency_limit():
+    group_name = "limited_group"
+    in_flight = 0
+    peak = 0
+
+    async def send(*args, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    for _ in range(6):
+        ws = MagicMock(spec=WebSocket)
+        ws.send_text.side_effect = send
+        channel = Channel(websocket=ws, expires=60, payload_type="json")
+        await ChannelBox.add_channel_to_group(channel, group_name)
+
+    await ChannelBox.group_send(
+        group_name=group_name,
+        payload={"ping": 1},
+        concurrent=True,
+        concurrency=2,
+    )
+
+    assert peak == 2
+    assert len((await ChannelBox.get_groups())[group_name]) == 6
+
+
+@pytest.mark.asyncio
+async def test_group_send_encodes_payload_once():
+    group_name = "encode_once"
+    calls = []
+
+    def encoder(obj):
+        calls.append(obj)
+        return '{"n":1}'
+
+    sockets = []
+    for payload_type in ["json", "json", "text", "bytes"]:
+        ws = MagicMock(spec=WebSocket)
+        sockets.append(ws)
+        channel = Channel(websocket=ws, expires=60, payload_type=payload_type)
+        await ChannelBox.add_channel_to_group(channel, group_name)
+
+    default_encoder = ChannelBox.JSON_ENCODER
+    ChannelBox.set_json_encoder(encoder)
+    try:
+        await ChannelBox.group_send(group_name=group_name, payload={"n": 1})
+    finally:
+        ChannelBox.set_json_encoder(default_encoder)
+
+    assert len(calls) == 3
+    sockets[0].send_text.assert_called_once_with('{"n":1}')
+    sockets[1].send_text.assert_called_once_with('{"n":1}')
+    sockets[2].send_text.assert_called_once_with('{"n":1}')
+    sockets[3].send_bytes.assert_called_once_with(b'{"n":1}')
+
+
+def test_set_json_encoder_by_name():
+    default_encoder = ChannelBox.JSON_ENCODER
+    try:
+        ChannelBox.set_json_encoder("json")
+        assert ChannelBox.JSON_ENCODER({"a": "ü"}) == '{"a":"ü"}'
+        with pytest.raises(ValueError):
+            ChannelBox.set_json_encoder("unknown")
+    finally:
+        ChannelBox.JSON_ENCODER = default_encoder
+
+
+@pytest.mark.asyncio
+async def test_queued_channel_does_not_block_publisher():
+    group_name = "queued_group"
+    release = asyncio.Event()
+
+    async def wait_release(*args, **kwargs):
+        await release.wait()
+
+    ws = MagicMock(spec=WebSocket)
+    ws.send_text.side_effect = wait_release
+
+    channel = Channel(
+        websocket=ws,
+        expires=60,
+        payload_type="json",
+        queue_size=2,
+        overflow_policy="drop_oldest",
+    )
+    await ChannelBox.add_channel_to_group(channel, group_name)
+
+    for i in range(4):
+        await ChannelBox.group_send(group_name=group_name, payload={"i": i})
+        await asyncio.sleep(0)
+
+    assert channel.queue_depth == 2
+    assert channel.dropped == 1
+
+    release.set()
+    await asyncio.sleep(0.01)
+
+    assert channel.queue_depth == 0
+    assert [call.args[0] for call in ws.send_text.call_args_list] == [
+        '{"i":0}',
+        '{"i":2}',
+        '{"i":3}',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_leaving_last_group_stops_writer():
+    ws = MagicMock(spec=WebSocket)
+    channel = Channel(websocket=ws, expires=60, payload_type="text", queue_size=4)
+    await ChannelBox.add_channel_to_group(channel, "room")
+    await ChannelBox.add_channel_to_group(channel, "lobby")
+
+    await ChannelBox.group_send("room", "first")
+    writer = channel._writer
+    await ChannelBox.remove_channel_from_group(channel, "room")
+    assert channel._writer is writer
+
+    await ChannelBox.remove_channel_from_group(channel, "lobby")
+    await asyncio.sleep(0)
+    assert channel._writer is None
+    assert writer.done()
+
+    # The queued frame was dropped, rejoining reopens the channel.
+    await ChannelBox.add_channel_to_group(channel, "room")
+    await ChannelBox.group_send("room", "second")
+    await asyncio.sleep(0.01)
+    assert [call.args[0] for call in ws.send_text.call_args_list] == ["second"]
+
+
+@pytest.mark.asyncio
+async def test_batched_channel_combines_frames():
+    group_name = "batched_group"
+    ws = MagicMock(spec=WebSocket)
+    channel = Channel(
+        websocket=ws,
+        expires=60,
+        payload_type="json",
+        batch_size=3,
+        batch_interval=0.05,
+    )
+    await ChannelBox.add_channel_to_group(channel, group_name)
+
+    for i in range(4):
+        await ChannelBox.group_send(group_name=group_name, payload={"i": i})
+
+    await asyncio.sleep(0)
+    ws.send_text.assert_called_once_with('[{"i":0},{"i":1},{"i":2}]')
+
+    await asyncio.sleep(0.1)
+    assert ws.send_text.call_args.args[0] == '[{"i":3}]'
+    channel._close()
+
+
+@pytest.mark.parametrize(
+    "payload_type, frames, expected",
+    [
+        ("text", ["a", "b"], '["a","b"]'),
+        ("bytes", [b"ab", b"c"], b"\x00\x00\x00\x02ab\x00\x00\x00\x01c"),
+        ("msgpack", [b"\x01", b"\xa1a"], b"\x92\x01\xa1a"),
+    ],
+)
+def test_batch_frames(payload_type, frames, expected):
+    assert batch_frames(frames, payload_type) == expected
+
+
+@pytest.mark.parametrize(
+    "policy, expected",
+    [
+        ("drop_oldest", ["b", "c"]),
+        ("drop_newest", ["a", "b"]),
+        ("coalesce_latest", ["c"]),
+    ],
+)
+@pytest.mark.asyncio
+async def test_queue_overflow_policies(policy, expected):
+    ws = MagicMock(spec=WebSocket)
+    channel = Channel(
+        websocket=ws,
+        expires=60,
+        payload_type="text",
+        queue_size=2,
+        overflow_policy=policy,
+    )
+
+    for frame in ["a", "b", "c"]:
+        assert await channel._send_frame(frame)
+
+    assert [frame for frame, _, _ in channel._queue] == expected
+    channel._close()
+
+
+@pytest.mark.asyncio
+async def test_queue_overflow_disconnect_removes_channel():
+    group_name = "disconnect_group"
+    ws = MagicMock(spec=WebSocket)
+    channel = Channel(
+        websocket=ws,
+        expires=60,
+        payload_type="text",
+        queue_size=1,
+        overflow_policy="disconnect",
+    )
+    await ChannelBox.add_channel_to_group(channel, group_name)
+
+    await ChannelBox.group_send(group_name=group_name, payload="a")
+    await ChannelBox.group_send(group_name=group_name, payload="b")
+    await asyncio.sleep(0)
+
+    groups = await ChannelBox.get_groups()
+    assert group_name not in groups
+    ws.close.assert_called_once_with(code=1008)
+
+
+@pytest.mark.asyncio
+async def test_group_send_history_evicts_oldest():
+    group_name = "ring_history"
+
+    await ChannelBox.set_history_limits(group_name, max_messages=3, max_bytes=0)
+
+    for i in range(5):
+        await ChannelBox.group_send(
+            group_name=group_name,
+            payload={"i": i},
+            save_history=True,
+        )
+
+    history = await ChannelBox.get_history(group_name)
+    assert [message.payload["i"] for message in history] == [2, 3, 4]
+    assert history[0].size == len('{"i":2}')
+    assert history.nbytes == 3 * len('{"i":2}')
+
+
+@pytest.mark.asyncio
+async def test_group_send_history_byte_limit():
+    group_name = "bytes_history"
+
+    await ChannelBox.set_history_limits(group_name, max_messages=0, max_bytes=10)
+
+    for payload in ["aaaa", "bbbb", "cccc"]:
+        await ChannelBox.group_send(
+            group_name=group_name,
+            payload=payload,
+            save_history=True,
+        )
+
+    history = await ChannelBox.get_history(group_name)
+    assert [message.payload for message in history] == ["bbbb", "cccc"]
+    assert history.nbytes == 8
+
+
+@pytest.mark.asyncio
+async def test_get_history_since_cursor():
+    group_name = "cursor_history"
+
+    for i in range(5):
+        await ChannelBox.group_send(
+            group_name=group_name,
+            payload={"i": i},
+            save_history=True,
+        )
+
+    history = await ChannelBox.get_history(group_name)
+    cursor = history[2]
+
+    newer = await ChannelBox.get_history(group_name, since=cursor.seq)
+    assert [message.payload["i"] for message in newer] == [3, 4]
+
+    newer = await ChannelBox.get_history(group_name, since=cursor.uuid, limit=1)
+    assert [message.payload["i"] for message in newer] == [3]
+
+    assert await ChannelBox.get_history("unknown", since=1) == []
+    assert list(await ChannelBox.get_history(since=4)) == [group_name]
+
+
+@pytest.mark.asyncio
+async def test_clean_expired_keeps_active_channels(mock_websocket):
+    group_name = "active_group"
+
+    channel = Channel(websocket=mock_websocket, expires=5, payload_type="json")
+    await ChannelBox.add_channel_to_group(channel, group_name)
+
+    # Due according to the index, but active since it was indexed.
+    ChannelBox.EXPIRY_HEAP[0] = (0, *ChannelBox.EXPIRY_HEAP[0][1:])
+    await ChannelBox.clean_expired()
+
+    groups = await ChannelBox.get_groups()
+    assert channel in groups[group_name]
+    assert ChannelBox.EXPIRY_HEAP[0][0] == channel._deadline()
+
+
+@pytest.mark.asyncio
+async def test_clean_expired_drops_removed_memberships(mock_websocket):
+    for i in range(4):
+        channel = Channel(websocket=mock_websocket, expires=60, payload_type="json")
+        await ChannelBox.add_channel_to_group(channel, f"group_{i}")
+        await ChannelBox.remove_channel_from_group(channel, f"group_{i}")
+
+    assert len(ChannelBox.EXPIRY_HEAP) == 4
+
+    await ChannelBox.clean_expired()
+
+    assert not ChannelBox.EXPIRY_HEAP
+    assert not await ChannelBox.get_groups()
+
+
+@pytest.mark.asyncio
+async def test_reaper_cleans_expired(mock_websocket):
+    group_name = "reaper_group"
+
+    channel = Channel(websocket=mock_websocket, expires=0, payload_type="json")
+    channel.last_active = time.time() - 10
+    await ChannelBox.add_channel_to_group(channel, group_name)
+
+    await ChannelBox.start_reaper(interval=0.01)
+    try:
+        await asyncio.sleep(0.05)
+    finally:
+        await ChannelBox.stop_reaper()
+
+    assert ChannelBox.REAPER_TASK is None
+    assert not await ChannelBox.get_groups()
+
+
+@pytest.mark.asyncio
+async def test_remove_channel_from_all_groups(mock_websocket):
+    channel = Channel(websocket=mock_websocket, expires=60, payload_type="json")
+    other = Channel(websocket=mock_websocket, expires=60, payload_type="json")
+
+    for group_name in ["user:42", "team:7", "all"]:
+        await ChannelBox.add_channel_to_group(channel, group_name)
+    await ChannelBox.add_channel_to_group(other, "all")
+
+    assert set(ChannelBox.CHANNEL_MEMBERSHIPS[channel]) == {"user:42", "team:7", "all"}
+
+    await ChannelBox.remove_channel(channel)
+
+    groups = await ChannelBox.get_groups()
+    assert list(groups) == ["all"]
+    assert channel not in groups["all"]
+    assert channel not in ChannelBox.CHANNEL_MEMBERSHIPS
+
+    await ChannelBox.remove_channel(channel)
+
+
+@pytest.mark.asyncio
+async def test_rejoined_channel_indexed_once(mock_websocket):
+    channel = Channel(websocket=mock_websocket, expires=60, payload_type="json")
+
+    await ChannelBox.add_channel_to_group(channel, "group")
+    await ChannelBox.remove_channel_from_group(channel, "group")
+    await ChannelBox.add_channel_to_group(channel, "group")
+
+    live = [
+        entry for entry in ChannelBox.EXPIRY_HEAP if entry[1] == channel._expiry_token
+    ]
+    assert len(live) == 1
+    assert ChannelBox.CHANNEL_MEMBERSHIPS[channel] == ("group",)
+
+
+def test_channel_is_slotted_with_lazy_uuid(mock_websocket):
+    channel = Channel(websocket=mock_websocket, expires=60, payload_type="json")
+
+    assert not hasattr(channel, "__dict__")
+    assert channel._uuid is None
+    assert channel.uuid == channel.uuid
+    assert channel.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_snapshot():
+    ChannelBox.METRICS = CounterMetrics()
+
+    alive_ws = MagicMock(spec=WebSocket)
+    dead_ws = MagicMock(spec=WebSocket)
+    dead_ws.send_text.side_effect = RuntimeError("closed")
+    expired_ws = MagicMock(spec=WebSocket)
+
+    await ChannelBox.add_channel_to_group(
+        Channel(websocket=alive_ws, expires=60, payload_type="json"), "chat"
+    )
+    await ChannelBox.add_channel_to_group(
+        Channel(websocket=dead_ws, expires=60, payload_type="json"), "chat"
+    )
+    expired = Channel(websocket=expired_ws, expires=0, payload_type="json")
+    expired.last_active = time.time() - 10
+    await ChannelBox.add_channel_to_group(expired, "expired")
+
+    await ChannelBox.group_send("chat", {"x": 1}, save_history=True)
+    await ChannelBox.clean_expired()
+
+    snapshot = await ChannelBox.metrics_snapshot()
+    assert snapshot["fan_out"]["chat"]["count"] == 1
+    assert snapshot["sends"] == {"success": 1, "failure": 1}
+    assert snapshot["evictions"] == {"failure": 1, "expiry": 1}
+    assert snapshot["groups"] == 1
+    assert snapshot["channels"] == 1
+    assert snapshot["history_messages"] == 1
+    assert snapshot["history_bytes"] == len('{"x":1}')
+
+    text = await ChannelBox.metrics_prometheus()
+    assert 'channel_box_evictions_total{reason="expiry"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_group_send_many():
+    calls = []
+
+    def encoder(obj):
+        calls.append(obj)
+        return '{"n":1}'
+
+    shared_ws = MagicMock(spec=WebSocket)
+    dead_ws = MagicMock(spec=WebSocket)
+    dead_ws.send_text.side_effect = RuntimeError("closed")
+
+    shared = Channel(websocket=shared_ws, expires=60, payload_type="json")
+    dead = Channel(websocket=dead_ws, expires=60, payload_type="json")
+
+    await ChannelBox.add_channel_to_group(shared, "user:1")
+    await ChannelBox.add_channel_to_group(shared, "team:1")
+    await ChannelBox.add_channel_to_group(dead, "team:1")
+
+    payload = {"n": 1}
+    default_encoder = ChannelBox.JSON_ENCODER
+    ChannelBox.set_json_encoder(encoder)
+    try:
+        summary = await ChannelBox.group_send_many(
+            [("user:1", payload), ("team:1", payload), ("empty", payload)],
+            save_history=True,
+        )
+    finally:
+        ChannelBox.JSON_ENCODER = default_encoder
+
+    assert len(calls) == 1
+    assert shared_ws.send_text.call_count == 2
+    assert summary["user:1"].sent == 1
+    assert summary["team:1"].sent == 1
+    assert summary["team:1"].failed == 1
+    assert summary["empty"].messages == 1
+    assert summary["empty"].sent == 0
+
+    groups = await ChannelBox.get_groups()
+    assert dead not in groups["team:1"]
+    assert len(await ChannelBox.get_history("empty")) == 1
+
+
+@pytest.mark.asyncio
+async def test_find_groups_by_prefix_and_pattern(mock_websocket):
+    channel = Channel(websocket=mock_websocket, expires=60, payload_type="json")
+    for group_name in ["user:2", "team:7", "user:10", "all", "user"]:
+        await ChannelBox.add_channel_to_group(channel, group_name)
+
+    assert ChannelBox.GROUP_NAMES == ["all", "team:7", "user", "user:10", "user:2"]
+    assert ChannelBox.find_groups(prefix="user:") == ["user:10", "user:2"]
+    assert ChannelBox.find_groups(pattern="user:?") == ["user:2"]
+    assert ChannelBox.find_groups(pattern="*:7") == ["team:7"]
+
+    await ChannelBox.remove_channel_from_group(channel, "user:10")
+    assert ChannelBox.find_groups(prefix="user:") == ["user:2"]
+
+
+@pytest.mark.asyncio
+async def test_send_to_groups_delivers_once_per_channel():
+    shared_ws = MagicMock(spec=WebSocket)
+    other_ws = MagicMock(spec=WebSocket)
+    outside_ws = MagicMock(spec=WebSocket)
+
+    shared = Channel(websocket=shared_ws, expires=60, payload_type="text")
+    other = Channel(websocket=other_ws, expires=60, payload_type="text")
+    outside = Channel(websocket=outside_ws, expires=60, payload_type="text")
+
+    await ChannelBox.add_channel_to_group(shared, "user:42")
+    await ChannelBox.add_channel_to_group(shared, "team:7")
+    await ChannelBox.add_channel_to_group(other, "team:7")
+    await ChannelBox.add_channel_to_group(outside, "other")
+
+    await ChannelBox.send_to_groups("hello", group_names=["user:42", "team:7"])
+    await ChannelBox.send_to_groups("pattern", pattern="*:*")
+    await ChannelBox.send_to_groups("prefix", prefix="team:", save_history=True)
+
+    assert [call.args[0] for call in shared_ws.send_text.call_args_list] == [
+        "hello",
+        "pattern",
+        "prefix",
+    ]
+    assert other_ws.send_text.call_count == 3
+    outside_ws.send_text.assert_not_called()
+    assert len(await ChannelBox.get_history("team:7")) == 1
+
+
+@pytest.mark.asyncio
+async def test_group_conflation_window(mock_websocket):
+    group_name = "prices"
+    channel = Channel(websocket=mock_websocket, expires=60, payload_type="json")
+    await ChannelBox.add_channel_to_group(channel, group_name)
+    await ChannelBox.set_group_conflation(group_name, key="symbol", window=0.01)
+
+    for price in range(5):
+        await ChannelBox.group_send(
+            group_name,
+            {"symbol": "BTC", "price": price},
+            save_history=True,
+        )
+    await ChannelBox.group_send(group_name, {"symbol": "ETH", "price": 1})
+
+    mock_websocket.send_text.assert_not_called()
+    await asyncio.sleep(0.05)
+
+    assert [call.args[0] for call in mock_websocket.send_text.call_args_list] == [
+        '{"symbol":"BTC","price":4}',
+        '{"symbol":"ETH","price":1}',
+    ]
+    history = await ChannelBox.get_history(group_name)
+    assert [message.payload["price"] for message in history] == [4]
+
+    await ChannelBox.disable_group_conflation(group_name)
+    await ChannelBox.group_send(group_name, {"symbol": "BTC", "price": 5})
+    assert mock_websocket.send_text.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_group_send_many_respects_conflation():
+    prices_ws = MagicMock(spec=WebSocket)
+    chat_ws = MagicMock(spec=WebSocket)
+    await ChannelBox.add_channel_to_group(
+        Channel(websocket=prices_ws, expires=60, payload_type="json"), "prices"
+    )
+    await ChannelBox.add_channel_to_group(
+        Channel(websocket=chat_ws, expires=60, payload_type="json"), "chat"
+    )
+    await ChannelBox.set_group_conflation("prices", key="symbol", window=0.01)
+
+    summary = await ChannelBox.group_send_many(
+        [("prices", {"symbol": "BTC", "price": price}) for price in range(3)]
+        + [("chat", {"text": "hi"})]
+    )
+
+    assert summary["prices"].messages == 3
+    assert summary["chat"].sent == 1
+    prices_ws.send_text.assert_not_called()
+    await asyncio.sleep(0.05)
+    prices_ws.send_text.assert_called_once_with('{"symbol":"BTC","price":2}')
+
+
+@pytest.mark.asyncio
+async def test_group_conflation_collapses_queued_frames():
+    group_name = "status"
+    release = asyncio.Event()
+
+    async def wait_release(*args, **kwargs):
+        await release.wait()
+
+    ws = MagicMock(spec=WebSocket)
+    ws.send_text.side_effect = wait_release
+    channel = Channel(websocket=ws, expires=60, payload_type="text", queue_size=16)
+    await ChannelBox.add_channel_to_group(channel, group_name)
+    await ChannelBox.set_group_conflation(
+        group_name, key=lambda payload: payload[0], window=0
+    )
+
+    for payload in ["a1", "a2", "b1", "a3", "b2"]:
+        await ChannelBox.group_send(group_name, payload)
+        await asyncio.sleep(0)
+
+    # "a1" is being written, later updates collapse per key.
+    assert [frame for frame, _, _ in channel._queue] == ["a3", "b2"]
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert [call.args[0] for call in ws.send_text.call_args_list] == ["a1", "a3", "b2"]
+
+
+@pytest.mark.asyncio
+async def test_group_send_compresses_once_for_binary_channels():
+    group_name = "compressed_group"
+    payload = {"data": "x" * 2048}
+    sockets = [MagicMock(spec=WebSocket) for _ in range(3)]
+
+    channels = [
+        Channel(
+            websocket=sockets[0], expires=60, payload_type="bytes", compression="zlib"
+        ),
+        Channel(
+            websocket=sockets[1], expires=60, payload_type="bytes", compression="zlib"
+        ),
+        Channel(
+            websocket=sockets[2],
+            expires=60,
+            payload_type="bytes",
+            compression="zlib",
+            transport_compressed=True,
+        ),
+    ]
+    for channel in channels:
+        await ChannelBox.add_channel_to_group(channel, group_name)
+
+    with patch("channel_box.src.compress_frame", wraps=compress_frame) as compress:
+        await ChannelBox.group_send(group_name=group_name, payload=payload)
+
+    assert compress.call_count == 2
+    assert channels[2].compression == "identity"
+    frames = [ws.send_bytes.call_args.args[0] for ws in sockets]
+    assert frames[0] is frames[1]
+    assert frames[0][0] == 1 and len(frames[0]) < 2048
+    assert frames[2][0] == 0
+    assert decompress_frame(frames[0]) == decompress_frame(frames[2])
+
+
+def test_msgpack_channel_rejects_compressed_batches():
+    with pytest.raises(AssertionError):
+        Channel(
+            websocket=MagicMock(spec=WebSocket),
+            expires=60,
+            payload_type="msgpack",
+            batch_size=4,
+            compression="zlib",
+        )
+
+
+@pytest.mark.asyncio
+async def test_history_stores_compressed_frames():
+    group_name = "compressed_history"
+    ChannelBox.HISTORY_COMPRESSION = "zlib"
+    try:
+        await ChannelBox.group_send(
+            group_name=group_name, payload="a" * 4096, save_history=True
+        )
+        await ChannelBox.group_send(
+            group_name=group_name, payload="small", save_history=True
+        )
+    finally:
+        ChannelBox.HISTORY_COMPRESSION = None
+
+    history = await ChannelBox.get_history(group_name)
+    assert history[0].size < 100
+    assert decompress_frame(history[0].payload) == b"a" * 4096
+    assert history[1].payload == b"\x00small"
+
+
+@pytest.mark.parametrize(
+    "obj, expected",
+    [
+        ({"a": 1}, b"\x81\xa1a\x01"),
+        ([None, True, False], b"\x93\xc0\xc3\xc2"),
+        ([-1, -33, 255, 65536], b"\x94\xff\xd0\xdf\xcc\xff\xce\x00\x01\x00\x00"),
+        (1.5, b"\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00"),
+        ("é" * 20, b"\xd9\x28" + "é".encode() * 20),
+        (b"\x00", b"\xc4\x01\x00"),
+    ],
+)
+def test_python_msgpack_encoder(obj, expected):
+    assert get_msgpack_encoder("python")(obj) == expected
+
+
+@pytest.mark.asyncio
+async def test_group_send_msgpack_channels():
+    group_name = "msgpack_group"
+    sockets = [MagicMock(spec=WebSocket) for _ in range(2)]
+    for ws in sockets:
+        channel = Channel(websocket=ws, expires=60, payload_type="msgpack")
+        await ChannelBox.add_channel_to_group(channel, group_name)
+
+    encode = MagicMock(side_effect=get_msgpack_encoder("python"))
+    default_encoder = ChannelBox.MSGPACK_ENCODER
+    ChannelBox.MSGPACK_ENCODER = encode
+    try:
+        await ChannelBox.group_send(group_name=group_name, payload={"a": 1})
+        await ChannelBox.group_send(group_name=group_name, payload=b"\xa1b")
+    finally:
+        ChannelBox.MSGPACK_ENCODER = default_encoder
+
+    assert encode.call_count == 1
+    for ws in sockets:
+        assert [call.args[0] for call in ws.send_bytes.call_args_list] == [
+            b"\x81\xa1a\x01",
+            b"\xa1b",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_send_to_channel_and_key():
+    sockets = [MagicMock(spec=WebSocket) for _ in range(3)]
+    channels = [
+        Channel(websocket=sockets[0], expires=60, payload_type="json", key="alice"),
+        Channel(websocket=sockets[1], expires=60, payload_type="text", key="alice"),
+        Channel(websocket=sockets[2], expires=60, payload_type="json", key="bob"),
+    ]
+    for channel in channels:
+        await ChannelBox.add_channel_to_group(channel, "room")
+        await ChannelBox.add_channel_to_group(channel, "lobby")
+
+    assert await ChannelBox.send_to_channel(str(channels[2].uuid), {"to": "bob"})
+    sockets[2].send_text.assert_called_once_with('{"to":"bob"}')
+
+    assert await ChannelBox.send_to_key("alice", {"to": "alice"}) == 2
+    sockets[0].send_text.assert_called_once_with('{"to":"alice"}')
+    sockets[1].send_text.assert_called_once_with('{"to":"alice"}')
+
+    assert await ChannelBox.send_to_key("carol", "nobody") == 0
+    assert not await ChannelBox.send_to_channel(uuid.uuid4(), "nobody")
+
+    # Leaving one group keeps the channel addressable, leaving all does not.
+    await ChannelBox.remove_channel_from_group(channels[2], "room")
+    assert ChannelBox.CHANNEL_REGISTRY[channels[2].uuid] is channels[2]
+    await ChannelBox.remove_channel_from_group(channels[2], "lobby")
+    assert channels[2].uuid not in ChannelBox.CHANNEL_REGISTRY
+    assert "bob" not in ChannelBox.CHANNEL_KEYS
+
+
+@pytest.mark.asyncio
+async def test_send_to_key_removes_failed_channels():
+    ok_ws = MagicMock(spec=WebSocket)
+    failed_ws = MagicMock(spec=WebSocket)
+    failed_ws.send_text.side_effect = WebSocketDisconnect()
+    ok = Channel(websocket=ok_ws, expires=60, payload_type="text", key=1)
+    failed = Channel(websocket=failed_ws, expires=60, payload_type="text", key=1)
+    await ChannelBox.add_channel_to_group(ok, "room")
+    await ChannelBox.add_channel_to_group(failed, "room")
+    ChannelBox.METRICS = CounterMetrics()
+
+    assert await ChannelBox.send_to_key(1, "hi") == 1
+    assert list(ChannelBox.CHANNEL_KEYS[1]) == [ok]
+    assert failed.uuid not in ChannelBox.CHANNEL_REGISTRY
+    assert failed not in ChannelBox.CHANNEL_GROUPS["room"]
+
+    snapshot = ChannelBox.METRICS.snapshot()
+    assert snapshot["sends"] == {"success": 1, "failure": 1}
+    assert snapshot["evictions"]["failure"] == 1
+
+
+@pytest.mark.asyncio
+async def test_presence_counts_and_metadata():
+    channels = [
+        Channel(websocket=MagicMock(spec=WebSocket), expires=60, payload_type="json")
+        for _ in range(2)
+    ]
+    await ChannelBox.add_channel_to_group(channels[0], "room", meta={"name": "alice"})
+    await ChannelBox.add_channel_to_group(channels[1], "room")
+
+    assert await ChannelBox.get_presence_count("room") == 2
+    assert await ChannelBox.get_presence_count("missing") == 0
+    assert await ChannelBox.get_presence("room") == {
+        channels[0]: {"name": "alice"},
+        channels[1]: None,
+    }
+
+    await ChannelBox.remove_channel(channels[0])
+    assert await ChannelBox.get_presence_count("room") == 1
+
+
+@pytest.mark.asyncio
+async def test_presence_events_stream_and_debounce():
+    channels = [
+        Channel(websocket=MagicMock(spec=WebSocket), expires=60, payload_type="json")
+        for _ in range(3)
+    ]
+
+    events = ChannelBox.presence_events("room")
+    next_event = asyncio.ensure_future(events.__anext__())
+    await asyncio.sleep(0)
+    await ChannelBox.add_channel_to_group(channels[0], "other")
+    await ChannelBox.add_channel_to_group(channels[0], "room")
+    event = await next_event
+    assert (event.group_name, event.count, event.joined, event.left) == (
+        "room",
+        1,
+        [channels[0]],
+        [],
+    )
+    await events.aclose()
+    assert ChannelBox.PRESENCE_SUBSCRIBERS == []
+
+    debounced = ChannelBox.presence_events(debounce=0.01)
+    next_event = asyncio.ensure_future(debounced.__anext__())
+    await asyncio.sleep(0)
+    await ChannelBox.add_channel_to_group(channels[1], "room")
+    await ChannelBox.add_channel_to_group(channels[2], "room")
+    await ChannelBox.remove_channel_from_group(channels[2], "room")
+    await ChannelBox.remove_channel_from_group(channels[0], "room")
+    event = await next_event
+    assert (event.count, event.joined, event.left) == (1, [channels[1]], [channels[0]])
+    await debounced.aclose()
+
+
+@pytest.mark.asyncio
+async def test_instance_hubs_are_isolated():
+    metrics = CounterMetrics()
+    hub = ChannelBox(
+        history_length=1,
+        json_encoder=lambda obj: "encoded",
+        metrics=metrics,
+    )
+    other = ChannelBox()
+    hub_ws = MagicMock(spec=WebSocket)
+    default_ws = MagicMock(spec=WebSocket)
+
+    await hub.add_channel_to_group(
+        Channel(websocket=hub_ws, expires=60, payload_type="json"), "room"
+    )
+    await ChannelBox.add_channel_to_group(
+        Channel(websocket=default_ws, expires=60, payload_type="json"), "room"
+    )
+
+    await hub.group_send(group_name="room", payload={"n": 1}, save_history=True)
+    await hub.group_send(group_name="room", payload={"n": 2}, save_history=True)
+
+    hub_ws.send_text.assert_called_with("encoded")
+    default_ws.send_text.assert_not_called()
+    assert [message.payload for message in await hub.get_history("room")] == [{"n": 2}]
+    assert await ChannelBox.get_history("room") == {}
+    assert await other.get_groups() == {}
+    assert await hub.get_presence_count("room") == 1
+    assert await ChannelBox.get_presence_count("room") == 1
+    assert metrics.snapshot()["fan_out"]["room"]["count"] == 2
+    assert ChannelBox.JSON_ENCODER({"a": 1}) == '{"a":1}'
+
+
+@pytest.mark.asyncio
+async def test_publish_threadsafe_batches_wakeups():
+    hub = ChannelBox()
+    ws = MagicMock(spec=WebSocket)
+    await hub.add_channel_to_group(
+        Channel(websocket=ws, expires=60, payload_type="json"), "room"
+    )
+    loop = asyncio.get_running_loop()
+    hub.LOOP = MagicMock(wraps=loop)
+
+    def produce(worker):
+        for i in range(500):
+            hub.publish_threadsafe("room", {"worker": worker, "i": i})
+
+    threads = [threading.Thread(target=produce, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        await asyncio.to_thread(thread.join)
+
+    for _ in range(100):
+        if ws.send_text.call_count == 2000:
+            break
+        await asyncio.sleep(0.01)
+
+    assert ws.send_text.call_count == 2000
+    assert hub.LOOP.call_soon_threadsafe.call_count < 2000
+    frames = [call.args[0] for call in ws.send_text.call_args_list]
+    for worker in range(4):
+        sent = [frame for frame in frames if f'"worker":{worker},' in frame]
+        assert sent == [f'{{"worker":{worker},"i":{i}}}' for i in range(500)]
+
+
+def test_publish_threadsafe_requires_loop():
+    with pytest.raises(RuntimeError):
+        ChannelBox().publish_threadsafe("room", "hi")
+
+
+@pytest.mark.asyncio
+async def test_publish_threadsafe_recovers_from_closed_loop():
+    hub = ChannelBox()
+    hub.LOOP = MagicMock(spec=asyncio.AbstractEventLoop)
+    hub.LOOP.is_closed.return_value = False
+    hub.LOOP.call_soon_threadsafe.side_effect = RuntimeError("Event loop is closed")
+
+    with pytest.raises(RuntimeError):
+        hub.publish_threadsafe("room", "lost")
+    assert hub.PUBLISH_SCHEDULED is False
+
+    hub.LOOP.is_closed.return_value = True
+    with pytest.raises(RuntimeError):
+        hub.publish_threadsafe("room", "lost")
+
+    ws = MagicMock(spec=WebSocket)
+    await hub.add_channel_to_group(
+        Channel(websocket=ws, expires=60, payload_type="text"), "room"
+    )
+    assert hub.LOOP is asyncio.get_running_loop()
+
+    hub.PUBLISH_QUEUE.clear()
+    await asyncio.to_thread(hub.publish_threadsafe, "room", "hi")
+    for _ in range(100):
+        if ws.send_text.called:
+            break
+        await asyncio.sleep(0.01)
+    ws.send_text.assert_awaited_once_with("hi")
+
+
+@pytest.mark.asyncio
+async def test_group_send_from_drops_over_rate_limit():
+    metrics = CounterMetrics()
+    hub = ChannelBox(metrics=metrics)
+    ws = MagicMock(spec=WebSocket)
+    sender = Channel(websocket=ws, expires=60, payload_type="text")
+    await hub.add_channel_to_group(sender, "room")
+    await hub.set_group_rate_limit("room", rate=1, burst=2)
+
+    results = [await hub.group_send_from(sender, "room", str(i)) for i in range(3)]
+
+    assert results == [True, True, False]
+    assert ws.send_text.call_count == 2
+    assert sender._buckets["room"].exceeded == 1
+    assert metrics.snapshot()["rate_limited"] == {"room": {"drop": 1}}
+
+    await hub.disable_group_rate_limit("room")
+    assert await hub.group_send_from(sender, "room", "free")
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_changes_apply_to_existing_buckets():
+    hub = ChannelBox()
+    sender = Channel(
+        websocket=MagicMock(spec=WebSocket), expires=60, payload_type="text"
+    )
+    await hub.add_channel_to_group(sender, "room")
+    await hub.set_group_rate_limit("room", rate=1, burst=1)
+
+    assert await hub.check_rate_limit(sender, "room")
+    assert not await hub.check_rate_limit(sender, "room")
+
+    # Leaving and rejoining does not refill the bucket.
+    await hub.remove_channel_from_group(sender, "room")
+    await hub.add_channel_to_group(sender, "room")
+    assert not await hub.check_rate_limit(sender, "room")
+
+    await hub.set_group_rate_limit("room", rate=1000, burst=1000)
+    await asyncio.sleep(0.01)
+    assert all([await hub.check_rate_limit(sender, "room") for _ in range(5)])
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_delay_and_disconnect_policies():
+    ws = MagicMock(spec=WebSocket)
+    sender = Channel(websocket=ws, expires=60, payload_type="text")
+    await ChannelBox.add_channel_to_group(sender, "delayed")
+    await ChannelBox.add_channel_to_group(sender, "strict")
+    await ChannelBox.set_group_rate_limit("delayed", rate=50, burst=1, policy="delay")
+    await ChannelBox.set_group_rate_limit(
+        "strict", rate=1, burst=1, policy="disconnect"
+    )
+
+    started = time.monotonic()
+    assert await ChannelBox.check_rate_limit(sender, "delayed")
+    assert await ChannelBox.check_rate_limit(sender, "delayed")
+    assert time.monotonic() - started >= 0.015
+
+    assert await ChannelBox.check_rate_limit(sender, "strict")
+    assert not await ChannelBox.check_rate_limit(sender, "strict")
+    ws.close.assert_called_once_with(code=1008)
+    assert sender not in ChannelBox.CHANNEL_MEMBERSHIPS
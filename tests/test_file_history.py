@@ -0,0 +1,149 @@
+import os
+from datetime import timedelta
+
+import pytest
+
+from channel_box import ChannelBox
+from channel_box.file_history import FileGroupHistory, FileHistoryStore
+from channel_box.utils import ChannelMessageDC
+
+
+def make_message(payload: str | bytes | dict) -> ChannelMessageDC:
+    return ChannelMessageDC(payload=payload)
+
+
+def test_file_history_survives_reopen(tmp_path):
+    history = FileGroupHistory(str(tmp_path))
+    history.append(make_message("text"))
+    history.append(make_message(b"\x00bytes"))
+    history.append(make_message({"a": "ü"}), '{"a":"ü"}')
+    stored = list(history)
+    history.close()
+
+    history = FileGroupHistory(str(tmp_path))
+
+    assert [message.payload for message in history] == [
+        "text",
+        b"\x00bytes",
+        {"a": "ü"},
+    ]
+    assert [message.uuid for message in history] == [message.uuid for message in stored]
+    assert history[-1].created == stored[-1].created
+    assert history.nbytes == 4 + 6 + len('{"a":"ü"}'.encode())
+
+    history.append(make_message("next"))
+    assert history[-1].seq == 4
+    history.close()
+
+
+def test_file_history_rotates_and_drops_segments(tmp_path):
+    history = FileGroupHistory(str(tmp_path), max_messages=5, segment_bytes=100)
+
+    for i in range(20):
+        history.append(make_message(f"message {i:02d}"))
+
+    assert len(history) == 5
+    assert [message.payload for message in history][0] == "message 15"
+    # Segments holding only evicted messages are deleted.
+    assert len(os.listdir(tmp_path)) == len(history._segments) < 10
+    history.close()
+
+
+def test_file_history_cursor_reads(tmp_path):
+    history = FileGroupHistory(str(tmp_path), segment_bytes=100)
+    messages = [make_message(str(i)) for i in range(6)]
+    started = messages[0].created
+
+    for i, message in enumerate(messages):
+        message.created = started + timedelta(seconds=i)
+        history.append(message)
+
+    assert [m.payload for m in history.read(since=3)] == ["3", "4", "5"]
+    assert [m.payload for m in history.read(since=3, limit=1)] == ["3"]
+    assert [m.payload for m in history.read(since=messages[1].uuid)] == [
+        "2",
+        "3",
+        "4",
+        "5",
+    ]
+    assert [m.payload for m in history.read(since=str(messages[4].uuid))] == ["5"]
+    assert [m.payload for m in history.read(since=messages[2].created, limit=2)] == [
+        "3",
+        "4",
+    ]
+    assert len(history.read(since=100)) == 6
+    history.close()
+
+
+def test_file_history_truncates_torn_record(tmp_path):
+    history = FileGroupHistory(str(tmp_path))
+    history.append(make_message("complete"))
+    history.append(make_message("torn"))
+    history.close()
+
+    [segment] = os.listdir(tmp_path)
+    path = os.path.join(tmp_path, segment)
+    os.truncate(path, os.path.getsize(path) - 2)
+
+    history = FileGroupHistory(str(tmp_path))
+    assert [message.payload for message in history] == ["complete"]
+    history.append(make_message("after"))
+    assert [message.payload for message in history] == ["complete", "after"]
+    history.close()
+
+
+@pytest.mark.asyncio
+async def test_channel_box_file_history_store(tmp_path):
+    ChannelBox.CHANNEL_GROUPS_HISTORY = {}
+    try:
+        ChannelBox.set_history_store(FileHistoryStore(str(tmp_path)))
+        await ChannelBox.group_send(
+            group_name="chat/1", payload={"n": 1}, save_history=True
+        )
+        await ChannelBox.group_send(
+            group_name="chat/1", payload={"n": 2}, save_history=True
+        )
+
+        # A new store over the same directory picks the history up again.
+        ChannelBox.set_history_store(FileHistoryStore(str(tmp_path)))
+        history = await ChannelBox.get_history("chat/1", since=1)
+        assert [message.payload for message in history] == [{"n": 2}]
+
+        await ChannelBox.flush_history()
+        assert FileHistoryStore(str(tmp_path)).groups() == []
+    finally:
+        ChannelBox.set_history_store(None)
+
+
+def test_file_history_store_keeps_groups_inside_root(tmp_path):
+    root = tmp_path / "store"
+    (tmp_path / "app.log").write_text("not a segment")
+    store = FileHistoryStore(str(root))
+
+    for group_name in (".", "..", "../x", "Chat", "chat"):
+        history = store.open(group_name)
+        history.append(make_message(group_name))
+        history.close()
+
+    assert store.groups() == [".", "..", "../x", "Chat", "chat"]
+    assert (tmp_path / "app.log").read_text() == "not a segment"
+    assert sorted(os.listdir(tmp_path)) == ["app.log", "store"]
+    assert [message.payload for message in store.open("..")] == [".."]
+
+
+@pytest.mark.asyncio
+async def test_file_history_store_hashes_long_group_names(tmp_path):
+    group_name = "room/" + "x" * 300
+    ChannelBox.CHANNEL_GROUPS_HISTORY = {}
+    try:
+        ChannelBox.set_history_store(FileHistoryStore(str(tmp_path)))
+        await ChannelBox.group_send(
+            group_name=group_name, payload="hello", save_history=True
+        )
+
+        store = FileHistoryStore(str(tmp_path))
+        assert store.groups() == [group_name]
+        assert [message.payload for message in store.open(group_name)] == ["hello"]
+        assert all(len(name) < 64 for name in os.listdir(tmp_path))
+    finally:
+        ChannelBox.set_history_store(None)
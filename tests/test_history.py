@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from channel_box.history import GroupHistory
+from channel_box.utils import ChannelMessageDC
+
+
+def make_message(payload: str) -> ChannelMessageDC:
+    return ChannelMessageDC(payload=payload, size=len(payload))
+
+
+def test_group_history_evicts_by_count():
+    history = GroupHistory(max_messages=2)
+
+    for payload in ["a", "b", "c"]:
+        history.append(make_message(payload))
+
+    assert len(history) == 2
+    assert [message.payload for message in history] == ["b", "c"]
+    assert history[0].payload == "b"
+    assert history[-1].payload == "c"
+    assert [message.payload for message in history[1:]] == ["c"]
+
+
+def test_group_history_evicts_by_bytes():
+    history = GroupHistory(max_bytes=5)
+
+    for payload in ["aa", "bb", "cc"]:
+        history.append(make_message(payload))
+
+    assert [message.payload for message in history] == ["bb", "cc"]
+    assert history.nbytes == 4
+
+
+def test_group_history_set_limits_and_compaction():
+    history = GroupHistory()
+
+    for i in range(100):
+        history.append(make_message(str(i)))
+
+    history.set_limits(max_messages=10)
+
+    assert len(history) == 10
+    assert history[0].payload == "90"
+    assert len(history._items) == 10
+
+
+def test_group_history_clear():
+    history = GroupHistory()
+    history.append(make_message("a"))
+    history.clear()
+
+    assert not history
+    assert history.nbytes == 0
+
+
+def test_group_history_read_by_seq_and_limit():
+    history = GroupHistory(max_messages=5)
+
+    for i in range(8):
+        history.append(make_message(str(i)))
+
+    assert [message.seq for message in history] == [4, 5, 6, 7, 8]
+    assert [message.payload for message in history.read(since=5)] == ["5", "6", "7"]
+    assert [message.payload for message in history.read(since=5, limit=2)] == ["5", "6"]
+    assert history.read(since=8) == []
+    # Evicted or unknown cursors return everything still stored.
+    assert len(history.read(since=1)) == 5
+    assert len(history.read(since=100)) == 5
+
+
+def test_group_history_read_by_uuid_and_created():
+    history = GroupHistory()
+    messages = [make_message(str(i)) for i in range(4)]
+    started = messages[0].created
+
+    for i, message in enumerate(messages):
+        message.created = started + timedelta(seconds=i)
+        history.append(message)
+
+    assert [m.payload for m in history.read(since=messages[1].uuid)] == ["2", "3"]
+    assert [m.payload for m in history.read(since=str(messages[2].uuid))] == ["3"]
+    assert [m.payload for m in history.read(since=messages[0].created, limit=1)] == [
+        "1"
+    ]
+
+
+def test_group_history_read_by_naive_datetime():
+    history = GroupHistory()
+    messages = [make_message(str(i)) for i in range(3)]
+    started = messages[0].created
+
+    for i, message in enumerate(messages):
+        message.created = started + timedelta(seconds=i)
+        history.append(message)
+
+    # Naive cursors are local time, as in the persistent stores.
+    since = messages[1].created.astimezone().replace(tzinfo=None)
+    assert [m.payload for m in history.read(since=since)] == ["2"]
@@ -0,0 +1,40 @@
+from channel_box.metrics import BaseMetrics, CounterMetrics, to_prometheus
+
+
+def test_base_metrics_is_noop():
+    metrics = BaseMetrics()
+    metrics.on_fan_out("group", 0.1, 1, 0)
+    metrics.on_evicted("expiry")
+
+    assert not metrics.enabled
+    assert metrics.snapshot() == {}
+
+
+def test_counter_metrics_snapshot():
+    metrics = CounterMetrics()
+    metrics.on_fan_out("group", 0.5, 3, 1)
+    metrics.on_fan_out("group", 0.25, 4, 0)
+    metrics.on_evicted("failure")
+    metrics.on_evicted("expiry", 2)
+
+    assert metrics.snapshot() == {
+        "fan_out": {"group": {"count": 2, "seconds_total": 0.75, "seconds_max": 0.5}},
+        "sends": {"success": 7, "failure": 1},
+        "evictions": {"failure": 1, "expiry": 2},
+    }
+
+
+def test_to_prometheus():
+    text = to_prometheus(
+        {
+            "fan_out": {
+                'chat "1"': {"count": 2, "seconds_total": 0.75, "seconds_max": 0.5}
+            },
+            "sends": {"success": 7, "failure": 1},
+            "groups": 3,
+        }
+    )
+
+    assert 'channel_box_fan_out_seconds_count{group="chat \\"1\\""} 2' in text
+    assert 'channel_box_sends_total{result="failure"} 1' in text
+    assert "# TYPE channel_box_groups gauge\nchannel_box_groups 3\n" in text
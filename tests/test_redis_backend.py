@@ -0,0 +1,269 @@
+import asyncio
+import os
+import tempfile
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from channel_box import Channel, ChannelBox
+from channel_box.backends import decode_envelope
+from channel_box.redis_backend import (
+    FakeRedisServer,
+    RedisBackend,
+    RedisError,
+    encode_command,
+    read_reply,
+)
+from starlette.websockets import WebSocket
+
+
+@pytest_asyncio.fixture
+async def redis_url():
+    with tempfile.TemporaryDirectory(prefix="cb-") as path:
+        server = FakeRedisServer()
+        url = await server.start(path=os.path.join(path, "redis.sock"))
+        yield url
+        await server.stop()
+
+
+@pytest.fixture(autouse=True)
+def clean_channel_box():
+    yield
+    ChannelBox._reset()
+
+
+async def wait_for(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_resp_roundtrip():
+    reader = asyncio.StreamReader()
+    reader.feed_data(encode_command("PUBLISH", "chat", b"\r\n\x00"))
+    reader.feed_data(b"-ERR boom\r\n:3\r\n+OK\r\n")
+
+    assert await read_reply(reader) == [b"PUBLISH", b"chat", b"\r\n\x00"]
+    error = await read_reply(reader)
+    assert isinstance(error, RedisError) and str(error) == "ERR boom"
+    assert await read_reply(reader) == 3
+    assert await read_reply(reader) == "OK"
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_subscribes_per_group(redis_url):
+    received = []
+
+    async def on_message(*args):
+        received.append(args)
+
+    node_1 = RedisBackend(redis_url)
+    node_2 = RedisBackend(redis_url)
+    await node_1.start(on_message)
+    await node_2.start(on_message)
+    try:
+        await node_1.subscribe("chat")
+        await node_2.subscribe("chat")
+        await asyncio.sleep(0.01)
+
+        for i in range(3):
+            await node_1.publish("chat", {"i": i})
+        # Publishes issued in one loop iteration are pipelined together.
+        assert len(node_1._pending) == 3
+
+        await node_1.publish("other", "ignored")
+        await node_1.flush()
+        await wait_for(lambda: len(received) == 3)
+
+        await node_2.unsubscribe("chat")
+        await asyncio.sleep(0.01)
+        await node_1.publish("chat", {"i": 3})
+        await node_1.flush()
+        await asyncio.sleep(0.01)
+    finally:
+        await node_1.stop()
+        await node_2.stop()
+
+    # The publishing node does not receive its own broadcasts.
+    assert received == [("chat", {"i": i}, False, "", "") for i in range(3)]
+
+
+@pytest.mark.asyncio
+async def test_channel_box_with_redis_backend(redis_url):
+    received = []
+
+    async def on_message(*args):
+        received.append(args)
+
+    peer = RedisBackend(redis_url)
+    await peer.start(on_message)
+    await peer.subscribe("chat")
+
+    ws = MagicMock(spec=WebSocket)
+    channel = Channel(websocket=ws, expires=60, payload_type="text")
+
+    await ChannelBox.set_backend(RedisBackend(redis_url))
+    try:
+        await ChannelBox.add_channel_to_group(channel, "chat")
+        await asyncio.sleep(0.01)
+
+        await peer.publish("chat", "from peer")
+        await ChannelBox.group_send("chat", "from local")
+        await peer.flush()
+        await ChannelBox.BACKEND.flush()
+        await wait_for(lambda: received and ws.send_text.called)
+
+        assert ChannelBox.BACKEND._subscribed == {"chat"}
+        await ChannelBox.remove_channel(channel)
+        assert ChannelBox.BACKEND._subscribed == set()
+    finally:
+        await ChannelBox.set_backend(None)
+        await peer.stop()
+
+    assert received == [("chat", "from local", False, "", "")]
+    ws.send_text.assert_any_call("from peer")
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_multi_group_publish_received_once(redis_url):
+    received = []
+
+    async def on_message(*args):
+        received.append(args)
+
+    node_1 = RedisBackend(redis_url)
+    node_2 = RedisBackend(redis_url)
+    await node_1.start(on_message)
+    await node_2.start(on_message)
+    try:
+        await node_2.subscribe("user:42")
+        await node_2.subscribe("team:7")
+        await asyncio.sleep(0.01)
+
+        await node_1.publish(["user:42", "team:7"], "hello")
+        await node_1.flush()
+        await wait_for(lambda: received)
+        await asyncio.sleep(0.01)
+    finally:
+        await node_1.stop()
+        await node_2.stop()
+
+    assert received == [(["user:42", "team:7"], "hello", False, "", "")]
+
+
+@pytest.mark.asyncio
+async def test_send_to_groups_pattern_resolved_by_peer(redis_url):
+    hub = ChannelBox()
+    peer = ChannelBox()
+    ws = MagicMock(spec=WebSocket)
+    await peer.add_channel_to_group(
+        Channel(websocket=ws, expires=60, payload_type="text"), "user:42"
+    )
+
+    await hub.set_backend(RedisBackend(redis_url))
+    await peer.set_backend(RedisBackend(redis_url))
+    try:
+        await asyncio.sleep(0.01)
+        # No local group matches, the peer still resolves the pattern.
+        await hub.send_to_groups("hello", pattern="user:*")
+        await hub.BACKEND.flush()
+        await wait_for(lambda: ws.send_text.called)
+    finally:
+        await hub.set_backend(None)
+        await peer.set_backend(None)
+
+    ws.send_text.assert_awaited_once_with("hello")
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_reconnects_and_resubscribes():
+    received = []
+
+    async def on_message(*args):
+        received.append(args)
+
+    with tempfile.TemporaryDirectory(prefix="cb-") as path:
+        server = FakeRedisServer()
+        url = await server.start(path=os.path.join(path, "redis.sock"))
+
+        node_1 = RedisBackend(url, reconnect_delay=0.01)
+        node_2 = RedisBackend(url, reconnect_delay=0.01)
+        await node_1.start(on_message)
+        await node_2.start(on_message)
+        try:
+            await node_2.subscribe("chat")
+            await asyncio.sleep(0.01)
+            await server.stop()
+            await asyncio.sleep(0.02)
+
+            # Broker errors do not reach the caller while disconnected.
+            await node_2.subscribe("other")
+
+            url = await server.start(path=os.path.join(path, "redis.sock"))
+            await wait_for(
+                lambda: {b"channel-box:chat", b"channel-box:other"}
+                <= set(server.subscriptions)
+            )
+
+            await node_1.publish("other", "after reconnect")
+            await wait_for(lambda: received)
+        finally:
+            await node_1.stop()
+            await node_2.stop()
+            await server.stop()
+
+    assert received == [("other", "after reconnect", False, "", "")]
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_bounds_pending_publishes():
+    node = RedisBackend("unix:///nonexistent", max_pending=2)
+
+    for i in range(5):
+        await node.publish("chat", str(i))
+
+    assert len(node._pending) == 2
+    assert node.dropped == 3
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_requeue_drops_oldest_publishes():
+    node = RedisBackend("unix:///nonexistent", max_pending=3)
+
+    async def drain():
+        # Two more publishes arrive while the first batch is written.
+        await node.publish("chat", "2")
+        await node.publish("chat", "3")
+        raise ConnectionResetError
+
+    failing = MagicMock()
+    failing.drain = drain
+    written = MagicMock()
+    written.drain = AsyncMock()
+    replies = asyncio.StreamReader()
+    replies.feed_data(b":1\r\n" * 3)
+
+    async def reconnect():
+        return replies, written
+
+    node._pub = (asyncio.StreamReader(), failing)
+    node._reconnect = reconnect
+    node._tasks = [asyncio.get_running_loop().create_task(node._run_publisher())]
+    try:
+        await node.publish("chat", "0")
+        await node.publish("chat", "1")
+        await wait_for(lambda: written.write.called and not node._writing)
+    finally:
+        node._tasks[0].cancel()
+
+    commands = asyncio.StreamReader()
+    commands.feed_data(written.write.call_args.args[0])
+    payloads = []
+    for _ in range(3):
+        _, _, data = await read_reply(commands)
+        payloads.append(decode_envelope(data[32:])[1])
+
+    assert payloads == ["1", "2", "3"]
+    assert node.dropped == 1
@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+import uuid
+
+import pytest
+
+from channel_box import ChannelBox
+from channel_box.history import KIND_TEXT
+from channel_box.shm_history import SharedMemoryHistoryStore
+from channel_box.utils import ChannelMessageDC
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SharedMemoryHistoryStore(
+        namespace=f"test-{uuid.uuid4().hex[:8]}",
+        slot_count=8,
+        slot_size=128,
+        lock_dir=str(tmp_path),
+    )
+    yield store
+    store.unlink()
+
+
+def append_messages(store: SharedMemoryHistoryStore, count: int) -> None:
+    history = store.open("shared")
+    for i in range(count):
+        history.append(ChannelMessageDC(payload=f"message {i}"))
+    history.close()
+
+
+def test_shared_history_is_visible_to_other_attachments(store):
+    writer = store.open("chat")
+    reader = store.open("chat")
+
+    writer.append(ChannelMessageDC(payload="text"))
+    writer.append(ChannelMessageDC(payload={"a": 1}), '{"a":1}')
+    writer.append(ChannelMessageDC(payload=b"\x00"))
+
+    assert [message.payload for message in reader] == ["text", {"a": 1}, b"\x00"]
+    assert [message.seq for message in reader] == [1, 2, 3]
+    assert store.groups() == ["chat"]
+
+    writer.close()
+    reader.close()
+
+
+def test_shared_history_lock_files_stay_in_lock_dir(store, tmp_path):
+    for group_name in ("..", "a/b"):
+        store.open(group_name).close()
+
+    assert store.groups() == ["..", "a/b"]
+    assert all(name.endswith(".lock") for name in os.listdir(tmp_path))
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_shared_history_hashes_long_group_names(store, tmp_path):
+    group_name = "room/" + "x" * 300
+    writer = store.open(group_name)
+    writer.append(ChannelMessageDC(payload="hello"))
+    writer.close()
+
+    assert store.groups() == [group_name]
+    assert [message.payload for message in store.open(group_name)] == ["hello"]
+
+    store.unlink()
+    assert os.listdir(tmp_path) == []
+
+
+def test_shared_history_ring_wraps_and_drops_oversized(store):
+    history = store.open("chat")
+
+    for i in range(12):
+        history.append(ChannelMessageDC(payload=str(i)))
+    with pytest.warns(RuntimeWarning, match="does not fit"):
+        history.append(ChannelMessageDC(payload="x" * 200))
+
+    assert [message.payload for message in history] == [str(i) for i in range(4, 12)]
+    assert history.dropped == 1
+    assert [m.payload for m in history.read(since=9)] == ["9", "10", "11"]
+    assert len(history.read(since=1)) == 8
+
+    history.set_limits(max_messages=2)
+    assert [message.payload for message in history] == ["10", "11"]
+
+    history.clear()
+    assert len(history) == 0
+    history.close()
+
+
+def test_shared_history_views_are_zero_copy(store):
+    history = store.open("chat")
+    history.append(ChannelMessageDC(payload="abc"))
+
+    [(seq, kind, view)] = history.views()
+    assert (seq, kind, bytes(view)) == (1, KIND_TEXT, b"abc")
+    assert history.is_current(seq)
+    view.release()
+    history.close()
+
+
+def test_shared_history_concurrent_writers(store):
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=append_messages, args=(store, 4)) for _ in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    history = store.open("shared")
+    assert [message.seq for message in history] == list(range(1, 9))
+    assert sorted(message.payload for message in history) == sorted(
+        [f"message {i}" for i in range(4)] * 2
+    )
+    history.close()
+
+
+@pytest.mark.asyncio
+async def test_channel_box_shared_history_store(store):
+    try:
+        ChannelBox.set_history_store(store)
+        await ChannelBox.group_send(
+            group_name="chat", payload="hello", save_history=True
+        )
+
+        # Another worker appended to a group this process has not seen yet.
+        append_messages(store, 1)
+
+        history = await ChannelBox.get_history("shared", since=0)
+        assert [message.payload for message in history] == ["message 0"]
+
+        await ChannelBox._on_backend_message("chat", "peer", True)
+        history = await ChannelBox.get_history("chat", since=0)
+        assert [message.payload for message in history] == ["hello"]
+    finally:
+        ChannelBox.set_history_store(None)